@@ -81,6 +81,9 @@ else:
 
 classes = (
     measureit_arch_main.ShowHideViewportButton,
+    measureit_arch_main.PurgePhantomDataButton,
+    measureit_arch_main.ExportProfileButton,
+    measureit_arch_main.ResetProfileButton,
     measureit_arch_main.MEASUREIT_PT_main_panel,
     measureit_arch_main.OBJECT_PT_Panel,
 
@@ -220,6 +223,10 @@ def register():
     bpy.app.handlers.load_post.append(measureit_arch_styles.create_preset_styles)
     bpy.app.handlers.load_post.append(measureit_arch_views.create_preset_view)
     bpy.app.handlers.save_pre.append(measureit_arch_main.save_handler)
+    bpy.app.handlers.undo_post.append(measureit_arch_main.undo_handler)
+    bpy.app.handlers.redo_post.append(measureit_arch_main.undo_handler)
+    bpy.app.handlers.depsgraph_update_post.append(measureit_arch_main.depsgraph_handler)
+    bpy.app.handlers.frame_change_post.append(measureit_arch_main.frame_change_handler)
 
     # Register pointer properties
     Scene.MeasureItArchProps = bpy.props.PointerProperty(
@@ -254,6 +261,10 @@ def unregister():
 
     bpy.app.handlers.load_post.remove(measureit_arch_main.load_handler)
     bpy.app.handlers.save_pre.remove(measureit_arch_main.save_handler)
+    bpy.app.handlers.undo_post.remove(measureit_arch_main.undo_handler)
+    bpy.app.handlers.redo_post.remove(measureit_arch_main.undo_handler)
+    bpy.app.handlers.depsgraph_update_post.remove(measureit_arch_main.depsgraph_handler)
+    bpy.app.handlers.frame_change_post.remove(measureit_arch_main.frame_change_handler)
 
     # remove OpenGL data
     measureit_arch_main.ShowHideViewportButton.handle_remove(
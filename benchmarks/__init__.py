@@ -0,0 +1,87 @@
+"""
+Reproducible benchmarks of MeasureIt_ARCH.
+
+Scene benchmarks build a synthetic scene in Blender and time drawing, text
+updates, rendering, SVG export and schedules. Run them in background
+Blender from the add-on directory:
+
+    blender -b --factory-startup --python benchmarks/scene_bench.py -- \\
+        --objects 50 --aligned 4 --output scene.json
+
+Drawing and text updates need a GPU context; without one (as in most
+background runs) they are recorded as skipped.
+
+Kernel benchmarks time the pure Python parts of the add-on (the units
+and geometry of measureit_arch_kernels, schedules, depth test, SVG
+writing), using the stand-ins of `benchmarks.standin` where the add-on
+needs Blender, so they run in any Python 3 with NumPy:
+
+    python -m benchmarks.kernel_bench --output kernels.json
+
+Both write one JSON document per run, see `write_results`.
+"""
+
+import json
+import platform
+import sys
+import time
+
+# Bump when the layout of the results changes
+RESULTS_VERSION = 1
+
+
+def measure(name, func, repeat=5, setup=None):
+    """
+    Time `func()` `repeat` times, calling `setup()` (untimed) before each
+    run. Returns the result record of the benchmark; exceptions are
+    recorded as its error instead of stopping the suite.
+    """
+    times = []
+    try:
+        for run in range(repeat):
+            if setup is not None:
+                setup()
+            startTime = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - startTime)
+    except Exception as err:
+        return {'name': name, 'error': '{}: {}'.format(type(err).__name__, err)}
+
+    return {'name': name, 'repeat': repeat, 'min': min(times),
+            'mean': sum(times) / len(times), 'max': max(times)}
+
+
+def report(record, stream=sys.stdout):
+    if 'error' in record:
+        stream.write('{:<32} skipped ({})\n'.format(record['name'], record['error']))
+    else:
+        stream.write('{:<32} {:10.3f} ms (mean {:.3f} ms, {} runs)\n'.format(
+            record['name'], record['min'] * 1000, record['mean'] * 1000,
+            record['repeat']))
+
+
+def write_results(path, suite, params, records, environment=None):
+    """
+    Write the records of a run as JSON, with the parameters and environment
+    needed to compare it against other runs
+    """
+    environment = dict(environment or {})
+    environment.update({
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+    })
+    data = {
+        'version': RESULTS_VERSION,
+        'suite': suite,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': params,
+        'environment': environment,
+        'results': records,
+    }
+    if path == '-':
+        json.dump(data, sys.stdout, indent=1)
+        sys.stdout.write('\n')
+    else:
+        with open(path, 'w') as resultsFile:
+            json.dump(data, resultsFile, indent=1)
@@ -0,0 +1,211 @@
+"""
+Benchmarks of the add-on's pure Python kernels, run without Blender
+against the stand-ins of `benchmarks.standin`:
+
+    python -m benchmarks.kernel_bench --output kernels.json
+"""
+
+import argparse
+import random
+
+from types import SimpleNamespace
+
+from . import measure, report, write_results
+from . import standin
+
+
+def unit_benchmarks(args):
+    units = standin.load_module('measureit_arch_kernels')
+    rnd = random.Random(0)
+    values = [rnd.uniform(0, 50) for i in range(args.values)]
+
+    records = []
+    for system, unit in (('METRIC', 'METERS'), ('IMPERIAL', 'FEET'),
+                         ('IMPERIAL', 'INCHES')):
+        formatter = units.UnitFormatter(system, unit, imperial_precision=16)
+        name = 'units.{}'.format(unit.lower())
+
+        def uncached():
+            for value in values:
+                formatter.format_length(value)
+
+        def cached():
+            for value in values:
+                formatter.format(value)
+
+        def redraw():
+            # The same dimensions drawn over a number of frames
+            for frame in range(args.frames):
+                cached()
+
+        records.append(measure(name + '.uncached', uncached, args.repeat))
+        records.append(measure(name + '.cached', cached, args.repeat))
+        records.append(measure(name + '.redraw', redraw, args.repeat))
+        records.append(measure(
+            name + '.array', lambda: formatter.format_array(values), args.repeat))
+    return records
+
+
+def schedule_benchmarks(args):
+    schedules = standin.load_module('measureit_arch_schedules')
+    rnd = random.Random(0)
+    rows = [['Fixture {}'.format(rnd.randrange(500)),
+             '{:.2f} m'.format(rnd.randrange(40) / 10),
+             rnd.choice(('Steel', 'Oak', 'Glass'))]
+            for i in range(args.rows)]
+    objs = [SimpleNamespace(name='Object {}'.format(idx),
+                            dimensions=(rnd.uniform(0, 5),) * 3,
+                            props={'width': rnd.uniform(0, 5)})
+            for idx in range(args.rows // 10)]
+
+    def column(data, dataPath=''):
+        return schedules.ScheduleColumn(SimpleNamespace(
+            name='Column', data=data, data_path=dataPath))
+
+    return [
+        measure('schedules.group_rows',
+                lambda: schedules.group_rows(rows), args.repeat),
+        measure('schedules.column.names',
+                lambda: column('--', '.name').values(objs), args.repeat),
+        measure('schedules.column.distances',
+                lambda: column('.dimensions[0]').values(objs), args.repeat),
+        measure('schedules.column.id_props',
+                lambda: column('--', '.props["width"]').values(objs), args.repeat),
+    ]
+
+
+def line_coords(count, seed=0):
+    """
+    `count` random segments in front of the stand-in camera, up to about
+    50 pixels long like the edges of a detailed mesh
+    """
+    rnd = random.Random(seed)
+    coords = []
+    for idx in range(count):
+        start = (rnd.uniform(-8, 8), rnd.uniform(-4, 4), rnd.uniform(-1, 1))
+        coords.append(start)
+        coords.append(tuple(value + rnd.uniform(-0.3, 0.3) for value in start))
+    return coords
+
+
+def geometry_benchmarks(args):
+    kernels = standin.load_module('measureit_arch_kernels')
+    rnd = random.Random(0)
+    points = [tuple(rnd.uniform(-10, 10) for axis in range(3))
+              for idx in range(args.values)]
+    quads = list(zip(points, points[1:], points[2:], points[3:]))
+
+    def text_cards():
+        for idx, point in enumerate(points):
+            kernels.text_card_coords(
+                120, 40, 150, 12, 1.0, 'C', 'T', (0, 0, idx * 0.01), point)
+
+    def arcs():
+        for quad in quads:
+            kernels.get_arc_data(*quad)
+
+    def sorted_points():
+        for p1, p2 in zip(points, points[1:]):
+            kernels.sortPoints(p1, p2)
+
+    return [
+        measure('geometry.text_card', text_cards, args.repeat),
+        measure('geometry.arc_data', arcs, args.repeat),
+        measure('geometry.sort_points', sorted_points, args.repeat),
+        measure('geometry.bounds',
+                lambda: kernels.get_axis_aligned_bounds(points), args.repeat),
+    ]
+
+
+def svg_benchmarks(args):
+    svgShaders = standin.load_module('svg_shaders')
+    Matrix = svgShaders.Matrix
+    scene = standin.make_scene(depthTest=True)
+    standin.set_scene(scene)
+
+    coords = line_coords(args.segments)
+    mat = Matrix.Identity(4)
+    item = standin.Props(name='Lines', inFront=False, lineDepthOffset=0)
+    itemProps = standin.Props(
+        name='Lines', inFront=False, lineDepthOffset=0, lineDrawDashed=False,
+        lineDrawHidden=False, pointPass=False)
+
+    # A floor at z = 0, hiding the samples below it
+    render = scene.render
+    depthbuffer = [0.099] * (render.resolution_x * render.resolution_y)
+
+    def depth_test(enabled):
+        def run():
+            scene.MeasureItArchProps.vector_depthtest = enabled
+            svgShaders.depthbuffer = depthbuffer
+            for idx in range(0, len(coords), 2):
+                svgShaders.depth_test(
+                    coords[idx], coords[idx + 1], mat, item, depthbuffer)
+        return run
+
+    drawing = {}
+
+    def new_drawing():
+        scene.MeasureItArchProps.vector_depthtest = False
+        drawing['svg'] = svgShaders.svgwrite.Drawing(
+            size=(render.resolution_x, render.resolution_y))
+
+    def write_lines():
+        svgShaders.svg_line_shader(
+            item, itemProps, coords, 1.0, (0, 0, 0, 1), drawing['svg'])
+
+    def write_document():
+        write_lines()
+        drawing['svg'].tostring()
+
+    return [
+        measure('depth_test.disabled', depth_test(False), args.repeat),
+        measure('depth_test.enabled', depth_test(True), args.repeat),
+        measure('svg.lines', write_lines, args.repeat, setup=new_drawing),
+        measure('svg.document', write_document, args.repeat, setup=new_drawing),
+    ]
+
+
+SUITES = {
+    'units': unit_benchmarks,
+    'geometry': geometry_benchmarks,
+    'schedules': schedule_benchmarks,
+    'svg': svg_benchmarks,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--values', type=int, default=10000,
+                        help="Lengths formatted and points processed per run")
+    parser.add_argument('--frames', type=int, default=50,
+                        help="Frames the formatted lengths are redrawn for")
+    parser.add_argument('--rows', type=int, default=100000,
+                        help="Schedule rows grouped per run")
+    parser.add_argument('--segments', type=int, default=2000,
+                        help="Line segments depth tested and written per run")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                        help="Suites to run, all by default")
+    parser.add_argument('--output', default=None,
+                        help="Write the results as JSON to this file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    standalone = standin.install()
+
+    records = []
+    for name in args.suite or sorted(SUITES):
+        for record in SUITES[name](args):
+            report(record)
+            records.append(record)
+
+    if args.output:
+        params = {key: value for key, value in vars(args).items()
+                  if key != 'output'}
+        write_results(args.output, 'kernels', params, records,
+                      {'standin': standalone})
+    return records
+
+
+if __name__ == '__main__':
+    main()
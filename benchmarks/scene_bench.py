@@ -0,0 +1,319 @@
+"""
+Synthetic scene benchmarks, run in Blender from the add-on directory:
+
+    blender -b --factory-startup --python benchmarks/scene_bench.py -- \\
+        --objects 50 --aligned 4 --axis 4 --area 2 --annotations 2 \\
+        --output scene.json
+
+The add-on is registered from this directory, so it doesn't need to be
+installed. Each object is a subdivided cube with a crease line group and
+the requested dimensions and annotations; some are instanced through a
+collection, and a camera view with a hatched material is set up for the
+PNG and SVG renders.
+"""
+
+import argparse
+import importlib.util
+import math
+import os
+import shutil
+import sys
+import tempfile
+
+import bmesh
+import bpy
+import gpu
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from benchmarks import measure, report, write_results  # noqa: E402
+from benchmarks.standin import ADDON_DIR, PACKAGE  # noqa: E402
+
+
+def register_addon():
+    """ Import the add-on in this directory as `PACKAGE` and register it """
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PACKAGE, os.path.join(ADDON_DIR, '__init__.py'),
+            submodule_search_locations=[ADDON_DIR])
+        addon = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE] = addon
+        spec.loader.exec_module(addon)
+        addon.register()
+    return sys.modules[PACKAGE]
+
+
+def addon_module(name):
+    return sys.modules['{}.{}'.format(PACKAGE, name)]
+
+
+def crease_line_buffer(mesh, angle):
+    """ Vertex pairs of the creased and non manifold edges, as Add Lines By Crease """
+    bm = bmesh.new()
+    bm.from_mesh(mesh)
+    lineBuffer = []
+    for edge in bm.edges:
+        faces = edge.link_faces
+        if len(faces) == 2 and faces[0].normal.angle(faces[1].normal, 0) <= angle:
+            continue
+        lineBuffer.extend(vert.index for vert in edge.verts)
+    bm.free()
+    return lineBuffer
+
+
+def new_mesh_object(name, subdivisions, collection):
+    mesh = bpy.data.meshes.new(name)
+    bm = bmesh.new()
+    bmesh.ops.create_cube(bm, size=1.0)
+    if subdivisions > 0:
+        bmesh.ops.subdivide_edges(
+            bm, edges=bm.edges[:], cuts=subdivisions, use_grid_fill=True)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    obj = bpy.data.objects.new(name, mesh)
+    collection.objects.link(obj)
+    return obj
+
+
+def add_dimensions(obj, args):
+    dimGen = obj.DimensionGenerator
+    numVerts = len(obj.data.vertices)
+
+    for dimType, count in (('alignedDimensions', args.aligned),
+                           ('axisDimensions', args.axis)):
+        for idx in range(count):
+            dim = getattr(dimGen, dimType).add()
+            dim.name = 'Dimension {}'.format(idx + 1)
+            dim.itemType = dimType
+            dim.dimObjectA = obj
+            dim.dimObjectB = obj
+            dim.dimPointA = (idx * 7) % numVerts
+            dim.dimPointB = (idx * 7 + numVerts // 2) % numVerts
+            dim.textAlignment = 'C'
+            if dimType == 'axisDimensions':
+                dim.dimAxis = 'XYZ'[idx % 3]
+            dimGen.wrapper.add().itemType = dimType
+            dimGen.measureit_arch_num += 1
+
+    polygons = obj.data.polygons
+    for idx in range(min(args.area, len(polygons))):
+        face = polygons[(idx * 5) % len(polygons)]
+        dim = dimGen.areaDimensions.add()
+        dim.name = 'Area {}'.format(idx + 1)
+        dim.itemType = 'areaDimensions'
+        dim['facebuffer'] = [face.index]
+        dim['perimeterEdgeBuffer'] = [
+            obj.data.loops[loopIdx].edge_index for loopIdx in face.loop_indices]
+        dim.originFaceIdx = face.index
+        dimGen.wrapper.add().itemType = 'areaDimensions'
+        dimGen.measureit_arch_num += 1
+
+
+def add_annotations(obj, args):
+    annotationGen = obj.AnnotationGenerator
+    numVerts = len(obj.data.vertices)
+    for idx in range(args.annotations):
+        annotationGen.num_annotations += 1
+        anno = annotationGen.annotations.add()
+        anno.name = 'Annotation {}'.format(idx + 1)
+        anno.itemType = 'annotations'
+        anno.annotationAnchorObject = obj
+        anno.annotationAnchor = (idx * 11) % numVerts
+        anno.textFields.add().text = '{} {}'.format(obj.name, anno.name)
+
+
+def add_line_group(obj, args):
+    lineGen = obj.LineGenerator
+    lineGroup = lineGen.line_groups.add()
+    lineGroup.name = 'Line 1'
+    lineGroup.itemType = 'line_groups'
+    lineGroup.lineWeight = 1
+    lineGroup['lineBuffer'] = crease_line_buffer(
+        obj.data, math.radians(args.crease_angle))
+    lineGen.line_num += 1
+
+
+def build_scene(args, outputDir):
+    scene = bpy.context.scene
+    scene.render.resolution_x, scene.render.resolution_y = args.resolution
+    scene.render.resolution_percentage = 100
+
+    objects = bpy.data.collections.new('Objects')
+    scene.collection.children.link(objects)
+
+    hatch = bpy.data.materials.new('Hatch')
+    hatch.Hatch.visible = True
+
+    perRow = max(1, int(math.sqrt(args.objects)))
+    for idx in range(args.objects):
+        obj = new_mesh_object(
+            'Object {}'.format(idx + 1), args.subdivisions, objects)
+        obj.location = ((idx % perRow) * 2.0, (idx // perRow) * 2.0, 0.0)
+        obj.data.materials.append(hatch)
+        add_dimensions(obj, args)
+        add_annotations(obj, args)
+        add_line_group(obj, args)
+
+    # Instances of the first objects, through a collection that isn't
+    # linked to the scene itself
+    if args.instances > 0:
+        instanced = bpy.data.collections.new('Instanced')
+        for obj in list(objects.objects)[:args.instanced_objects]:
+            instanced.objects.link(obj.copy())
+        for idx in range(args.instances):
+            empty = bpy.data.objects.new('Instance {}'.format(idx + 1), None)
+            empty.instance_type = 'COLLECTION'
+            empty.instance_collection = instanced
+            empty.location = (-4.0 - (idx % perRow) * 2.0, (idx // perRow) * 2.0, 0.0)
+            scene.collection.objects.link(empty)
+
+    # An orthographic camera over the whole grid
+    extent = perRow * 2.0
+    cameraData = bpy.data.cameras.new('Camera')
+    cameraData.type = 'ORTHO'
+    cameraData.ortho_scale = extent * 2 + 8
+    camera = bpy.data.objects.new('Camera', cameraData)
+    camera.location = (extent / 2 - 2, extent / 2, 20.0)
+    scene.collection.objects.link(camera)
+    scene.camera = camera
+    scene.render.filepath = os.path.join(outputDir, 'render')
+
+    viewGen = scene.ViewGenerator
+    for idx in range(args.views):
+        view = viewGen.views.add()
+        view.name = 'View {}'.format(idx + 1)
+        view.camera = camera
+        view.output_path = outputDir
+    viewGen.active_index = 0
+
+    scheduleGen = scene.ScheduleGenerator
+    schedule = scheduleGen.schedules.add()
+    schedule.name = 'Schedule'
+    schedule.collection = objects
+    schedule.output_path = outputDir
+    schedule.group_rows = True
+    for name, data, dataPath in (('Name', '--', '.name'),
+                                 ('Width', '.dimensions[0]', ''),
+                                 ('Material', '--', '.active_material.name')):
+        column = schedule.columns.add()
+        column.name = name
+        column.data = data
+        column.data_path = dataPath
+    scheduleGen.active_index = 0
+
+
+def draw_offscreen(context, draw):
+    """ Call `draw()` with an offscreen buffer bound, as the image render does """
+    scene = context.scene
+    width, height = scene.render.resolution_x, scene.render.resolution_y
+    offscreen = gpu.types.GPUOffScreen(width, height)
+    try:
+        with offscreen.bind():
+            gpu.matrix.reset()
+            gpu.matrix.load_matrix(scene.camera.matrix_world.inverted())
+            gpu.matrix.load_projection_matrix(scene.camera.calc_matrix_camera(
+                context.view_layer.depsgraph, x=width, y=height))
+            draw()
+    finally:
+        offscreen.free()
+
+
+def run_benchmarks(args):
+    context = bpy.context
+    geometry = addon_module('measureit_arch_geometry')
+    main = addon_module('measureit_arch_main')
+    utils = addon_module('measureit_arch_utils')
+    sceneProps = context.scene.MeasureItArchProps
+
+    def draw_list():
+        with utils.Set_Render(sceneProps):
+            with utils.gl_state:
+                geometry.draw3d_loop(context, context.view_layer.objects)
+        sceneProps.is_render_draw = False
+
+    def clear_caches():
+        geometry.clear_batches()
+        for cache in (geometry.area_cache, geometry.bounds_cache,
+                      geometry.symbol_cache, utils.render_state):
+            cache.clear()
+
+    def update_text():
+        utils.text_update_queue.request_rescan(force=True)
+        main.text_update_loop(context, budget=math.inf)
+
+    return [
+        measure('draw_list.cold', lambda: draw_offscreen(context, draw_list),
+                args.repeat, setup=clear_caches),
+        measure('draw_list.warm', lambda: draw_offscreen(context, draw_list),
+                args.repeat),
+        measure('text_update', lambda: draw_offscreen(context, update_text),
+                args.repeat),
+        measure('render.png', bpy.ops.measureit_arch.renderimagebutton, args.repeat),
+        measure('render.svg', bpy.ops.measureit_arch.rendervectorbutton, args.repeat),
+        measure('schedule', bpy.ops.measureit_arch.generateschedule, args.repeat),
+    ]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='blender -b --python benchmarks/scene_bench.py --',
+        description="Time MeasureIt_ARCH on a synthetic scene")
+    parser.add_argument('--objects', type=int, default=20)
+    parser.add_argument('--subdivisions', type=int, default=4,
+                        help="Cuts per edge of each object's cube")
+    parser.add_argument('--aligned', type=int, default=4,
+                        help="Aligned dimensions per object")
+    parser.add_argument('--axis', type=int, default=4,
+                        help="Axis dimensions per object")
+    parser.add_argument('--area', type=int, default=1,
+                        help="Area dimensions per object")
+    parser.add_argument('--annotations', type=int, default=2,
+                        help="Annotations per object")
+    parser.add_argument('--crease-angle', type=float, default=30.0,
+                        help="Crease angle of the line groups, in degrees")
+    parser.add_argument('--instances', type=int, default=10,
+                        help="Collection instances")
+    parser.add_argument('--instanced-objects', type=int, default=4,
+                        help="Objects in the instanced collection")
+    parser.add_argument('--views', type=int, default=1)
+    parser.add_argument('--resolution', type=int, nargs=2, default=(960, 540))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None,
+                        help="Write the results as JSON to this file ('-' for stdout)")
+    parser.add_argument('--keep-files', action='store_true',
+                        help="Keep the rendered images, SVGs and schedules")
+    return parser.parse_args(argv)
+
+
+def main():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    args = parse_args(argv)
+
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    register_addon()
+
+    outputDir = tempfile.mkdtemp(prefix='measureit_arch_bench_')
+    records = [measure('build_scene', lambda: build_scene(args, outputDir), 1)]
+    if 'error' not in records[0]:
+        records.extend(run_benchmarks(args))
+    for record in records:
+        report(record)
+
+    if args.output:
+        params = {key: value for key, value in vars(args).items()
+                  if key not in ('output', 'keep_files')}
+        write_results(args.output, 'scene', params, records, {
+            'blender': bpy.app.version_string,
+            'background': bpy.app.background,
+        })
+
+    if not args.keep_files:
+        shutil.rmtree(outputDir)
+    else:
+        print("Output kept in {}".format(outputDir))
+
+
+if __name__ == '__main__':
+    main()
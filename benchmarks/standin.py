@@ -0,0 +1,308 @@
+"""
+Minimal stand-ins for `bpy`, `mathutils` and the other Blender modules, so
+the add-on's pure Python code can be imported and timed by a plain Python
+interpreter.
+
+Only what module level code and the benchmarked kernels touch is
+implemented: Blender types are empty classes, property functions return
+None and `bpy.context` holds a scene with an orthographic camera looking
+down -Z. Anything else fails loudly rather than returning made up values.
+"""
+
+import importlib
+import importlib.util
+import math
+import os
+import site
+import sys
+import types
+
+from types import SimpleNamespace
+
+ADDON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Name the add-on's modules are imported under, see `load_module`
+PACKAGE = 'measureit_arch'
+
+
+class Vector(object):
+    """ Float vector with the `mathutils.Vector` operators kernels use """
+
+    __slots__ = ('_v',)
+
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self._v = [float(value) for value in values]
+
+    def __len__(self):
+        return len(self._v)
+
+    def __iter__(self):
+        return iter(self._v)
+
+    def __getitem__(self, idx):
+        return self._v[idx]
+
+    def __setitem__(self, idx, value):
+        self._v[idx] = float(value)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return 'Vector({})'.format(tuple(self._v))
+
+    def _axis(idx):
+        return property(lambda self: self._v[idx],
+                        lambda self, value: self.__setitem__(idx, value))
+
+    x, y, z, w = _axis(0), _axis(1), _axis(2), _axis(3)
+    del _axis
+
+    @property
+    def xyz(self):
+        return Vector(self._v[:3])
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self, other))
+
+    def __mul__(self, scalar):
+        return Vector(a * scalar for a in self)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return Vector(a / scalar for a in self)
+
+    def __neg__(self):
+        return Vector(-a for a in self)
+
+    def __matmul__(self, other):
+        return self.dot(other)
+
+    def dot(self, other):
+        return sum(a * b for a, b in zip(self, other))
+
+    def cross(self, other):
+        ax, ay, az = self._v[:3]
+        bx, by, bz = other[:3]
+        return Vector((ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx))
+
+    @property
+    def length(self):
+        return math.sqrt(self.dot(self))
+
+    def normalized(self):
+        length = self.length
+        return Vector(self) if length == 0 else self / length
+
+    def normalize(self):
+        self._v = self.normalized()._v
+
+    def copy(self):
+        return Vector(self)
+
+    def rotate(self, rotation):
+        self._v = rotation @ self
+
+
+class Quaternion(object):
+    """ Rotation as (w, x, y, z), only applied to vectors """
+
+    def __init__(self, values=(1.0, 0.0, 0.0, 0.0)):
+        self.w, self.x, self.y, self.z = (float(value) for value in values)
+
+    def __iter__(self):
+        return iter((self.w, self.x, self.y, self.z))
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other)
+
+    def __matmul__(self, vec):
+        # v + 2w(q x v) + 2q x (q x v)
+        axis = Vector((self.x, self.y, self.z))
+        twice = axis.cross(vec) * 2
+        return (Vector(vec) + twice * self.w + axis.cross(twice))._v
+
+
+class Matrix(object):
+    """ Square matrix of rows, multiplied with matrices and vectors """
+
+    def __init__(self, rows=((1, 0, 0, 0), (0, 1, 0, 0),
+                             (0, 0, 1, 0), (0, 0, 0, 1))):
+        self.rows = [[float(value) for value in row] for row in rows]
+
+    @classmethod
+    def Identity(cls, size):
+        return cls([[float(row == col) for col in range(size)]
+                    for row in range(size)])
+
+    @classmethod
+    def Translation(cls, vec):
+        mat = cls.Identity(4)
+        for axis in range(3):
+            mat.rows[axis][3] = float(vec[axis])
+        return mat
+
+    @property
+    def row(self):
+        return [Vector(row) for row in self.rows]
+
+    @property
+    def translation(self):
+        return Vector(row[3] for row in self.rows[:3])
+
+    def __iter__(self):
+        return (Vector(row) for row in self.rows)
+
+    def __matmul__(self, other):
+        if isinstance(other, Matrix):
+            cols = list(zip(*other.rows))
+            return Matrix([[sum(a * b for a, b in zip(row, col)) for col in cols]
+                           for row in self.rows])
+
+        size = len(self.rows)
+        vec = list(other)
+        if len(vec) == size - 1:
+            # Points are transformed as (x, y, z, 1)
+            result = [sum(a * b for a, b in zip(row, vec + [1.0]))
+                      for row in self.rows]
+            return Vector(result[:size - 1])
+        return Vector(sum(a * b for a, b in zip(row, vec)) for row in self.rows)
+
+    def to_quaternion(self):
+        (m00, m01, m02), (m10, m11, m12), (m20, m21, m22) = \
+            (row[:3] for row in self.rows[:3])
+        w = math.sqrt(max(0.0, 1 + m00 + m11 + m22)) / 2
+        x = math.copysign(math.sqrt(max(0.0, 1 + m00 - m11 - m22)) / 2, m21 - m12)
+        y = math.copysign(math.sqrt(max(0.0, 1 - m00 + m11 - m22)) / 2, m02 - m20)
+        z = math.copysign(math.sqrt(max(0.0, 1 - m00 - m11 + m22)) / 2, m10 - m01)
+        return Quaternion((w, x, y, z))
+
+
+class Color(tuple):
+    pass
+
+
+class Euler(tuple):
+    pass
+
+
+class StandInType(object):
+    """ Blender types and property functions, which accept anything """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class StandInModule(types.ModuleType):
+    """ Module whose unknown attributes are new `StandInType` subclasses """
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        value = type(name, (StandInType,), {})
+        setattr(self, name, value)
+        return value
+
+
+class Props(SimpleNamespace):
+    """ Property group supporting the `'name' in props` test of ID props """
+
+    def __contains__(self, name):
+        return name in self.__dict__
+
+
+def make_scene(width=1920, height=1080, orthoScale=20.0, depthTest=False):
+    """
+    Scene of the stand-in `bpy.context`: an orthographic camera 10 units
+    above the origin, looking down -Z
+    """
+    camera = SimpleNamespace(
+        location=Vector((0, 0, 10)),
+        matrix_world=Matrix.Translation((0, 0, 10)),
+        data=SimpleNamespace(type='ORTHO', clip_start=0.1, clip_end=100.0,
+                             ortho_scale=orthoScale))
+    return SimpleNamespace(
+        camera=camera,
+        render=SimpleNamespace(resolution_x=width, resolution_y=height,
+                               resolution_percentage=100),
+        unit_settings=SimpleNamespace(
+            system='METRIC', length_unit='METERS', use_separate=False,
+            scale_length=1.0, system_rotation='DEGREES'),
+        MeasureItArchProps=Props(
+            vector_depthtest=depthTest, hide_units=False, use_unit_scale=False,
+            metric_precision=2, imperial_precision='64', angle_precision=0),
+        ViewGenerator=SimpleNamespace(views=[], active_index=0))
+
+
+def world_to_camera_view(scene, camera, coord):
+    """ `bpy_extras.object_utils.world_to_camera_view` of an ortho camera """
+    scale = camera.data.ortho_scale
+    render = scene.render
+    aspect = render.resolution_x / render.resolution_y
+    local = Vector(coord) - camera.location
+    return Vector((local.x / scale + 0.5, local.y * aspect / scale + 0.5,
+                   -local.z))
+
+
+def install(scene=None):
+    """
+    Put the stand-ins in `sys.modules`. Does nothing inside Blender, where
+    the real modules are importable.
+    """
+    try:
+        import bpy  # noqa: F401
+        return False
+    except ImportError:
+        pass
+
+    def module(name, **attrs):
+        mod = StandInModule(name)
+        mod.__dict__.update(attrs)
+        sys.modules[name] = mod
+        return mod
+
+    bpyModule = module('bpy', context=SimpleNamespace(scene=scene or make_scene()))
+    bpyModule.types = module('bpy.types')
+    bpyModule.props = module('bpy.props')
+    bpyModule.app = module('bpy.app')
+    bpyModule.app.handlers = module('bpy.app.handlers', persistent=lambda func: func)
+    bpyModule.utils = module('bpy.utils')
+    bpyModule.path = module('bpy.path')
+
+    bpyExtras = module('bpy_extras')
+    bpyExtras.object_utils = module(
+        'bpy_extras.object_utils', world_to_camera_view=world_to_camera_view)
+
+    module('mathutils', Vector=Vector, Matrix=Matrix, Quaternion=Quaternion,
+           Color=Color, Euler=Euler)
+    module('mathutils.geometry')
+    for name in ('bmesh', 'bgl', 'blf', 'gpu', 'gpu_extras', 'addon_utils'):
+        module(name)
+    module('gpu_extras.batch')
+
+    # svgwrite and fontTools ship with the add-on
+    site.addsitedir(os.path.join(ADDON_DIR, 'libs'))
+    return True
+
+
+def set_scene(scene):
+    """ Replace the scene of the stand-in `bpy.context` """
+    sys.modules['bpy'].context.scene = scene
+
+
+def load_module(name):
+    """
+    Import the add-on module `name` (e.g. 'measureit_arch_units') as part
+    of a package that doesn't run the add-on's `__init__.py`, which needs
+    the whole of Blender to register its classes
+    """
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_loader(PACKAGE, loader=None, is_package=True)
+        package = importlib.util.module_from_spec(spec)
+        package.__path__ = [ADDON_DIR]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module('{}.{}'.format(PACKAGE, name))
@@ -42,7 +42,8 @@ from bpy.props import (
 from mathutils import Vector
 
 from .measureit_arch_baseclass import BaseWithText
-from .measureit_arch_utils import get_smart_selected
+from .measureit_arch_utils import get_smart_selected, text_update_queue, batch_cache, \
+    render_state
 
 
 def update_active_annotation(self, context):
@@ -59,6 +60,8 @@ def annotation_update_flag(self, context):
     for textField in self.textFields:
         textField.text_updated = True
         update_custom_props(self, context)
+    text_update_queue.push(self)
+    batch_cache.invalidate(self.as_pointer())
 
 
 def update_custom_props(self, context):
@@ -662,7 +665,7 @@ class RotateAnnotationOp(bpy.types.Operator):
         context.area.tag_redraw()
         myobj = context.selected_objects[self.objIndex]
         annotation = myobj.AnnotationGenerator.annotations[self.idx]
-        center = annotation.gizLoc
+        center = Vector(render_state.read(annotation, 'gizLoc'))
         region = bpy.context.region
         rv3d = bpy.context.space_data.region_3d
         center = view3d_utils.location_3d_to_region_2d(region, rv3d, center)
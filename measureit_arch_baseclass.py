@@ -5,9 +5,14 @@ from bpy.types import PropertyGroup, Operator
 from bpy.props import IntProperty, CollectionProperty, FloatVectorProperty, \
     BoolProperty, StringProperty, FloatProperty, EnumProperty, PointerProperty
 
+from .measureit_arch_utils import text_update_queue, batch_cache
+from .measureit_arch_units import invalidate_unit_formatter
+
 
 def update_flag(self, context):
     self.text_updated = True
+    text_update_queue.push(self)
+    batch_cache.invalidate(self.as_pointer())
 
 
 def has_dimension_generator(context):
@@ -424,7 +429,8 @@ class MeasureItARCHSceneProps(PropertyGroup):
     hide_units: BoolProperty(
         name="Hide Units",
         description="Do not display unit of measurement on viewport",
-        default=False)
+        default=False,
+        update=invalidate_unit_formatter)
 
     measureit_arch_dim_axis: EnumProperty(
         items=(('X', "X", "X Axis"),
@@ -446,13 +452,30 @@ class MeasureItARCHSceneProps(PropertyGroup):
     use_unit_scale: BoolProperty(
         name='Use Unit Scale',
         description='',
-        default=False)
+        default=False,
+        update=invalidate_unit_formatter)
 
     text_updated: BoolProperty(
         name='text_updated',
         description='flag when text needs to be redrawn',
         default=False)
 
+    show_gl_stats: BoolProperty(
+        name="GL Call Counter",
+        description="(DEBUG) Show the OpenGL state calls issued and skipped in the last redraw",
+        default=False)
+
+    show_cull_stats: BoolProperty(
+        name="Culling Stats",
+        description="(DEBUG) Show the items, text and end caps culled in the last redraw in the viewport",
+        default=False)
+
+    use_profiler: BoolProperty(
+        name="Profile Drawing",
+        description="(DEBUG) Time the drawing of each item type and object, "
+                    "and show the slowest in the viewport",
+        default=False)
+
     debug_flip_text: BoolProperty(
         name="Debug Text Flip Vectors",
         description="Displys Text Card and View Vectors used to Flip Text",
@@ -518,7 +541,8 @@ class MeasureItARCHSceneProps(PropertyGroup):
 
     angle_precision: IntProperty(
         name='Angle Precision', min=0, max=5, default=0,
-        description="Angle decimal precision")
+        description="Angle decimal precision",
+        update=invalidate_unit_formatter)
 
     imperial_precision: EnumProperty(
         items=(('1', "1\"", "1 Inch"),
@@ -529,18 +553,58 @@ class MeasureItARCHSceneProps(PropertyGroup):
                ('32', "1/32\"", "1/32th Inch"),
                ('64', "1/64\"", "1/64th Inch")),
         name="Imperial Precision",
-        description="Measurement Precision for Imperial Units")
+        description="Measurement Precision for Imperial Units",
+        update=invalidate_unit_formatter)
 
     use_text_autoplacement: BoolProperty(
         name="Use Text Autoplacement",
         description="Adjust Dimension Text Placement Automatically",
         default=True)
 
+    use_label_solver: BoolProperty(
+        name="Avoid Label Overlaps",
+        description="Move dimension and annotation text that overlaps other "
+                    "text on screen above, below or outside its dimension, "
+                    "or onto a leader",
+        default=False)
+
+    use_line_lod: BoolProperty(
+        name="Simplify Distant Lines",
+        description="Draw dense line groups with fewer segments when they're "
+                    "small on screen",
+        default=True)
+
+    use_disk_cache: BoolProperty(
+        name="Cache Geometry on Disk",
+        description="Keep area triangulations, convex hulls and simplified "
+                    "line groups in a folder next to the saved file, so "
+                    "they're not rebuilt when it's opened again",
+        default=False)
+
+    use_culling: BoolProperty(
+        name="Cull Hidden Items",
+        description="Skip drawing items outside the viewport, and text and "
+                    "end caps too small to read",
+        default=True)
+
+    cull_min_pixels: IntProperty(
+        name="Minimum Size",
+        description="Text and end caps smaller than this on screen aren't "
+                    "drawn in the viewport (0 to draw all)",
+        default=3, min=0, soft_max=20,
+        subtype='PIXEL')
+
     keep_freestyle_svg: BoolProperty(
         name="Keep Freestyle SVG",
         description="When Embeding a Freestyle SVG, keep the generated Freestyle SVG as a seperate file as well",
         default=False,)
 
+    purge_on_save: BoolProperty(
+        name="Purge Phantom Objects on Save",
+        description="When saving, remove the MeasureIt_ARCH data of objects that are not in any scene. "
+                    "Disable to keep saving fast in large files and purge manually instead",
+        default=True,)
+
     default_resolution: IntProperty(
         name='Default Resolution ', min=1,
         default=150,
@@ -551,7 +615,8 @@ class MeasureItARCHSceneProps(PropertyGroup):
 
     metric_precision: IntProperty(
         name='Precision', min=0, max=5, default=2,
-        description="Metric decimal precision")
+        description="Metric decimal precision",
+        update=invalidate_unit_formatter)
 
     hide_titleblock: BoolProperty(
         name="Hide Titleblock",
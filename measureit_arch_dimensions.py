@@ -35,7 +35,7 @@ from mathutils import Vector
 
 from .measureit_arch_baseclass import BaseDim, recalc_dimWrapper_index
 from .measureit_arch_utils import get_smart_selected, \
-    get_selected_vertex_history, get_selected_faces
+    get_selected_vertex_history, get_selected_faces, render_state
 from .measureit_arch_units import BU_TO_FEET
 
 
@@ -50,8 +50,8 @@ def update_active_dim(self, context):
             for item in typeContainer:
                 item.is_active = False
 
-    activeItem = eval('Generator.' + activeWraper.itemType +
-                      '[activeWraper.itemIndex]')
+    activeItem = getattr(Generator, activeWraper.itemType)[
+        activeWraper.itemIndex]
     activeItem.is_active = True
 
 
@@ -309,6 +309,7 @@ class AddAlignedDimensionButton(Operator):
             # Set Common Values
             for newDimension in newDimensions:
                 newDimension.itemType = 'alignedDimensions'
+                newDimension.textFields.add()
                 newDimension.style = sceneProps.default_dimension_style
                 if sceneProps.default_dimension_style != '':
                     newDimension.uses_style = True
@@ -470,6 +471,7 @@ class AddAxisDimensionButton(Operator):
             # Set Common Values
             for newDimension in newDimensions:
                 newDimension.itemType = 'axisDimensions'
+                newDimension.textFields.add()
                 newDimension.style = sceneProps.default_dimension_style
                 if sceneProps.default_dimension_style != '':
                     newDimension.uses_style = True
@@ -548,6 +550,7 @@ class AddAreaButton(Operator):
                 # Add perimeter edges to buffer
                 newDim['perimeterEdgeBuffer'] = perimiterEdges
                 newDim.name = 'Area {}'.format(len(dimGen.areaDimensions))
+                newDim.textFields.add()
                 newDim.fillColor = (
                     random.random(), random.random(), random.random(), 1)
 
@@ -610,6 +613,7 @@ class AddAngleButton(Operator):
                 newDimension.itemType = 'angleDimensions'
                 newDimension.name = 'Angle {}'.format(
                     len(DimGen.angleDimensions))
+                newDimension.textFields.add()
                 newWrapper = DimGen.wrapper.add()
                 newWrapper.itemType = 'angleDimensions'
                 recalc_dimWrapper_index(self, context)
@@ -674,6 +678,10 @@ class AddArcButton(Operator):
                 newDimension = DimGen.arcDimensions.add()
                 newDimension.itemType = 'arcDimensions'
                 newDimension.name = 'Arc {}'.format(len(DimGen.arcDimensions))
+
+                # Radius and length text
+                newDimension.textFields.add()
+                newDimension.textFields.add()
                 newDimension.lineWeight = 2
                 newWrapper = DimGen.wrapper.add()
                 newWrapper.itemType = 'arcDimensions'
@@ -727,7 +735,7 @@ class CursorToArcOrigin(Operator):
 
         if activeWrapperItem.itemType == 'arcDimensions':
             arc = dimGen.arcDimensions[activeWrapperItem.itemIndex]
-            center = arc.arcCenter
+            center = render_state.read(arc, 'arcCenter')
             cursor.location = center
             return {'FINISHED'}
         else:
@@ -1024,8 +1032,8 @@ class OBJECT_PT_UIDimensions(Panel):
             # Settings Below List
             if len(dimGen.wrapper) > 0 and dimGen.active_index < len(dimGen.wrapper):
                 activeWrapperItem = dimGen.wrapper[dimGen.active_index]
-                item = eval('dimGen.' + activeWrapperItem.itemType +
-                            '[activeWrapperItem.itemIndex]')
+                item = getattr(dimGen, activeWrapperItem.itemType)[
+                    activeWrapperItem.itemIndex]
                 idxString = "bpy.context.active_object.DimensionGenerator.wrapper[bpy.context.active_object.DimensionGenerator.active_index].itemIndex"
 
                 ### TEXT FIELDS
@@ -1103,8 +1111,9 @@ class OBJECT_PT_UIDimensions(Panel):
 
                 row.label(text=item.name + ' Settings:')
                 if dimGen.show_dimension_settings:
-                    eval('draw_' + activeWrapperItem.itemType +
-                         '_settings(item, box)')
+                    draw_settings = globals()[
+                        'draw_' + activeWrapperItem.itemType + '_settings']
+                    draw_settings(item, box)
 
 
 
@@ -1419,13 +1428,19 @@ class TranslateDimensionOp(bpy.types.Operator):
     bl_options = {'GRAB_CURSOR', 'INTERNAL', 'BLOCKING', 'UNDO'}
 
     idx: IntProperty()
-    dimType: StringProperty()
+    dimType: StringProperty(
+        description="Dimension collection of the DimensionGenerator, "
+                    "e.g. 'alignedDimensions'")
     offset: FloatProperty(name="Offset")
     objIndex: IntProperty()
 
-    def modal(self, context, event):
+    def get_dimension(self, context):
         myobj = context.selected_objects[self.objIndex]
-        dimension = eval('myobj.' + self.dimType)
+        dimensions = getattr(myobj.DimensionGenerator, self.dimType)
+        return myobj, dimensions[self.idx]
+
+    def modal(self, context, event):
+        myobj, dimension = self.get_dimension(context)
         unit_system = bpy.context.scene.unit_settings.system
 
         # Set Tweak Flags
@@ -1513,9 +1528,7 @@ class TranslateDimensionOp(bpy.types.Operator):
         return {'RUNNING_MODAL'}
 
     def invoke(self, context, event):
-        myobj = context.selected_objects[self.objIndex]
-
-        dimension = eval('myobj.' + self.dimType)
+        myobj, dimension = self.get_dimension(context)
         self.init_mouse_x = event.mouse_x
         self.init_mouse_y = event.mouse_y
         self.init_flip = dimension.dimFlip
@@ -29,26 +29,37 @@ import bgl
 import blf
 import bmesh
 import math
-import numpy as np
-import svgwrite
+import sys
 import time
+import unittest
 
-from bpy_extras import mesh_utils
 from datetime import datetime
 from gpu_extras.batch import batch_for_shader
-from math import fabs, degrees, radians, sin, pi
+from itertools import chain
+from math import fabs, degrees, radians, pi
 from mathutils import Vector, Matrix, Euler, Quaternion
-from mathutils.geometry import area_tri
 from sys import getrecursionlimit, setrecursionlimit
 
 from . import svg_shaders
 from .shaders import *
 from .measureit_arch_baseclass import TextField, recalc_dimWrapper_index
+from .measureit_arch_kernels import get_arc_data, get_axis_aligned_bounds, \
+    get_dom_axis, place_labels, sortPoints, text_card_coords, cap_offset
 from .measureit_arch_units import BU_TO_INCHES, format_distance, format_angle, \
-    format_area
-from .measureit_arch_utils import get_rv3d, get_view, interpolate3d, get_camera_z_dist, get_camera_z, recursionlimit, OpenGL_Settings, get_sv3d
+    format_area, refresh_unit_formatter
+from .measureit_arch_utils import get_rv3d, get_view, interpolate3d, get_camera_z_dist, get_camera_z, recursionlimit, OpenGL_Settings, get_sv3d, \
+    text_update_queue, lazy_module, gl_state, batch_cache, render_state, item_index, \
+    DataPathAccessor, sidecar_cache, profiler
+
+np = lazy_module('numpy')
+svgwrite = lazy_module('svgwrite')
 
 lastMode = {}
+# Line groups whose batches were rebuilt in this redraw
+rebuiltLineGroups = set()
+# Hash of the matrices the merged instance batches were built for
+instanceHashes = {}
+lineLODs = {}
 lineBatch3D = {}
 dashedBatch3D = {}
 hiddenBatch3D = {}
@@ -71,53 +82,86 @@ else:
     textfrag = Text_Shader.fragment_shader
 
 
-lineShader = gpu.types.GPUShader(
-    Base_Shader_3D.vertex_shader,
-    aafrag,
-    geocode=Line_Shader_3D.geometry_shader)
-
-lineGroupShader = gpu.types.GPUShader(
-    Line_Group_Shader_3D.vertex_shader,
-    aafrag,
-    geocode=Line_Group_Shader_3D.geometry_shader)
-
-triShader = gpu.types.GPUShader(
-    Base_Shader_3D.vertex_shader,
-    basefrag)
-
-dashedLineShader = gpu.types.GPUShader(
-    Dashed_Shader_3D.vertex_shader,
-    dashedfrag,
-    geocode=Dashed_Shader_3D.geometry_shader)
-
-pointShader = gpu.types.GPUShader(
-    Point_Shader_3D.vertex_shader,
-    aafrag,
-    geocode=Point_Shader_3D.geometry_shader)
+class ShaderRegistry:
+    """
+    Compiles shaders the first time they are used instead of at import, so
+    loading the add-on stays fast and works in background mode, where there
+    is no GPU context. Shaders are attributes, named after their sources.
+    """
 
-textShader = gpu.types.GPUShader(
-    Text_Shader.vertex_shader,
-    textfrag)
+    def __init__(self, sources):
+        self.sources = sources
+
+    def __getattr__(self, name):
+        # Only called for shaders that haven't been compiled yet
+        sources = self.__dict__.get('sources', {})
+        if name not in sources:
+            raise AttributeError(name)
+        vertex, fragment, geometry = sources[name]
+        shader = gpu.types.GPUShader(vertex, fragment, geocode=geometry)
+        setattr(self, name, shader)
+        return shader
+
+    def compiled(self):
+        return [name for name in self.sources if name in self.__dict__]
+
+    def clear(self):
+        for name in self.sources:
+            self.__dict__.pop(name, None)
+
+
+gpuShaders = ShaderRegistry({
+    'lineShader': (
+        Base_Shader_3D.vertex_shader, aafrag,
+        Line_Shader_3D.geometry_shader),
+    'lineGroupShader': (
+        Line_Group_Shader_3D.vertex_shader, aafrag,
+        Line_Group_Shader_3D.geometry_shader),
+    'triShader': (
+        Base_Shader_3D.vertex_shader, basefrag, None),
+    'dashedLineShader': (
+        Dashed_Shader_3D.vertex_shader, dashedfrag,
+        Dashed_Shader_3D.geometry_shader),
+    'pointShader': (
+        Point_Shader_3D.vertex_shader, aafrag,
+        Point_Shader_3D.geometry_shader),
+    'textShader': (
+        Text_Shader.vertex_shader, textfrag, None),
+    'objectLineShader': (
+        Object_Shader_3D.vertex_shader, aafrag,
+        Line_Shader_3D.geometry_shader),
+    'objectTriShader': (
+        Object_Shader_3D.vertex_shader, basefrag, None),
+    'objectPointShader': (
+        Object_Shader_3D.vertex_shader, aafrag,
+        Point_Shader_3D.geometry_shader),
+    'depthOnlyShader': (
+        Base_Shader_3D.vertex_shader, DepthOnlyFrag.fragment_shader, None),
+})
 
 
 def get_dim_tag(self, obj):
     dimGen = obj.DimensionGenerator
     itemType = self.itemType
-    idx = 0
-    for wrap in dimGen.wrapper:
-        if itemType == wrap.itemType:
-            if self == eval('dimGen.' + itemType + '[wrap.itemIndex]'):
-                return idx
-        idx += 1
+    location = item_index.locate(dimGen, self, (itemType,))
+    if location is None:
+        return None
+    itemIndex = location[1]
+    for idx, wrap in enumerate(dimGen.wrapper):
+        if wrap.itemIndex == itemIndex and wrap.itemType == itemType:
+            return idx
 
 
 def clear_batches():
     lineBatch3D.clear()
     dashedBatch3D.clear()
     hiddenBatch3D.clear()
+    instanceHashes.clear()
+    lineLODs.clear()
+    batch_cache.invalidate()
 
 
-def update_text(textobj, props, context, fields=[]):
+def update_text(textobj, props, context, fields=[], force=False):
     scene = context.scene
     sceneProps = scene.MeasureItArchProps
 
@@ -129,7 +173,7 @@ def update_text(textobj, props, context, fields=[]):
         if textobj.text_updated or props.text_updated:
             textField.text_updated = True
 
-        if textField.text_updated or sceneProps.text_updated:
+        if textField.text_updated or sceneProps.text_updated or force:
             # Get textitem Properties
             rgb = rgb_gamma_correct(props.color)
             size = 20
@@ -210,7 +254,7 @@ def update_text(textobj, props, context, fields=[]):
 
 
 def draw_sheet_views(context, myobj, sheetGen, sheet_view, mat, svg=None):
-
+    textShader = gpuShaders.textShader
     if sheet_view.scene is None:
         return
 
@@ -403,6 +447,7 @@ def draw_material_hatches(context, myobj, mat, svg=None):
 
 
 
+@profiler.timed('alignedDimension', ownerArg=1)
 def draw_alignedDimension(context, myobj, measureGen, dim, mat=None, svg=None):
 
     scene = context.scene
@@ -513,8 +558,9 @@ def draw_alignedDimension(context, myobj, measureGen, dim, mat=None, svg=None):
         # k = Vector((0, 0, 1))
 
         # Set Gizmo Props
-        dim.gizLoc = textLoc
-        dim.gizRotDir = userOffsetVector
+        state = render_state.get(dim)
+        state.gizLoc = Vector(textLoc)
+        state.gizRotDir = Vector(userOffsetVector)
 
         origin = Vector(textLoc)
 
@@ -544,11 +590,13 @@ def draw_alignedDimension(context, myobj, measureGen, dim, mat=None, svg=None):
 
         # Filled Coords Call
         if len(filledCoords) != 0:
-            draw_filled_coords(filledCoords, rgb)
+            draw_filled_coords(filledCoords, rgb,
+                               batchKey=(dim.as_pointer(), 'fill'))
 
         # Line Shader Calls
 
-        draw_lines(lineWeight, rgb, coords, twoPass=True)
+        draw_lines(lineWeight, rgb, coords, twoPass=True,
+                   batchKey=(dim.as_pointer(), 'lines'))
 
         if sceneProps.is_vector_draw:
             svg_dim = svg.add(svg.g(id=dim.name))
@@ -557,12 +605,13 @@ def draw_alignedDimension(context, myobj, measureGen, dim, mat=None, svg=None):
             svg_shaders.svg_fill_shader(
                 dim, filledCoords, rgb, svg, parent=svg_dim)
             for textField in dim.textFields:
-                textcard = textField['textcard']
+                textcard = render_state.get(textField).textcard
                 svg_shaders.svg_text_shader(
                     dim, dimProps, textField.text, origin, textcard, rgb, svg, parent=svg_dim)
 
 
 
+@profiler.timed('boundsDimension', ownerArg=1)
 def draw_boundsDimension(context, myobj, measureGen, dim, mat, svg=None):
     sceneProps = context.scene.MeasureItArchProps
 
@@ -582,84 +631,10 @@ def draw_boundsDimension(context, myobj, measureGen, dim, mat, svg=None):
         # Obj Properties
         # For Collection Bounding Box
         if dim.dimCollection is not None:
-            collection = dim.dimCollection
-            objects = collection.all_objects
-
-            # get the axis aligned bounding coords for each object
-            coords = []
-            for myobj in objects:
-
-                boundsStr = str(myobj.name) + "_bounds"
-                rotStr = str(myobj.name) + "_lastRot"
-                locStr = str(myobj.name) + "_lastLoc"
-                scaleStr = str(myobj.name) + "_lastScale"
-
-                # if no rotation or non mesh obj just use the Objects bounding Box
-                # Also clean up any chached values
-                if myobj.matrix_world.to_quaternion() == Quaternion((1.0, 0.0, 0.0, 0.0)) or myobj.type != 'MESH':
-                    bounds = myobj.bound_box
-                    for coord in bounds:
-                        coords.append(myobj.matrix_world @ Vector(coord))
-
-                        # Also clean up any chached values
-                        try:
-                            del dim[locStr]
-                            del dim[rotStr]
-                            del dim[boundsStr]
-                            del dim[scaleStr]
-                        except KeyError:
-                            pass
-
-                else:  # otherwise get its points and calc its AABB directly
-
-                    try:
-                        if (myobj.matrix_world.to_quaternion() != Quaternion(dim[rotStr]) or
-                            myobj.location != Vector(dim[locStr]) or
-                                myobj.scale != Vector(dim[scaleStr])):
-
-                            obverts = get_mesh_vertices(myobj)
-                            worldObverts = [myobj.matrix_world @
-                                            coord for coord in obverts]
-                            maxX, minX, maxY, minY, maxZ, minZ = get_axis_aligned_bounds(
-                                worldObverts)
-                            dim[boundsStr] = [maxX, minX, maxY, minY, maxZ, minZ]
-                            dim[rotStr] = myobj.matrix_world.to_quaternion()
-                            dim[locStr] = myobj.location
-                            dim[scaleStr] = myobj.scale
-                        else:
-                            maxX, minX, maxY, minY, maxZ, minZ = dim[boundsStr]
-                    except KeyError:
-                        obverts = get_mesh_vertices(myobj)
-                        worldObverts = [myobj.matrix_world @
-                                        coord for coord in obverts]
-                        maxX, minX, maxY, minY, maxZ, minZ = get_axis_aligned_bounds(
-                            worldObverts)
-                        dim[boundsStr] = [maxX, minX, maxY, minY, maxZ, minZ]
-                        dim[rotStr] = myobj.matrix_world.to_quaternion()
-                        dim[locStr] = myobj.location
-                        dim[scaleStr] = myobj.scale
-
-                    coords.append(Vector((maxX, maxY, maxZ)))
-                    coords.append(Vector((minX, minY, minZ)))
-
-            # Get the axis aligned bounding coords for that set of coords
-            maxX, minX, maxY, minY, maxZ, minZ = get_axis_aligned_bounds(coords)
-
-            # distX = maxX - minX
-            # distY = maxY - minY
-            # distZ = maxZ - minZ
-
-            p0 = Vector((minX, minY, minZ))
-            p1 = Vector((minX, minY, maxZ))
-            p2 = Vector((minX, maxY, maxZ))
-            p3 = Vector((minX, maxY, minZ))
-            p4 = Vector((maxX, minY, minZ))
-            p5 = Vector((maxX, minY, maxZ))
-            p6 = Vector((maxX, maxY, maxZ))
-            p7 = Vector((maxX, maxY, minZ))
-
-            bounds = [p0, p1, p2, p3, p4, p5, p6, p7]
-            # print ("X: " + str(distX) + ", Y: " + str(distY) + ", Z: " + str(distZ))
+            aabb = bounds_cache.collection_bounds(dim.dimCollection)
+            if aabb == EMPTY_BOUNDS:
+                return
+            bounds = bounds_from_aabb(aabb)
 
         # Single object bounding Box
         else:
@@ -670,41 +645,8 @@ def draw_boundsDimension(context, myobj, measureGen, dim, mat, svg=None):
                     tempbounds.append(myobj.matrix_world @ Vector(bound))
                 bounds = tempbounds
 
-            else:  # Calc AABB when rotation changes
-                try:
-                    if myobj.matrix_world.to_quaternion() != Quaternion(dim['lastRot']):
-                        obverts = get_mesh_vertices(myobj)
-                        worldObverts = [myobj.matrix_world @
-                                        coord for coord in obverts]
-                        maxX, minX, maxY, minY, maxZ, minZ = get_axis_aligned_bounds(
-                            worldObverts)
-                        dim['bounds'] = [maxX, minX, maxY, minY, maxZ, minZ]
-                        dim['lastRot'] = myobj.matrix_world.to_quaternion()
-                    else:
-                        maxX, minX, maxY, minY, maxZ, minZ = dim['bounds']
-                except KeyError:
-                    obverts = get_mesh_vertices(myobj)
-                    worldObverts = [myobj.matrix_world @
-                                    coord for coord in obverts]
-                    maxX, minX, maxY, minY, maxZ, minZ = get_axis_aligned_bounds(
-                        worldObverts)
-                    dim['bounds'] = [maxX, minX, maxY, minY, maxZ, minZ]
-                    dim['lastRot'] = myobj.matrix_world.to_quaternion()
-
-                # distX = maxX - minX
-                # distY = maxY - minY
-                # distZ = maxZ - minZ
-
-                p0 = Vector((minX, minY, minZ))
-                p1 = Vector((minX, minY, maxZ))
-                p2 = Vector((minX, maxY, maxZ))
-                p3 = Vector((minX, maxY, minZ))
-                p4 = Vector((maxX, minY, minZ))
-                p5 = Vector((maxX, minY, maxZ))
-                p6 = Vector((maxX, maxY, maxZ))
-                p7 = Vector((maxX, maxY, minZ))
-
-                bounds = [p0, p1, p2, p3, p4, p5, p6, p7]
+            else:  # AABB, recalculated when the object changes
+                bounds = bounds_from_aabb(bounds_cache.object_bounds(myobj))
 
         # Points for Bounding Box
         #
@@ -803,9 +745,10 @@ def draw_boundsDimension(context, myobj, measureGen, dim, mat, svg=None):
                     offsetDistance = geoOffsetDistance
 
                 # Set Gizmo Props
-                dim.gizLoc = Vector(midpoint) + \
+                state = render_state.get(dim)
+                state.gizLoc = Vector(midpoint) + \
                     (userOffsetVector * dim.dimOffset)
-                dim.gizRotDir = userOffsetVector
+                state.gizRotDir = Vector(userOffsetVector)
 
                 # Define Lines
                 leadStartA = Vector(p1) + geoOffsetDistance
@@ -835,6 +778,7 @@ def draw_boundsDimension(context, myobj, measureGen, dim, mat, svg=None):
                 if dimText.text != distanceText:
                     dimText.text = distanceText
                     dimText.text_updated = True
+                    text_update_queue.push(dimText)
 
                 placementResults = dim_text_placement(
                     dim, dimProps, origin, dist, distVector, offsetDistance, capSize, textField = dimText)
@@ -849,7 +793,7 @@ def draw_boundsDimension(context, myobj, measureGen, dim, mat, svg=None):
                 dimLineStartCoord = dimLineStart + dimLineVec * dimLineExtension
 
                 if sceneProps.show_dim_text:
-                    square = dimText['textcard']
+                    square = render_state.get(dimText).textcard
                     draw_text_3D(context, dimText, dimProps, myobj, square)
 
                 # Collect coords and endcaps
@@ -871,10 +815,12 @@ def draw_boundsDimension(context, myobj, measureGen, dim, mat, svg=None):
 
                 # Keep this out of the loop to avoid extra draw calls
                 if len(filledCoords) != 0:
-                    draw_filled_coords(filledCoords, rgb)
+                    draw_filled_coords(filledCoords, rgb,
+                                       batchKey=(dim.as_pointer(), 'fill{}'.format(idx)))
 
                 # bind shader
-                draw_lines(lineWeight, rgb, coords, twoPass=True)
+                draw_lines(lineWeight, rgb, coords, twoPass=True,
+                           batchKey=(dim.as_pointer(), 'lines{}'.format(idx)))
 
                 if sceneProps.is_vector_draw:
                     svg_dim = svg.add(svg.g(id=dim.name))
@@ -889,6 +835,7 @@ def draw_boundsDimension(context, myobj, measureGen, dim, mat, svg=None):
 
 
 
+@profiler.timed('axisDimension', ownerArg=1)
 def draw_axisDimension(context, myobj, measureGen, dim, mat, svg=None):
 
     sceneProps = context.scene.MeasureItArchProps
@@ -1049,8 +996,8 @@ def draw_axisDimension(context, myobj, measureGen, dim, mat, svg=None):
             offsetDistance = geoOffsetDistance
 
         # Set Gizmo Props
-  
-        dim.gizRotDir = userOffsetVector
+        state = render_state.get(dim)
+        state.gizRotDir = Vector(userOffsetVector)
 
         # Define Lines
         # get the components of p1 & p1 in the direction zvector
@@ -1086,7 +1033,7 @@ def draw_axisDimension(context, myobj, measureGen, dim, mat, svg=None):
             alignedDistVector[1] * viewAxis[1],
             alignedDistVector[2] * viewAxis[2]))
 
-        dim.gizRotAxis = alignedDistVector
+        state.gizRotAxis = Vector(alignedDistVector)
 
         # Lines
         leadStartA = Vector(basePoint) + geoOffsetDistance
@@ -1104,7 +1051,7 @@ def draw_axisDimension(context, myobj, measureGen, dim, mat, svg=None):
         textLoc = interpolate3d(dimLineStart, dimLineEnd, fabs(dist / 2))
         origin = Vector(textLoc)
 
-        dim.gizLoc = textLoc
+        state.gizLoc = Vector(textLoc)
 
         # Setup Text Fields
         placementResults = setup_dim_text(myobj,dim,dimProps,dist,origin,distVector,offsetDistance)
@@ -1133,10 +1080,12 @@ def draw_axisDimension(context, myobj, measureGen, dim, mat, svg=None):
                 filledCoords.append(filledCoord)
 
         if len(filledCoords) != 0:
-            draw_filled_coords(filledCoords, rgb)
+            draw_filled_coords(filledCoords, rgb,
+                               batchKey=(dim.as_pointer(), 'fill'))
 
         # bind shader
-        draw_lines(lineWeight, rgb, coords, twoPass=True)
+        draw_lines(lineWeight, rgb, coords, twoPass=True,
+                   batchKey=(dim.as_pointer(), 'lines'))
 
         if sceneProps.is_vector_draw:
             svg_dim = svg.add(svg.g(id=dim.name))
@@ -1145,11 +1094,12 @@ def draw_axisDimension(context, myobj, measureGen, dim, mat, svg=None):
             svg_shaders.svg_fill_shader(
                 dim, filledCoords, rgb, svg, parent=svg_dim)
             for textField in dim.textFields:
-                textcard = textField['textcard']
+                textcard = render_state.get(textField).textcard
                 svg_shaders.svg_text_shader(
                     dim, dimProps, textField.text, origin, textcard, rgb, svg, parent=svg_dim)
 
 
+@profiler.timed('angleDimension', ownerArg=1)
 def draw_angleDimension(context, myobj, DimGen, dim, mat, svg=None):
     dimProps = dim
     sceneProps = context.scene.MeasureItArchProps
@@ -1225,12 +1175,10 @@ def draw_angleDimension(context, myobj, DimGen, dim, mat, svg=None):
         angleText = format_angle(angle)
 
         # Update if Necessary
-        if len(dim.textFields) == 0:
-            dim.textFields.add()
-
         if dim.textFields[0].text != angleText:
             dim.textFields[0].text = angleText
             dim.textFields[0].text_updated = True
+            text_update_queue.push(dim.textFields[0])
 
         dimText = dim.textFields[0]
         origin = midPoint
@@ -1278,10 +1226,12 @@ def draw_angleDimension(context, myobj, DimGen, dim, mat, svg=None):
 
         # Draw Filled Faces after
         if len(filledCoords) != 0:
-            draw_filled_coords(filledCoords, rgb)
+            draw_filled_coords(filledCoords, rgb,
+                               batchKey=(dim.as_pointer(), 'fill'))
 
         draw_lines(lineWeight, rgb, coords, twoPass=True,
-                pointPass=True, pointCoords=pointCoords)
+                pointPass=True, pointCoords=pointCoords,
+                batchKey=(dim.as_pointer(), 'lines'))
 
         if sceneProps.is_vector_draw:
             svg_dim = svg.add(svg.g(id=dim.name))
@@ -1294,6 +1244,7 @@ def draw_angleDimension(context, myobj, DimGen, dim, mat, svg=None):
 
 
 
+@profiler.timed('arcDimension', ownerArg=1)
 def draw_arcDimension(context, myobj, DimGen, dim, mat, svg=None):
 
     dimProps = dim
@@ -1391,7 +1342,7 @@ def draw_arcDimension(context, myobj, DimGen, dim, mat, svg=None):
         arc_angle, arc_length = get_arc_data(an_p1, a_p1, an_p2, an_p3)
 
         center = Vector(a_p1)
-        dim.arcCenter = center
+        render_state.get(dim).arcCenter = Vector(center)
 
         # DRAW EVERYTHING AT THE ORIGIN,
         # Well move all our coords back into place by
@@ -1471,11 +1422,6 @@ def draw_arcDimension(context, myobj, DimGen, dim, mat, svg=None):
             coords.append(zeroVec)
             coords.append(radiusLeader)
 
-        # Check for text field
-        if len(dim.textFields) != 2:
-            dim.textFields.add()
-            dim.textFields.add()
-
         radiusText = dim.textFields[0]
         lengthText = dim.textFields[1]
 
@@ -1488,21 +1434,23 @@ def draw_arcDimension(context, myobj, DimGen, dim, mat, svg=None):
         if lengthText.text != lengthStr:
             lengthText.text = lengthStr
             lengthText.text_updated = True
+            text_update_queue.push(lengthText)
 
         if dim.showRadius:
             radStr = 'r ' + format_distance(radius)
             if radiusText.text != radStr:
                 radiusText.text = radStr
                 radiusText.text_updated = True
+                text_update_queue.push(radiusText)
 
             # make Radius text card
             midPoint = Vector(interpolate3d(zeroVec, radiusLeader, radius / 2))
             vecY = midPoint.cross(norm).normalized()
             vecX = midPoint.normalized()
             rad_origin = Vector(midPoint) + 0.04 * vecY + center
-            dim.textAlignment = 'C'
             rad_square = generate_text_card(
-                context, radiusText, dimProps, basePoint=rad_origin, xDir=vecX, yDir=vecY)
+                context, radiusText, TextProps(dimProps, textAlignment='C'),
+                basePoint=rad_origin, xDir=vecX, yDir=vecY)
 
             if sceneProps.show_dim_text:
                 draw_text_3D(
@@ -1528,7 +1476,8 @@ def draw_arcDimension(context, myobj, DimGen, dim, mat, svg=None):
 
         # Draw Our Measurement
         draw_lines(lineWeight, rgb, measure_coords, twoPass=True,
-                pointPass=True, pointCoords=measure_pointCoords)
+                pointPass=True, pointCoords=measure_pointCoords,
+                batchKey=(dim.as_pointer(), 'measure'))
 
         # Draw the arc itself
         coords = []
@@ -1547,14 +1496,17 @@ def draw_arcDimension(context, myobj, DimGen, dim, mat, svg=None):
             arc_pointCoords.append(coord + center)
 
         draw_lines(lineWeight * 2, rgb, arc_coords, twoPass=True,
-                pointPass=True, pointCoords=arc_pointCoords)
+                pointPass=True, pointCoords=arc_pointCoords,
+                batchKey=(dim.as_pointer(), 'arc'))
 
         if dim.showRadius:
             pointCenter = [center]
-            draw_points(lineWeight * 5, rgb, pointCenter)
+            draw_points(lineWeight * 5, rgb, pointCenter,
+                        batchKey=(dim.as_pointer(), 'center'))
 
         if len(filledCoords) != 0:
-            draw_filled_coords(filledCoords, rgb)
+            draw_filled_coords(filledCoords, rgb,
+                               batchKey=(dim.as_pointer(), 'fill'))
 
         if sceneProps.is_vector_draw:
             svg_dim = svg.add(svg.g(id=dim.name))
@@ -1574,6 +1526,7 @@ def draw_arcDimension(context, myobj, DimGen, dim, mat, svg=None):
 
 
 
+@profiler.timed('areaDimension', ownerArg=1)
 def draw_areaDimension(context, myobj, DimGen, dim, mat, svg=None):
     dimProps = dim
     sceneProps = context.scene.MeasureItArchProps
@@ -1597,56 +1550,10 @@ def draw_areaDimension(context, myobj, DimGen, dim, mat, svg=None):
         rawTextRGB = dimProps.color
         textRGB = rgb_gamma_correct(rawTextRGB)
 
-        bm = bmesh.new()
-        if myobj.mode != 'EDIT':
-            eval_res = sceneProps.eval_mods
-            if (eval_res or dim.evalMods) and check_mods(myobj):  # From Evaluated Deps Graph
-                bm.from_object(
-                    myobj, bpy.context.view_layer.depsgraph)
-            else:
-                bm.from_mesh(myobj.data)
-        else:
-            bm = bmesh.from_edit_mesh(myobj.data)
-
-        bm.faces.ensure_lookup_table()
-        bm.edges.ensure_lookup_table()
-        bm.verts.ensure_lookup_table()
-        faces = bm.faces
-
-        # Get the Filled Coord and Sum the Face Areas
-        filledCoords = []
-        sumArea = 0
-        verts = bm.verts
-        for faceIdx in dim['facebuffer'].to_list():
-            face = faces[faceIdx]
-            area = face.calc_area()
-
-            indices = []
-            for vert in face.verts:
-                indices.append(vert.index)
-
-            tris = mesh_utils.ngon_tessellate(myobj.data, indices)
-
-            for tri in tris:
-                v1, v2, v3 = tri
-                p1 = mat @ verts[indices[v1]].co
-                p2 = mat @ verts[indices[v2]].co
-                p3 = mat @ verts[indices[v3]].co
-                filledCoords.append(p1)
-                filledCoords.append(p2)
-                filledCoords.append(p3)
-                area = area_tri(p1, p2, p3)
-                sumArea += area
-
-        # Get the Perimeter Coords
-            perimeterCoords = []
-        for edgeIdx in dim['perimeterEdgeBuffer'].to_list():
-            edge = bm.edges[edgeIdx]
-            verts = edge.verts
-            perimeterCoords.append(mat @ verts[0].co)
-            perimeterCoords.append(mat @ verts[1].co)
-
-
+        # Triangulation and perimeter in object space, the world matrix
+        # is applied by the shaders
+        areaData = area_cache.get(myobj, dim, sceneProps.eval_mods or dim.evalMods)
+        sumArea = areaData.world_area(mat)
 
         # Get local Rotation and Translation
         rot = mat.to_quaternion()
@@ -1656,10 +1563,9 @@ def draw_areaDimension(context, myobj, DimGen, dim, mat, svg=None):
         rotMatrix.rotate(rot)
         rotMatrix.resize_4x4()
 
-        originFace = faces[dim.originFaceIdx]
-        origin = originFace.calc_center_bounds()
-        normal = rotMatrix @ originFace.normal
-        tangent = rotMatrix @ originFace.calc_tangent_edge()
+        origin = areaData.originCenter.copy()
+        normal = rotMatrix @ areaData.originNormal
+        tangent = rotMatrix @ areaData.originTangent
 
         origin += dim.dimTextPos + normal * 0.001
 
@@ -1674,68 +1580,495 @@ def draw_areaDimension(context, myobj, DimGen, dim, mat, svg=None):
 
         origin = mat @ origin
 
-        dimProps.textAlignment = 'C'
-        dimProps.textPosition = 'M'
+        # Area text is always centered
+        textProps = TextProps(dimProps, textAlignment='C', textPosition='M')
+        textDim = textProps if dimProps is dim else dim
 
         # Setup Text Fields
-        placementResults = setup_dim_text(myobj,dim,dimProps, sumArea,origin,vecX,0.0, is_area=True)
+        placementResults = setup_dim_text(myobj,textDim,textProps, sumArea,origin,vecX,0.0, is_area=True)
         origin = placementResults[2]
 
         # Draw Fill
-        draw_filled_coords(filledCoords, fillRGB, polySmooth=False)
+        draw_filled_coords(areaData.filledCoords, fillRGB, polySmooth=False,
+                           batchKey=(dim.as_pointer(), 'fill', areaData.serial),
+                           objectMatrix=mat)
 
         # Draw Perimeter
-        draw_lines(lineWeight, rgb, perimeterCoords,
-                twoPass=True, pointPass=True)
+        draw_lines(lineWeight, rgb, areaData.perimeterCoords,
+                twoPass=True, pointPass=True,
+                batchKey=(dim.as_pointer(), 'lines', areaData.serial),
+                objectMatrix=mat)
 
         # Draw SVG
         if sceneProps.is_vector_draw:
+            filledCoords = [mat @ coord for coord in areaData.filledCoords]
+            perimeterCoords = [mat @ coord for coord in areaData.perimeterCoords]
             svg_dim = svg.add(svg.g(id=dim.name))
             svg_shaders.svg_line_shader(
                 dim, dimProps, perimeterCoords, lineWeight, rgb, svg, parent=svg_dim)
             svg_shaders.svg_fill_shader(
                 dim, filledCoords, fillRGB, svg, parent=svg_dim)
             for textField in dim.textFields:
-                textcard = textField['textcard']
+                textcard = render_state.get(textField).textcard
                 svg_shaders.svg_text_shader(
-                    dim, dimProps, textField.text, origin, textcard, textRGB, svg, parent=svg_dim)
+                    dim, textProps, textField.text, origin, textcard, textRGB, svg, parent=svg_dim)
+
+
+
+class AreaData:
+    """ Object space geometry of an area dimension """
+
+    def __init__(self, serial, filledCoords, perimeterCoords, originCenter,
+                 originNormal, originTangent):
+        self.serial = serial
+        self.filledCoords = filledCoords
+        self.perimeterCoords = perimeterCoords
+        self.originCenter = originCenter
+        self.originNormal = originNormal
+        self.originTangent = originTangent
+        self.areaMat = None
+        self.area = 0.0
+
+    def world_area(self, mat):
+        """ Summed area of the triangles in world space, cached per matrix """
+        matKey = tuple(map(tuple, mat))
+        if matKey != self.areaMat:
+            if len(self.filledCoords) == 0:
+                self.area = 0.0
+            else:
+                tris = np.array(self.filledCoords).reshape(-1, 3, 3)
+                mat = np.array(mat)
+                tris = tris @ mat[:3, :3].T + mat[:3, 3]
+                cross = np.cross(tris[:, 1] - tris[:, 0], tris[:, 2] - tris[:, 0])
+                self.area = float(np.linalg.norm(cross, axis=1).sum() / 2)
+            self.areaMat = matKey
+        return self.area
 
 
+class AreaCache:
+    """
+    Triangulation, perimeter and origin face of area dimensions, keyed by
+    the dimension and rebuilt when its face and edge buffers change or the
+    depsgraph reports a geometry update for its object (see `tag_update`).
+    """
 
-# takes a set of co-ordinates returns the min and max value for each axis
-def get_axis_aligned_bounds(coords):
+    def __init__(self):
+        self.entries = {}
+        self.versions = {}
+        self.serial = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.versions.clear()
+
+    def tag_update(self, depsgraph):
+        for update in depsgraph.updates:
+            datablock = update.id.original
+            if update.is_updated_geometry and isinstance(datablock, bpy.types.Object):
+                key = datablock.as_pointer()
+                self.versions[key] = self.versions.get(key, 0) + 1
+
+    def get(self, myobj, dim, evalMods):
+        objKey = myobj.as_pointer()
+        stamp = (self.versions.get(objKey, 0), objKey, evalMods,
+                 dim.originFaceIdx,
+                 tuple(dim['facebuffer'].to_list()),
+                 tuple(dim['perimeterEdgeBuffer'].to_list()))
+
+        entry = self.entries.get(dim.as_pointer())
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+
+        self.serial += 1
+        data = None
+        diskKey = None
+        # Edit meshes and modifier results aren't what's saved in the file
+        if myobj.mode != 'EDIT' and not (evalMods and check_mods(myobj)) and \
+                sidecar_cache.directory() is not None:
+            diskKey = sidecar_cache.digest(
+                *get_mesh_arrays(myobj.data), *stamp[3:])
+            data = load_area_data(diskKey, self.serial)
+        if data is None:
+            data = build_area_data(myobj, dim, evalMods, self.serial)
+            if diskKey is not None:
+                save_area_data(diskKey, data)
+        self.entries[dim.as_pointer()] = (stamp, data)
+        return data
+
+
+def get_mesh_arrays(mesh):
     """
-    Takes a set of co-ordinates returns the min and max value for each axis
+    Vertex positions and topology of a mesh as arrays, read with
+    foreach_get, to hash it for the sidecar cache
     """
-    maxX = None
-    minX = None
-    maxY = None
-    minY = None
-    maxZ = None
-    minZ = None
+    arrays = []
+    for collection, attr, size, dtype in (
+            (mesh.vertices, 'co', 3, np.float32),
+            (mesh.edges, 'vertices', 2, np.int32),
+            (mesh.loops, 'vertex_index', 1, np.int32),
+            (mesh.polygons, 'loop_start', 1, np.int32),
+            (mesh.polygons, 'loop_total', 1, np.int32)):
+        array = np.empty(len(collection) * size, dtype=dtype)
+        collection.foreach_get(attr, array)
+        arrays.append(array)
+    return arrays
+
+
+def load_area_data(key, serial):
+    arrays = sidecar_cache.load('area', key, ('filled', 'perimeter', 'origin'))
+    if arrays is None:
+        return None
+    center, normal, tangent = [Vector(vec) for vec in arrays['origin']]
+    return AreaData(
+        serial, [Vector(co) for co in arrays['filled']],
+        [Vector(co) for co in arrays['perimeter']], center, normal, tangent)
+
+
+def save_area_data(key, data):
+    sidecar_cache.save('area', key, {
+        'filled': np.array(data.filledCoords, dtype=np.float32).reshape(-1, 3),
+        'perimeter': np.array(data.perimeterCoords, dtype=np.float32).reshape(-1, 3),
+        'origin': np.array([data.originCenter, data.originNormal,
+                            data.originTangent], dtype=np.float64)})
+
+
+def build_area_data(myobj, dim, evalMods, serial):
+    if myobj.mode != 'EDIT':
+        bm = bmesh.new()
+        if evalMods and check_mods(myobj):  # From Evaluated Deps Graph
+            bm.from_object(
+                myobj, bpy.context.view_layer.depsgraph)
+        else:
+            bm.from_mesh(myobj.data)
+    else:
+        bm = bmesh.from_edit_mesh(myobj.data)
+
+    try:
+        bm.faces.ensure_lookup_table()
+        bm.edges.ensure_lookup_table()
 
+        # Get the Filled Coords
+        faceIndices = set(dim['facebuffer'].to_list())
+        filledCoords = []
+        for tri in bm.calc_loop_triangles():
+            if tri[0].face.index in faceIndices:
+                for loop in tri:
+                    filledCoords.append(loop.vert.co.copy())
+
+        # Get the Perimeter Coords
+        perimeterCoords = []
+        for edgeIdx in dim['perimeterEdgeBuffer'].to_list():
+            verts = bm.edges[edgeIdx].verts
+            perimeterCoords.append(verts[0].co.copy())
+            perimeterCoords.append(verts[1].co.copy())
+
+        originFace = bm.faces[dim.originFaceIdx]
+        return AreaData(
+            serial, filledCoords, perimeterCoords,
+            originFace.calc_center_bounds(), originFace.normal.copy(),
+            originFace.calc_tangent_edge())
+    finally:
+        if myobj.mode != 'EDIT':
+            bm.free()
+
+
+area_cache = AreaCache()
+
+
+# Bounds of nothing, the identity for merge_bounds
+EMPTY_BOUNDS = (-math.inf, math.inf, -math.inf, math.inf, -math.inf, math.inf)
+
+
+def merge_bounds(a, b):
+    """ Union of two bounds as returned by get_axis_aligned_bounds """
+    return (max(a[0], b[0]), min(a[1], b[1]),
+            max(a[2], b[2]), min(a[3], b[3]),
+            max(a[4], b[4]), min(a[5], b[5]))
+
+
+def bounds_from_aabb(aabb):
+    """ The 8 corners of an AABB, in the order draw_boundsDimension uses """
+    maxX, minX, maxY, minY, maxZ, minZ = aabb
+    return [Vector((minX, minY, minZ)), Vector((minX, minY, maxZ)),
+            Vector((minX, maxY, maxZ)), Vector((minX, maxY, minZ)),
+            Vector((maxX, minY, minZ)), Vector((maxX, minY, maxZ)),
+            Vector((maxX, maxY, maxZ)), Vector((maxX, maxY, minZ))]
+
+
+# Meshes up to this size are their own convex hull for bounds
+HULL_MIN_VERTS = 64
+
+
+def has_animated_geometry(myobj):
+    """ Whether the shape of `myobj` may change from frame to frame """
+    data = myobj.data
+    for datablock in (data, getattr(data, 'shape_keys', None)):
+        if datablock is not None and datablock.animation_data is not None:
+            return True
+
+    # Animated modifier settings are curves of the object itself
+    animData = myobj.animation_data
+    if animData is None:
+        return False
+    curves = list(animData.drivers)
+    if animData.action is not None:
+        curves.extend(animData.action.fcurves)
+    return any(curve.data_path.startswith('modifiers') for curve in curves)
+
+
+def is_rotated(mat):
+    return mat.to_quaternion() != Quaternion((1.0, 0.0, 0.0, 0.0))
+
+
+def get_mesh_coords(myobj):
+    """
+    Local vertex coordinates of a mesh object as an (N, 3) array, read with
+    foreach_get from the same mesh get_mesh_vertices would use
+    """
+    if myobj.type != 'MESH':
+        return None
+
+    if myobj.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(myobj.data)
+        return np.array([vert.co for vert in bm.verts],
+                        dtype=np.float32).reshape(-1, 3)
+
+    sceneProps = bpy.context.scene.MeasureItArchProps
+    if sceneProps.eval_mods or check_mods(myobj):
+        deps = bpy.context.view_layer.depsgraph
+        obj_eval = myobj.evaluated_get(deps)
+        mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=deps)
+        coords = read_vertex_coords(mesh.vertices)
+        obj_eval.to_mesh_clear()
+        return coords
+
+    return read_vertex_coords(myobj.data.vertices)
+
+
+def read_vertex_coords(verts):
+    coords = np.empty(len(verts) * 3, dtype=np.float32)
+    verts.foreach_get('co', coords)
+    return coords.reshape(-1, 3)
+
+
+def convex_hull_coords(coords):
+    """
+    Vertices of the convex hull of (N, 3) `coords`. Only these can touch the
+    AABB, whatever the object's transform.
+    """
+    if len(coords) <= HULL_MIN_VERTS:
+        return coords
+
+    bm = bmesh.new()
     for coord in coords:
-        if maxX is None:
-            maxX = coord[0]
-            minX = coord[0]
-            maxY = coord[1]
-            minY = coord[1]
-            maxZ = coord[2]
-            minZ = coord[2]
-        if coord[0] > maxX:
-            maxX = coord[0]
-        if coord[0] < minX:
-            minX = coord[0]
-        if coord[1] > maxY:
-            maxY = coord[1]
-        if coord[1] < minY:
-            minY = coord[1]
-        if coord[2] > maxZ:
-            maxZ = coord[2]
-        if coord[2] < minZ:
-            minZ = coord[2]
-
-    return [maxX, minX, maxY, minY, maxZ, minZ]
+        bm.verts.new(coord)
+    try:
+        result = bmesh.ops.convex_hull(bm, input=bm.verts[:])
+        hull = [elem.co.copy() for elem in result['geom']
+                if isinstance(elem, bmesh.types.BMVert)]
+    finally:
+        bm.free()
+
+    # Flat meshes have no volume to wrap, keep all vertices
+    if len(hull) < 4:
+        return coords
+    return np.array(hull, dtype=np.float32)
+
+
+def cached_convex_hull_coords(coords):
+    """ convex_hull_coords, through the sidecar cache when it's enabled """
+    if len(coords) <= HULL_MIN_VERTS or sidecar_cache.directory() is None:
+        return convex_hull_coords(coords)
+
+    diskKey = sidecar_cache.digest(coords)
+    arrays = sidecar_cache.load('hull', diskKey, ('hull',))
+    if arrays is not None:
+        return arrays['hull']
+    hull = convex_hull_coords(coords)
+    sidecar_cache.save('hull', diskKey, {'hull': hull})
+    return hull
+
+
+def get_world_bounds(coords, mat):
+    """
+    AABB of local (N, 3) `coords` transformed by `mat`, as a single
+    (N, 4) @ (4, 4) product instead of a Vector per vertex
+    """
+    if len(coords) == 0:
+        return EMPTY_BOUNDS
+
+    homogeneous = np.ones((len(coords), 4))
+    homogeneous[:, :3] = coords
+    world = homogeneous @ np.array(mat).T
+    return tuple(get_axis_aligned_bounds(world[:, :3]))
+
+
+def get_object_bounds(myobj, coords=None):
+    """
+    World space AABB of an object. Rotated meshes use their vertices, since
+    the transformed bounding box would be too large.
+    """
+    mat = myobj.matrix_world
+    if coords is None and myobj.type == 'MESH' and is_rotated(mat):
+        coords = get_mesh_coords(myobj)
+    if coords is None:
+        coords = np.array(myobj.bound_box)
+
+    return get_world_bounds(coords, mat)
+
+
+class BoundsTree:
+    """
+    Reduction tree over the bounds of a collection's objects. The root holds
+    the bounds of the whole collection, updating one object costs O(log n).
+    """
+
+    def __init__(self, keys, names, leaves):
+        self.index = {key: idx for idx, key in enumerate(keys)}
+        self.names = dict(zip(keys, names))
+        self.pending = set()
+
+        size = 1
+        while size < len(leaves):
+            size *= 2
+        self.size = size
+
+        nodes = [EMPTY_BOUNDS] * (2 * size)
+        nodes[size:size + len(leaves)] = leaves
+        for idx in range(size - 1, 0, -1):
+            nodes[idx] = merge_bounds(nodes[2 * idx], nodes[2 * idx + 1])
+        self.nodes = nodes
+
+    @property
+    def root(self):
+        return self.nodes[1]
+
+    def update(self, key, bounds):
+        nodes = self.nodes
+        idx = self.index[key] + self.size
+        nodes[idx] = bounds
+        idx //= 2
+        while idx:
+            nodes[idx] = merge_bounds(nodes[2 * idx], nodes[2 * idx + 1])
+            idx //= 2
+
+
+class BoundsCache:
+    """
+    World space AABBs of objects and collections for bounds dimensions.
+
+    Entries are keyed by `as_pointer()` and dropped from the depsgraph update
+    handler (see `tag_update`), so drawing doesn't compare transforms or store
+    anything in ID properties. Frame changes move animated objects without a
+    depsgraph update, so the frame change handler compares the transforms of
+    the cached objects instead (see `tag_frame_change`). Convex hulls of
+    rotated meshes survive transform updates.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.matrices = {}
+        self.hulls = {}
+        self.trees = {}
+
+    def clear(self):
+        self.objects.clear()
+        self.matrices.clear()
+        self.hulls.clear()
+        self.trees.clear()
+
+    def tag_object(self, key, geometry=True):
+        self.objects.pop(key, None)
+        self.matrices.pop(key, None)
+        if geometry:
+            self.hulls.pop(key, None)
+        for tree in self.trees.values():
+            if key in tree.index:
+                tree.pending.add(key)
+
+    def tag_update(self, depsgraph):
+        for update in depsgraph.updates:
+            datablock = update.id.original
+            if isinstance(datablock, bpy.types.Object):
+                if update.is_updated_transform or update.is_updated_geometry:
+                    self.tag_object(datablock.as_pointer(),
+                                    geometry=update.is_updated_geometry)
+            elif isinstance(datablock, bpy.types.Collection):
+                # Membership changed, nested collections change their
+                # parents' `all_objects` too
+                self.trees.clear()
+
+    def tag_frame_change(self, scene):
+        """ Tag the cached objects that the new frame moved or deformed """
+        if not self.objects:
+            return
+        for myobj in scene.objects:
+            key = myobj.as_pointer()
+            matrix = self.matrices.get(key)
+            if matrix is None:
+                continue
+            geometry = has_animated_geometry(myobj)
+            if geometry or matrix != myobj.matrix_world:
+                self.tag_object(key, geometry=geometry)
+
+    def object_bounds(self, myobj):
+        key = myobj.as_pointer()
+        bounds = self.objects.get(key)
+        if bounds is None:
+            coords = None
+            if myobj.type == 'MESH' and is_rotated(myobj.matrix_world):
+                coords = self.hull_coords(key, myobj)
+            bounds = get_object_bounds(myobj, coords)
+            self.objects[key] = bounds
+            self.matrices[key] = myobj.matrix_world.copy()
+        return bounds
+
+    def hull_coords(self, key, myobj):
+        """
+        Convex hull standing in for a rotated mesh. It's built the second
+        time the bounds are needed, so only objects that keep being
+        transformed pay for it, and kept until the geometry changes.
+        """
+        if key not in self.hulls:
+            self.hulls[key] = None
+            return None
+
+        hull = self.hulls[key]
+        if hull is None:
+            coords = get_mesh_coords(myobj)
+            if coords is None:
+                return None
+            hull = cached_convex_hull_coords(coords)
+            self.hulls[key] = hull
+        return hull
+
+    def collection_bounds(self, collection):
+        key = collection.as_pointer()
+        tree = self.trees.get(key)
+
+        if tree is not None and tree.pending:
+            for objKey in tree.pending:
+                myobj = bpy.data.objects.get(tree.names[objKey])
+                if myobj is None or myobj.as_pointer() != objKey:
+                    # Renamed or removed
+                    tree = None
+                    break
+                tree.update(objKey, self.object_bounds(myobj))
+            else:
+                tree.pending.clear()
+
+        if tree is None:
+            objects = collection.all_objects
+            tree = BoundsTree(
+                [myobj.as_pointer() for myobj in objects],
+                [myobj.name for myobj in objects],
+                [self.object_bounds(myobj) for myobj in objects])
+            self.trees[key] = tree
+
+        return tree.root
+
+
+bounds_cache = BoundsCache()
 
 
 def select_normal(myobj, dim, normDistVector, midpoint, dimProps):
@@ -1863,7 +2196,17 @@ def select_normal(myobj, dim, normDistVector, midpoint, dimProps):
     return bestNormal
 
 
-def draw_line_group(context, myobj, lineGen, mat, svg=None):
+@profiler.timed('line_group', ownerArg=1)
+def draw_line_group(context, myobj, lineGen, mat, svg=None, instanceMats=None,
+                    instanceKey='#instances'):
+    """
+    Draw the line groups of `myobj`. With `instanceMats` the line groups of
+    all those instances are merged into one batch per line group, in world
+    space, so they're drawn with a single call each. Merged batches are kept
+    under `instanceKey`, so each set of instances has its own.
+    """
+    lineGroupShader = gpuShaders.lineGroupShader
+    dashedLineShader = gpuShaders.dashedLineShader
     scene = context.scene
     sceneProps = scene.MeasureItArchProps
 
@@ -1910,6 +2253,10 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
             # Get line data to be drawn
             evalMods = lineProps.evalMods
 
+            if instanceMats is None:
+                instanceKey = ''
+            chain = lineGroup.chain and instanceMats is None
+
             # Flag for re-evaluation of batches & mesh data
             verts = []
             global lastMode
@@ -1925,7 +2272,17 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
                 recoordFlag = True
                 lastMode[myobj.name] = myobj.mode
 
-            if (evalModsGlobal or evalMods or recoordFlag) and check_mods(myobj):
+            # Custom shapes and instances draw the same line group several
+            # times per redraw, only rebuild it the first time. Dynamic
+            # creases depend on the matrix, so they're always rebuilt
+            if recoordFlag and not sceneProps.is_render_draw and \
+                    not lineGroup.useDynamicCrease:
+                batchKey = myobj.name + lineGroup.name + instanceKey
+                if batchKey in rebuiltLineGroups:
+                    recoordFlag = False
+                rebuiltLineGroups.add(batchKey)
+
+            if recoordFlag and check_mods(myobj):
                 deps = bpy.context.view_layer.depsgraph
                 obj_eval = myobj.evaluated_get(deps)
                 mesh = obj_eval.to_mesh(
@@ -1937,19 +2294,12 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
 
             # Get Coords
             sceneProps = bpy.context.scene.MeasureItArchProps
-            if 'coordBuffer' not in lineGroup or recoordFlag:
-                # Handle line groups created with older versions of MeasureIt_ARCH
-                if 'singleLine' in lineGroup and 'lineBuffer' not in lineGroup:
-                    toLineBuffer = []
-                    for line in lineGroup['singleLine']:
-                        toLineBuffer.append(line['pointA'])
-                        toLineBuffer.append(line['pointB'])
-                    lineGroup['lineBuffer'] = toLineBuffer
-
+            lineState = render_state.get(lineGroup)
+            if not hasattr(lineState, 'coordBuffer') or recoordFlag:
                 if 'lineBuffer' in lineGroup:
                     tempCoords = [get_line_vertex(
                         idx, verts) for idx in lineGroup['lineBuffer']]
-                    lineGroup['coordBuffer'] = tempCoords
+                    lineState.coordBuffer = tempCoords
 
                 # Calculate dynamic lines or curve lines
 
@@ -2021,13 +2371,13 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
                       
 
 
-                    lineGroup['coordBuffer'] = tempCoords
+                    lineState.coordBuffer = tempCoords
                     if len(tempCoords) == 0:
-                        lineGroup['coordBuffer'] = [Vector((0,0,0)),Vector((0,0,0))]
+                        lineState.coordBuffer = [Vector((0,0,0)),Vector((0,0,0))]
 
 
             coords = []
-            coords = lineGroup['coordBuffer']
+            coords = lineState.coordBuffer
 
             # if len(coords) == 0:
             #    return
@@ -2041,9 +2391,39 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
             else:
                 tempWeights = [1.0] * len(coords)
 
+            if instanceMats is not None:
+                batchKey = myobj.name + lineGroup.name + instanceKey
+                matsHash = hash(tuple(tuple(map(tuple, instMat))
+                                      for instMat in instanceMats))
+                batches = [dashedBatch3D if lineProps.lineDrawDashed else lineBatch3D]
+                if drawHidden:
+                    batches.append(hiddenBatch3D)
+                if recoordFlag or instanceHashes.get(batchKey) != matsHash or \
+                        any(batchKey not in batchDict for batchDict in batches):
+                    coords, tempWeights = merge_line_instances(
+                        coords, tempWeights, instanceMats, lineGroup.chain)
+                    instanceHashes[batchKey] = matsHash
+                    recoordFlag = True
+                mat = Matrix.Identity(4)
+
+            # Dense line groups far away draw a simplified LOD level
+            lodKey = ''
+            if sceneProps.use_line_lod and not chain and \
+                    not (sceneProps.is_render_draw or sceneProps.is_vector_draw) and \
+                    myobj.mode not in ('EDIT', 'WEIGHT_PAINT') and \
+                    len(coords) >= 2 * LINE_LOD_MIN_SEGMENTS:
+                # Instance coords are only merged when rebuilt
+                coords, tempWeights, lodKey, recoordFlag = select_line_lod(
+                    myobj.name + lineGroup.name + instanceKey, coords,
+                    tempWeights, mat, recoordFlag,
+                    coordsValid=instanceMats is None or recoordFlag,
+                    cacheable=instanceMats is None and
+                    not lineGroup.useDynamicCrease and
+                    not (evalMods or evalModsGlobal))
+
             if drawHidden:
                 # Invert The Depth test for hidden lines
-                bgl.glDepthFunc(bgl.GL_GREATER)
+                gl_state.depth_func(bgl.GL_GREATER)
                 hiddenLineWeight = lineProps.lineHiddenWeight
                 dashRGB = rgb_gamma_correct(lineProps.lineHiddenColor)
                 view = get_view()
@@ -2062,8 +2442,7 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
                     "finalColor", (dashRGB[0], dashRGB[1], dashRGB[2], dashRGB[3]))
                 dashedLineShader.uniform_float("offset", -offset)
 
-                global hiddenBatch3D
-                batchKey = myobj.name + lineGroup.name
+                batchKey = myobj.name + lineGroup.name + instanceKey + lodKey
                 if batchKey not in hiddenBatch3D or recoordFlag:
                     hiddenBatch3D[batchKey] = batch_for_shader(
                         dashedLineShader, 'LINES', {"pos": coords})
@@ -2076,7 +2455,7 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
                 batchHidden.program_set(dashedLineShader)
                 batchHidden.draw()
 
-                bgl.glDepthFunc(bgl.GL_LESS)
+                gl_state.depth_func(bgl.GL_LESS)
                 gpu.shader.unbind()
 
             if lineProps.lineDrawDashed:
@@ -2095,10 +2474,9 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
                     "finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
                 dashedLineShader.uniform_float("offset", -offset)
 
-                global dashedBatch3D
-                batchKey = myobj.name + lineGroup.name
+                batchKey = myobj.name + lineGroup.name + instanceKey + lodKey
                 if batchKey not in dashedBatch3D or recoordFlag or sceneProps.is_render_draw:
-                    if not lineGroup.chain:
+                    if not chain:
                         dashedBatch3D[batchKey] = batch_for_shader(
                             dashedLineShader, 'LINES', {"pos": coords})
                         batchDashed = dashedBatch3D[batchKey]
@@ -2128,10 +2506,9 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
 
                 # colors = [(rgb[0], rgb[1], rgb[2], rgb[3]) for coord in range(len(coords))]
 
-                global lineBatch3D
-                batchKey = myobj.name + lineGroup.name
+                batchKey = myobj.name + lineGroup.name + instanceKey + lodKey
                 if batchKey not in lineBatch3D or recoordFlag or myobj.mode == 'WEIGHT_PAINT' or sceneProps.is_render_draw:
-                    if not lineGroup.chain:
+                    if not chain:
                         lineBatch3D[batchKey] = batch_for_shader(
                             lineGroupShader, 'LINES', {"pos": coords, "weight": tempWeights})
                         batch3d = lineBatch3D[batchKey]
@@ -2144,20 +2521,20 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
                     batch3d = lineBatch3D[batchKey]
 
                 if rgb[3] == 1:
-                    bgl.glBlendFunc(bgl.GL_SRC_ALPHA,
-                                    bgl.GL_ONE_MINUS_SRC_ALPHA)
-                    bgl.glDepthMask(True)
+                    gl_state.blend_func(bgl.GL_SRC_ALPHA,
+                                        bgl.GL_ONE_MINUS_SRC_ALPHA)
+                    gl_state.depth_mask(True)
                     lineGroupShader.uniform_float("depthPass", True)
                     batch3d.program_set(lineGroupShader)
                     batch3d.draw()
 
                 if sceneProps.is_render_draw:
-                    bgl.glBlendFunc(bgl.GL_SRC_ALPHA,
-                                    bgl.GL_ONE_MINUS_SRC_ALPHA)
+                    gl_state.blend_func(bgl.GL_SRC_ALPHA,
+                                        bgl.GL_ONE_MINUS_SRC_ALPHA)
                     # bgl.glBlendEquation(bgl.GL_FUNC_ADD)
-                    bgl.glBlendEquation(bgl.GL_MAX)
+                    gl_state.blend_equation(bgl.GL_MAX)
 
-                bgl.glDepthMask(False)
+                gl_state.depth_mask(False)
                 lineGroupShader.uniform_float("depthPass", False)
                 batch3d.program_set(lineGroupShader)
                 batch3d.draw()
@@ -2175,6 +2552,268 @@ def draw_line_group(context, myobj, lineGen, mat, svg=None):
     gpu.shader.unbind()
 
 
+def merge_line_instances(coords, weights, instanceMats, chain=False):
+    """
+    Coords and weights of a line group for all `instanceMats`, transformed
+    to world space as one LINES buffer. Chains are split into segments so
+    the instances don't connect.
+    """
+    coords = np.array(coords, dtype=np.float32).reshape(-1, 3)
+    weights = np.array(weights, dtype=np.float32)
+    if chain and len(coords) > 1:
+        segments = np.repeat(np.arange(len(coords)), 2)[1:-1]
+        coords = coords[segments]
+        weights = weights[segments]
+
+    homogeneous = np.ones((len(coords), 4), dtype=np.float32)
+    homogeneous[:, :3] = coords
+    mats = np.array([np.array(instMat) for instMat in instanceMats],
+                    dtype=np.float32)
+    world = homogeneous @ mats.transpose(0, 2, 1)
+
+    return (np.ascontiguousarray(world[..., :3].reshape(-1, 3)),
+            np.tile(weights, len(mats)))
+
+
+# Line groups with fewer segments are always drawn in full
+LINE_LOD_MIN_SEGMENTS = 2000
+
+# Simplification tolerance of each LOD level as a fraction of the line
+# group's size. Level 0 is the full line group.
+LINE_LOD_TOLERANCES = (0, 1 / 2048, 1 / 512, 1 / 128, 1 / 32)
+
+# Screen space tolerance of LOD levels in pixels
+LINE_LOD_PIXELS = 1.0
+
+
+def simplify_line_segments(coords, weights, tolerance):
+    """
+    Simplify the LINES `coords` (N, 3) and their `weights` for a `tolerance`
+    in coordinate units: endpoints are snapped to a grid of that size, which
+    drops shorter segments and duplicates, and collinear runs through
+    vertices with two segments are merged into one segment.
+    """
+    coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+    weights = np.asarray(weights, dtype=np.float32).ravel()
+    if len(coords) < 2 or tolerance <= 0:
+        return coords, weights
+    coords = coords[:len(coords) - len(coords) % 2]
+    weights = weights[:len(coords)]
+
+    # Cluster endpoints, keeping the first vertex of each cell
+    cells = np.floor(coords / tolerance).astype(np.int64)
+    cells -= cells.min(axis=0)
+    spans = cells.max(axis=0) + 1
+    cellKeys = (cells[:, 0] * spans[1] + cells[:, 1]) * spans[2] + cells[:, 2]
+    cellKeys, first, vertIds = np.unique(
+        cellKeys, return_index=True, return_inverse=True)
+    verts = coords[first]
+    vertWeights = weights[first]
+
+    segments = np.sort(vertIds.reshape(-1, 2), axis=1)
+    segments = segments[segments[:, 0] != segments[:, 1]]
+    segKeys = np.unique(segments[:, 0] * len(verts) + segments[:, 1])
+    segments = np.stack((segKeys // len(verts), segKeys % len(verts)), axis=1)
+
+    segments = merge_collinear_segments(verts, segments, tolerance)
+    return verts[segments.ravel()], vertWeights[segments.ravel()]
+
+
+def merge_collinear_segments(verts, segments, tolerance):
+    """
+    Merge the segments (M, 2) of `verts` through vertices with two segments
+    while the merged segment stays within `tolerance` of every vertex it
+    replaces.
+
+    Each pass merges, in bulk, the vertices that pass the test and have a
+    higher (hashed) priority than their neighbours that pass it too, so no
+    two neighbours are merged at once. A vertex that fails the test is left
+    as it is, like its segments.
+    """
+    flat = segments.ravel()
+    degree = np.bincount(flat, minlength=len(verts))
+    mids = np.flatnonzero(degree == 2)
+    if len(mids) == 0:
+        return segments
+
+    # The two segments and neighbours of each vertex in `mids`
+    order = np.argsort(flat, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(degree)))[mids]
+    ends = np.stack((order[starts], order[starts + 1]), axis=1)
+    segIds = ends // 2
+    nbrs = flat[ends ^ 1]
+
+    rowOf = np.full(len(verts), -1, dtype=np.int64)
+    rowOf[mids] = np.arange(len(mids))
+    # Multiplicative hash, distinct for distinct vertices below 2**32
+    priority = (mids * 2654435761) % 4294967296
+    vertPriority = np.full(len(verts), -1, dtype=np.int64)
+
+    points = verts.astype(np.float64)
+    segs = segments.copy()
+    errors = np.zeros(len(segs))
+    alive = np.ones(len(segs), dtype=bool)
+    active = np.ones(len(mids), dtype=bool)
+
+    while True:
+        rows = np.flatnonzero(active)
+        if len(rows) == 0:
+            break
+        a, b = nbrs[rows, 0], nbrs[rows, 1]
+        start = points[a]
+        span = points[b] - start
+        spanLength = np.linalg.norm(span, axis=1)
+        # Deviation of the merged segment from every vertex it replaces
+        deviation = np.linalg.norm(
+            np.cross(points[mids[rows]] - start, span), axis=1) / \
+            np.where(spanLength > 0, spanLength, 1)
+        error = np.maximum(errors[segIds[rows, 0]], errors[segIds[rows, 1]]) + \
+            deviation
+        passed = (a != b) & (spanLength > 0) & (error <= tolerance)
+        active[rows[~passed]] = False
+
+        rows, a, b, error = rows[passed], a[passed], b[passed], error[passed]
+        if len(rows) == 0:
+            break
+        vertPriority[mids[rows]] = priority[rows]
+        chosen = (vertPriority[a] < priority[rows]) & \
+            (vertPriority[b] < priority[rows])
+        vertPriority[mids[rows]] = -1
+        rows, a, b, error = rows[chosen], a[chosen], b[chosen], error[chosen]
+
+        # a-vert-b becomes a-b, kept in the segment to a
+        vert = mids[rows]
+        segA, segB = segIds[rows, 0], segIds[rows, 1]
+        segs[segA, 0] = a
+        segs[segA, 1] = b
+        errors[segA] = error
+        alive[segB] = False
+        active[rows] = False
+
+        # Point the neighbours at each other
+        for near, far, seg in ((a, b, None), (b, a, segA)):
+            nearRows = rowOf[near]
+            found = nearRows >= 0
+            nearRows = nearRows[found]
+            cols = (nbrs[nearRows, 1] == vert[found]).astype(np.int64)
+            nbrs[nearRows, cols] = far[found]
+            if seg is not None:
+                segIds[nearRows, cols] = seg[found]
+
+    return segs[alive]
+
+
+class LineLOD:
+    """
+    Simplified levels of a line group's LINES buffer, built the first time
+    each level is needed and kept until the line group is rebuilt.
+    """
+
+    def __init__(self, coords, weights):
+        self.coords = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+        self.weights = np.asarray(weights, dtype=np.float32).ravel()
+        if len(self.coords) > 0:
+            maxs = self.coords.max(axis=0)
+            mins = self.coords.min(axis=0)
+            self.size = float(np.linalg.norm(maxs - mins))
+            self.center = Vector((maxs + mins) / 2)
+        else:
+            self.size = 0.0
+            self.center = Vector((0, 0, 0))
+        self.levels = {}
+        self.batchKeys = set()
+        self.contentKey = None
+        self.cacheable = True
+        self.diskKey = None
+
+    def level_for(self, unitsPerPixel):
+        """ Coarsest level within `LINE_LOD_PIXELS` at `unitsPerPixel` """
+        level = 0
+        for idx, fraction in enumerate(LINE_LOD_TOLERANCES):
+            if fraction * self.size <= unitsPerPixel * LINE_LOD_PIXELS:
+                level = idx
+        return level
+
+    def get(self, level):
+        if level not in self.levels:
+            self.levels[level] = self.simplify(level)
+        return self.levels[level]
+
+    def simplify(self, level):
+        if not self.cacheable or sidecar_cache.directory() is None:
+            return simplify_line_segments(
+                self.coords, self.weights, LINE_LOD_TOLERANCES[level] * self.size)
+
+        if self.diskKey is None:
+            self.diskKey = sidecar_cache.digest(self.coords, self.weights)
+        entryKey = sidecar_cache.digest(
+            self.diskKey, LINE_LOD_TOLERANCES[level])
+        arrays = sidecar_cache.load('lod', entryKey, ('coords', 'weights'))
+        if arrays is not None:
+            return arrays['coords'], arrays['weights']
+
+        coords, weights = simplify_line_segments(
+            self.coords, self.weights, LINE_LOD_TOLERANCES[level] * self.size)
+        sidecar_cache.save('lod', entryKey,
+                           {'coords': coords, 'weights': weights})
+        return coords, weights
+
+
+def select_line_lod(key, coords, weights, mat, rebuilt, coordsValid=True,
+                    cacheable=True):
+    """
+    Pick the LOD level of the line group `key` for the current view. Returns
+    its coords, weights, batch key suffix and whether its batch must be
+    rebuilt, the inputs for level 0.
+
+    Line groups are rebuilt every redraw while modifiers are evaluated or
+    the view changes, so the levels are kept as long as the rebuilt
+    coordinates hash the same. Levels of line groups that aren't
+    `cacheable` (whose coordinates change from frame to frame) are never
+    written to the disk cache.
+    """
+    lod = lineLODs.get(key)
+    if lod is None or rebuilt:
+        if not coordsValid:
+            return coords, weights, '', rebuilt
+        coordsArray = np.asarray(coords, dtype=np.float32).reshape(-1, 3)
+        weightsArray = np.asarray(weights, dtype=np.float32).ravel()
+        contentKey = hash((coordsArray.tobytes(), weightsArray.tobytes()))
+        if lod is None or lod.contentKey != contentKey:
+            if lod is not None:
+                # Batches of the old geometry
+                for batchKey in lod.batchKeys:
+                    for batchDict in (lineBatch3D, dashedBatch3D, hiddenBatch3D):
+                        batchDict.pop(batchKey, None)
+            lod = lineLODs[key] = LineLOD(coordsArray, weightsArray)
+            lod.contentKey = contentKey
+        lod.cacheable = cacheable
+
+    # Size of a pixel in the line group's own coordinates
+    scale = max(abs(axis) for axis in mat.to_scale())
+    unitsPerPixel = get_units_per_pixel(mat @ lod.center) / max(scale, 1e-9)
+    level = lod.level_for(unitsPerPixel)
+    if level == 0:
+        return coords, weights, '', rebuilt
+
+    # The batches of a level are dropped with their LOD, see above
+    suffix = '#lod{}'.format(level)
+    lod.batchKeys.add(key + suffix)
+    lodCoords, lodWeights = lod.get(level)
+    return lodCoords, lodWeights, suffix, False
+
+
+def get_units_per_pixel(point):
+    """ World units per viewport pixel at `point` in the current view """
+    perspMatrix = gpu.matrix.get_projection_matrix() @ \
+        gpu.matrix.get_model_view_matrix()
+    clip = perspMatrix @ Vector((point[0], point[1], point[2], 1.0))
+    pixelScale = perspMatrix.row[1].xyz.length * get_viewport()[1] / 2
+    if pixelScale == 0:
+        return 0.0
+    return max(clip.w, 1e-6) / pixelScale
+
+
 def get_color(rawRGB, myobj, is_active=True, only_active=True):
     # undo blenders Default Gamma Correction
 
@@ -2207,15 +2846,13 @@ def get_style(item, type_str):
 
     source_scene = sceneProps.source_scene
     itemProps = item
-    style_source = eval("source_scene.StyleGenerator.{}".format(type_str))
     if item.uses_style:
-        for itemStyle in style_source:
-            if itemStyle.name == item.style:
-                itemProps = itemStyle
-                return itemProps
-    
+        style_source = getattr(source_scene.StyleGenerator, type_str)
+        itemProps = style_source.get(item.style, item)
+
     return itemProps
 
+@profiler.timed('annotation', ownerArg=1)
 def draw_annotation(context, myobj, annotationGen, mat, svg=None, instance = None):
     scene = context.scene
     sceneProps = scene.MeasureItArchProps
@@ -2236,13 +2873,16 @@ def draw_annotation(context, myobj, annotationGen, mat, svg=None, instance = Non
             # undo blenders Default Gamma Correction
             rgb = get_color(annotationProps.color, myobj, is_active=annotation.is_active)
 
+            # Instances share the annotation, don't let them evict its batches
+            annotationKey = annotation.as_pointer() if instance is None else None
+
             # Get Points
             deleteFlag = False
             try:
                 p1local = get_mesh_vertex(
                     myobj, annotation.annotationAnchor, annotationProps.evalMods, spline_idx=annotation.annotationAnchorSpline)
                 p1 = get_point(p1local, mat)
-                annotation['p1anchorCoord'] = p1
+                render_state.get(annotation).p1anchorCoord = Vector(p1)
             except IndexError:
                 deleteFlag = True
 
@@ -2333,30 +2973,27 @@ def draw_annotation(context, myobj, annotationGen, mat, svg=None, instance = Non
             p3 = p2 + p3dir * (leaderDist*get_scale()*0.5) * mult
 
             if annotation.customShape is not None:
-                col = annotation.customShape
-                objs = col.objects
-                try:
-                    if col.objects[myobj.name] is not None:
-                        print(
-                            "Annotations Cannot be a part of its custom shape collection")
-                        annotation.customShape = None
-                        return
-                except:
+                symbol = symbol_cache.get(annotation.customShape)
+                if myobj.as_pointer() in symbol.members:
+                    # Annotations can't be part of their custom shape, the
+                    # shape is removed on load (see measureit_arch_main)
                     pass
-
-                draw3d_loop(context, objs, svg=svg, extMat=extMat,
-                            multMat=annotationProps.custom_local_transforms,custom_call=True)
+                elif symbol_cache.depth >= MAX_SYMBOL_DEPTH:
+                    print("Custom shape {} is nested too deeply, skipped".format(
+                        annotation.customShape.name))
+                elif not sceneProps.is_vector_draw:
+                    symbol_cache.queue(
+                        symbol, extMat, annotationProps.custom_local_transforms)
+                else:
+                    symbol_cache.depth += 1
+                    try:
+                        draw3d_loop(context, symbol.objects, svg=svg, extMat=extMat,
+                                    multMat=annotationProps.custom_local_transforms,custom_call=True)
+                    finally:
+                        symbol_cache.depth -= 1
 
 
             fieldIdx = 0
-            if 'textFields' not in annotation:
-                annotation.textFields.add()
-
-            # Some Backwards Compatibility for annotations
-            if annotation.textFields[0].text == "" and annotation.name == "":
-                annotation.textFields[0].text = annotation.text
-                annotation.name = annotation.text
-
             fields = []
             notesFlag = False
             for textField in annotation.textFields:
@@ -2382,10 +3019,10 @@ def draw_annotation(context, myobj, annotationGen, mat, svg=None, instance = Non
 
                 textcard = generate_text_card(
                     context, textField, annotationProps, basePoint=origin, xDir=xDir, yDir=yDir, cardIdx=fieldIdx)
-                textField['textcard'] = textcard
+                render_state.get(textField).textcard = textcard
                 fieldIdx += 1
             # Set Gizmo Properties
-            annotation.gizLoc = p2
+            render_state.get(annotation).gizLoc = Vector(p2)
 
             # Draw
             if p1 is not None and p2 is not None:
@@ -2404,13 +3041,14 @@ def draw_annotation(context, myobj, annotationGen, mat, svg=None, instance = Non
                 coords.append(p2)
                 coords.append(p3)
 
-                textcard = fields[0]['textcard']
+                textcard = render_state.get(fields[0]).textcard
 
                 if not annotationProps.draw_leader:
                     coords = []
 
                 draw_lines(lineWeight, rgb, coords,
-                        twoPass=True, pointPass=True)
+                        twoPass=True, pointPass=True,
+                        batchKey=(annotationKey, 'lines'))
 
             # Draw Line Endcaps
             dotcoord = None
@@ -2418,7 +3056,8 @@ def draw_annotation(context, myobj, annotationGen, mat, svg=None, instance = Non
                 pointcoords = [p1]
                 size = endcapSize * get_scale() / 10
                 dotcoord = [p1,size]
-                draw_points(size, rgb, pointcoords, depthpass=True)
+                draw_points(size, rgb, pointcoords, depthpass=True,
+                            batchKey=(annotationKey, 'endcap'))
 
 
             filledCoords = []
@@ -2437,11 +3076,12 @@ def draw_annotation(context, myobj, annotationGen, mat, svg=None, instance = Non
                     line.rotate(Quaternion(axis, rotangle))
                     filledCoords.append(line.copy() + Vector(p1))
 
-                draw_filled_coords(filledCoords, rgb, polySmooth=False)
+                draw_filled_coords(filledCoords, rgb, polySmooth=False,
+                                   batchKey=(annotationKey, 'fill'))
 
             if sceneProps.show_dim_text:
                 for textField in fields:
-                    textcard = textField['textcard']
+                    textcard = render_state.get(textField).textcard
                     draw_text_3D(context, textField,
                                 annotationProps, myobj, textcard)
 
@@ -2459,45 +3099,156 @@ def draw_annotation(context, myobj, annotationGen, mat, svg=None, instance = Non
                 svg_shaders.svg_fill_shader(
                     annotation, filledCoords, rgb, svg, parent=svg_anno)
                 for textField in fields:
-                    textcard = textField['textcard']
+                    textcard = render_state.get(textField).textcard
                     svg_shaders.svg_text_shader(
                         annotation, annotationProps, textField.text, origin, textcard, rgb, svg, parent=svg_anno)
 
+# Custom shapes nested deeper than this aren't drawn
+MAX_SYMBOL_DEPTH = 8
+
+
+class Symbol:
+    """ A custom shape collection, compiled for drawing """
+
+    def __init__(self, collection):
+        self.key = collection.as_pointer()
+        self.objects = tuple(collection.objects)
+        self.members = frozenset(obj.as_pointer() for obj in self.objects)
+
+
+class SymbolCache:
+    """
+    Custom shape collections shared by annotations. Each is traversed once.
+    Annotations queue their shape with their matrix, and once the frame's
+    annotations are drawn `draw_symbols` draws each shape for all of them
+    at once. Symbols are dropped when the depsgraph reports a collection
+    update (see `tag_update`). `depth` counts the nesting of the shape
+    being drawn.
+    """
+
+    def __init__(self):
+        self.symbols = {}
+        # {(symbol key, multMat, depth): (symbol, multMat, depth, [extMat])}
+        self.queued = {}
+        self.depth = 0
+
+    def clear(self):
+        self.symbols.clear()
+        self.queued.clear()
+
+    def tag_update(self, depsgraph):
+        for update in depsgraph.updates:
+            if isinstance(update.id.original, bpy.types.Collection):
+                self.symbols.clear()
+                return
+
+    def get(self, collection):
+        key = collection.as_pointer()
+        symbol = self.symbols.get(key)
+        if symbol is None:
+            symbol = Symbol(collection)
+            self.symbols[key] = symbol
+        return symbol
+
+    def queue(self, symbol, extMat, multMat):
+        """ Draw `symbol` with `extMat` in the next `draw_symbols` """
+        key = (symbol.key, multMat, self.depth + 1)
+        if key not in self.queued:
+            self.queued[key] = (symbol, multMat, self.depth + 1, [])
+        self.queued[key][3].append(extMat)
+
+        # The shape is part of the annotation's bounds
+        if cull_state.recording is not None:
+            for myobj in symbol.objects:
+                mat = extMat @ myobj.matrix_world if multMat else extMat
+                cull_state.extend(myobj.bound_box, matrix=mat)
+
+
+symbol_cache = SymbolCache()
+
+
+def has_own_items(myobj):
+    """ Whether `myobj` draws more than line groups """
+    return (('AnnotationGenerator' in myobj and
+             myobj.AnnotationGenerator.num_annotations != 0) or
+            ('DimensionGenerator' in myobj and
+             myobj.DimensionGenerator.measureit_arch_num != 0) or
+            len(myobj.SheetGenerator.sheet_views) > 0)
+
+
+def draw_symbols(context):
+    """
+    Draw the custom shapes queued by draw_annotation. The line groups of a
+    shape's objects are merged for all the annotations using the shape, like
+    instances, and drawn with one call each (see draw_line_group). Objects
+    with annotations or dimensions of their own are drawn for each
+    annotation, and shapes nested in those are drawn after them.
+    """
+    sceneProps = context.scene.MeasureItArchProps
+    drawLines = not sceneProps.hide_linework or sceneProps.is_render_draw
+
+    while symbol_cache.queued:
+        symbol, multMat, depth, extMats = symbol_cache.queued.pop(
+            next(iter(symbol_cache.queued)))
+        symbol_cache.depth = depth
+        try:
+            itemObjects = []
+            for myobj in symbol.objects:
+                if has_own_items(myobj):
+                    itemObjects.append(myobj)
+                elif drawLines and 'LineGenerator' in myobj and \
+                        check_obj_vis(myobj, True):
+                    instanceMats = [extMat @ myobj.matrix_world if multMat
+                                    else extMat for extMat in extMats]
+                    draw_line_group(
+                        context, myobj, myobj.LineGenerator,
+                        Matrix.Identity(4), instanceMats=instanceMats,
+                        instanceKey='#symbol{}{}'.format(symbol.key, multMat))
+
+            for extMat in extMats if itemObjects else ():
+                draw3d_loop(context, itemObjects, extMat=extMat,
+                            multMat=multMat, custom_call=True)
+        finally:
+            symbol_cache.depth = 0
+
+
 def set_text(textField, obj, style=None, item=None):
-    
+    """
+    Fill in the text of an auto filled text field. The field is only written
+    when its text changes, since writing it renders its texture again.
+    """
+    text = textField.text
 
     if textField.autoFillText:
         # DATE
         if textField.textSource == 'DATE':
-            textField.text = datetime.now().strftime('%y/%m/%d')
+            text = datetime.now().strftime('%y/%m/%d')
 
         # VIEW
         elif textField.textSource == 'VIEW':
             view = get_view()
             if view is not None:
-                textField.text = view.name
+                text = view.name
 
         # NOTES, (actually we set this in the draw annotation code since it needs to spawn new texfields)
         elif textField.textSource == 'NOTES':
-            textField.text = ''
+            text = ''
 
         elif textField.textSource == 'SCALE':
             view = get_view()
-            scaleStr = "{}:{}".format(view.paper_scale, view.model_scale)
-            textField.text = scaleStr
+            text = "{}:{}".format(view.paper_scale, view.model_scale)
 
         elif textField.textSource == 'VIEWNUM':
             view = get_view()
-            textField.text = view.view_num
-            
-        
+            text = view.view_num
+
         elif textField.textSource == 'ELEVATION':
-            if item == None: 
-                textField.text = ""
-            elif "p1anchorCoord" in item:
-                textField.text = format_distance(item['p1anchorCoord'][2])
+            if item == None:
+                text = ""
+            elif hasattr(render_state.get(item), 'p1anchorCoord'):
+                text = format_distance(
+                    render_state.get(item).p1anchorCoord[2])
 
-                
         elif textField.textSource == 'C_LENGTH':
             if obj.type == 'CURVE':
                 if len(obj.data.splines) > 1:
@@ -2507,28 +3258,25 @@ def set_text(textField, obj, style=None, item=None):
                 else:
                     length = obj.data.splines[0].calc_length()
                     text = format_distance(length)
-                textField.text = text
             else:
-                textField.text = "Not a Curve"
+                text = "Not a Curve"
 
         # CUSTOM PROP
         elif textField.textSource == 'RNAPROP':
             if textField.rnaProp != '':
                 try:
-                    # TODO: `eval` is evil
-                    data = eval(
-                        'bpy.data.objects[\'' + obj.name + '\']' + textField.rnaProp)
+                    data = DataPathAccessor(textField.rnaProp)(obj)
                     text = str(data)
                     if "location" in textField.rnaProp:
                         text = format_distance(data)
-
-                    textField.text = text
                 except:
-                    textField.text = 'Bad Data Path'
+                    text = 'Bad Data Path'
 
+    if style != None and style.all_caps:
+        text = text.upper()
 
-    if style != None and style.all_caps and (style.text_updated or bpy.context.scene.MeasureItArchProps.is_render_draw):
-        textField.text = textField.text.upper()
+    if textField.text != text:
+        textField.text = text
 
 
 # This is a one off for a project where I need to preview the
@@ -2560,14 +3308,323 @@ def preview_dual(context):
 
                 draw_lines(3, (0, 0, 0, 0.7), coords, twoPass=True, offset=-0.0005)
 
-def draw_text_3D(context, textobj, textprops, myobj, card):
-    # get props
+# Placements tried, in order, for a label that overlaps other labels:
+# offsets in card widths and heights, and whether a leader is drawn
+LABEL_CANDIDATES = (
+    (0, 0, False),   # In place
+    (0, 1, False),   # Above
+    (0, -1, False),  # Below
+    (-1, 0, False),  # Outside, before
+    (1, 0, False),   # Outside, after
+    (0, 2, True),    # On a leader above
+    (0, -2, True),   # On a leader below
+)
+
+
+class LabelSolver:
+    """
+    Screen space placement of text cards. The cards drawn in a frame are
+    queued, then projected and placed together with `place_labels`, each
+    at the first of `LABEL_CANDIDATES` that doesn't overlap another label.
+    Labels with no free candidate are drawn in place.
+
+    Placements are kept by label while the view stays the same, so a frame
+    only solves the labels that are new or whose rect changed, against the
+    labels kept. A view change solves every label again in draw order.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.viewKey = None
+        self.perspMatrix = None
+        self.viewport = (1, 1)
+        # Labels queued this frame, and their keys
+        self.labels = []
+        self.queued = {}
+        # Placements of the last solve: key index, rects, candidates and
+        # placed rects
+        self.index = {}
+        self.rects = None
+        self.chosen = None
+        self.placed = None
+        self.solved = 0
+        self.reused = 0
+
+    def begin_frame(self, perspMatrix, viewport):
+        viewKey = (tuple(round(value, 6) for row in perspMatrix for value in row),
+                   tuple(viewport))
+        if viewKey != self.viewKey:
+            self.clear()
+        self.viewKey = viewKey
+        self.perspMatrix = perspMatrix
+        self.viewport = viewport
+        self.labels = []
+        self.queued = {}
+        self.solved = 0
+        self.reused = 0
+        self.active = True
+
+    def end_frame(self):
+        self.active = False
+        self.labels = []
+        self.queued = {}
+
+    def clear(self):
+        self.viewKey = None
+        self.index = {}
+
+    def queue(self, key, label):
+        """ Queue `label` for drawing once every label of the frame is placed """
+        while key in self.queued:
+            # Drawn more than once this frame
+            key = (key, 1)
+        self.queued[key] = len(self.labels)
+        self.labels.append(label)
+
+    def project(self, cards):
+        """
+        Screen rects (minX, minY, maxX, maxY) and card axes of the (N, 4, 3)
+        `cards`, and whether each card is in front of the view
+        """
+        matrix = np.array([tuple(row) for row in self.perspMatrix], dtype=np.float64)
+        clip = cards @ matrix[:, :3].T + matrix[:, 3]
+        visible = (clip[:, :, 3] > 0).all(axis=1)
+        depths = np.where(visible[:, None], clip[:, :, 3], 1.0)[:, :, None]
+        width, height = self.viewport
+        points = (clip[:, :, :2] / depths + 1) * (width / 2, height / 2)
+
+        rects = np.round(np.concatenate(
+            (points.min(axis=1), points.max(axis=1)), axis=1), 1)
+        xDirs = points[:, 3] - points[:, 0]
+        yDirs = points[:, 1] - points[:, 0]
+        return rects, xDirs, yDirs, visible
+
+    def solve(self, keys, cards):
+        """
+        Place the labels `keys` with the text cards `cards`. Returns the
+        index in `LABEL_CANDIDATES` of each label, -1 for in place.
+        """
+        count = len(cards)
+        cards = np.fromiter(chain.from_iterable(chain.from_iterable(cards)),
+                            dtype=np.float64, count=count * 12).reshape(-1, 4, 3)
+        rects, xDirs, yDirs, visible = self.project(cards)
+
+        # Labels whose rect didn't change keep their placement
+        last = np.fromiter((self.index.get(key, -1) for key in keys),
+                           dtype=np.int64, count=count)
+        reuse = last >= 0
+        chosen = np.full(count, -1, dtype=np.int64)
+        placed = rects.copy()
+        if reuse.any():
+            reuse[reuse] = (self.rects[last[reuse]] == rects[reuse]).all(axis=1)
+            chosen[reuse] = self.chosen[last[reuse]]
+            placed[reuse] = self.placed[last[reuse]]
+
+        solve = visible & ~reuse
+        if solve.any():
+            offsets = np.array(LABEL_CANDIDATES, dtype=np.float64)[:, :2]
+            chosen[solve] = place_labels(
+                rects[solve], xDirs[solve], yDirs[solve], offsets,
+                placed=placed[reuse & (chosen >= 0)])
+
+            moved = solve & (chosen > 0)
+            shifts = offsets[chosen[moved]]
+            shifts = shifts[:, :1] * xDirs[moved] + shifts[:, 1:] * yDirs[moved]
+            placed[moved] += np.tile(shifts, 2)
+
+        self.index = {key: idx for idx, key in enumerate(keys)}
+        self.rects = rects
+        self.chosen = chosen
+        self.placed = placed
+        self.solved = int(solve.sum())
+        self.reused = int(reuse.sum())
+        return chosen
+
+
+label_solver = LabelSolver()
+
+
+def draw_labels(context):
+    """ Place the labels queued in `label_solver` and draw them """
+    labels = label_solver.labels
+    if not labels:
+        return
+
+    chosen = label_solver.solve(
+        list(label_solver.queued), [label[3] for label in labels])
+    for (textobj, textprops, myobj, card), idx in zip(labels, chosen.tolist()):
+        with OpenGL_Settings(textprops):
+            if idx > 0:
+                cardsX, cardsY, leader = LABEL_CANDIDATES[idx]
+                card = [Vector(coord) for coord in card]
+                cardX = card[3] - card[0]
+                cardY = card[1] - card[0]
+                offset = cardX * cardsX + cardY * cardsY
+                if leader:
+                    # From the card's old center to the near edge of its
+                    # new position
+                    center = (card[0] + card[2]) / 2
+                    edge = center + offset - cardY * (0.5 if cardsY > 0 else -0.5)
+                    draw_lines(1.0, textprops.color, [center, edge])
+                card = [coord + offset for coord in card]
+
+            draw_text_card(context, textobj, textprops, myobj, card)
+
+
+class CullState:
+    """
+    View frustum and screen size culling of the viewport draw.
+
+    The world bounds of an item are recorded from the coordinates its lines,
+    fills, points and text are drawn with the first time it's drawn, and kept
+    until the next depsgraph update or frame change (see the handlers in
+    measureit_arch_main). Later frames skip items whose bounds are
+    outside the view without computing their geometry. Items drawn inside
+    another item (e.g. custom shapes of an annotation) are part of its bounds
+    and aren't culled on their own.
+
+    Text and end caps smaller on screen than the minimum size are dropped.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.bounds = {}
+        self.recording = None
+        self.depth = 0
+        self.planes = ()
+        self.pixelScale = 0
+        self.perspRow = None
+        self.minPixels = 0
+        self.items = 0
+        self.culled = 0
+        self.texts = 0
+        self.caps = 0
+
+    def begin_frame(self, perspMatrix, viewport, minPixels):
+        rows = [tuple(row) for row in perspMatrix]
+        # Clip planes (left, right, bottom, top, near, far) of the matrix
+        self.planes = tuple(
+            tuple(rows[3][col] + sign * rows[axis][col] for col in range(4))
+            for axis in range(3) for sign in (1, -1))
+        self.perspRow = rows[3]
+        # Pixels per world unit at w = 1
+        self.pixelScale = Vector(rows[1][:3]).length * viewport[1] / 2
+        self.minPixels = minPixels
+        self.items = self.culled = self.texts = self.caps = 0
+        self.active = True
+
+    def end_frame(self):
+        self.active = False
+
+    def clear(self):
+        self.bounds.clear()
+
+    def tag_update(self, depsgraph):
+        if len(depsgraph.updates) > 0:
+            self.bounds.clear()
+
+    def in_view(self, bounds):
+        """ False if the AABB `bounds` is outside one of the clip planes """
+        maxX, minX, maxY, minY, maxZ, minZ = bounds
+        for a, b, c, d in self.planes:
+            if (a * (maxX if a >= 0 else minX) + b * (maxY if b >= 0 else minY) +
+                    c * (maxZ if c >= 0 else minZ) + d) < 0:
+                return False
+        return True
 
+    def pixels(self, point, length):
+        """ Approximate on screen size of `length` world units at `point` """
+        row = self.perspRow
+        w = row[0] * point[0] + row[1] * point[1] + row[2] * point[2] + row[3]
+        if w <= 0:
+            return math.inf
+        return length * self.pixelScale / w
+
+    def too_small(self, point, length):
+        if not self.active or self.minPixels <= 0:
+            return False
+        return self.pixels(point, length) < self.minPixels
+
+    def visible(self, key, bounds=None):
+        """ Whether the item `key` (or `bounds`) may be in view """
+        if not self.active or self.depth > 0:
+            return True
+        self.items += 1
+        if bounds is None:
+            bounds = self.bounds.get(key)
+        if bounds is None or bounds == EMPTY_BOUNDS or self.in_view(bounds):
+            return True
+        self.culled += 1
+        return False
+
+    def begin_item(self, key):
+        """
+        Start drawing the item `key`. Returns whether its bounds are being
+        recorded, to pass to `end_item`.
+        """
+        record = self.active and self.depth == 0 and key not in self.bounds
+        if record:
+            self.recording = EMPTY_BOUNDS
+        self.depth += 1
+        return record
+
+    def end_item(self, key, record):
+        self.depth -= 1
+        if record:
+            self.bounds[key] = self.recording
+            self.recording = None
+
+    def extend(self, coords, matrix=None):
+        """ Add drawn `coords` to the bounds of the item being recorded """
+        if self.recording is None or len(coords) == 0:
+            return
+        coords = np.array([tuple(coord)[:3] for coord in coords])
+        if matrix is None:
+            bounds = tuple(get_axis_aligned_bounds(coords))
+        else:
+            bounds = get_world_bounds(coords, matrix)
+        self.recording = merge_bounds(self.recording, bounds)
+
+
+cull_state = CullState()
+
+
+def draw_culled(key, drawFunc, *args, **kwargs):
+    """ Draw an item with `drawFunc` unless `cull_state` culls it """
+    if not cull_state.visible(key):
+        return
+    record = cull_state.begin_item(key)
+    try:
+        drawFunc(*args, **kwargs)
+    finally:
+        cull_state.end_item(key, record)
+
+
+def draw_text_3D(context, textobj, textprops, myobj, card):
     sceneProps = context.scene.MeasureItArchProps
 
     if sceneProps.is_vector_draw:
         return
 
+    if cull_state.active:
+        cull_state.extend(card)
+        center = (Vector(card[0]) + Vector(card[2])) / 2
+        if cull_state.too_small(center, (Vector(card[1]) - Vector(card[0])).length):
+            cull_state.texts += 1
+            return
+
+    if label_solver.active and sceneProps.use_label_solver:
+        # Drawn by draw_labels once every label of the frame is placed
+        label_solver.queue(textobj.as_pointer(), (textobj, textprops, myobj, card))
+        return
+
+    draw_text_card(context, textobj, textprops, myobj, card)
+
+
+def draw_text_card(context, textobj, textprops, myobj, card):
+    textShader = gpuShaders.textShader
+    sceneProps = context.scene.MeasureItArchProps
+
     card[0] = Vector(card[0])
     card[1] = Vector(card[1])
     card[2] = Vector(card[2])
@@ -2652,6 +3709,7 @@ def draw_text_3D(context, textobj, textprops, myobj, card):
     # Draw View Axis in Red and Card Axis in Green for debug
     autoflipdebug = sceneProps.debug_flip_text
     if autoflipdebug:
+        lineShader = gpuShaders.lineShader
         viewport = [context.area.width, context.area.height]
         lineShader.bind()
         lineShader.uniform_float("Viewport", viewport)
@@ -2742,6 +3800,9 @@ def generate_end_caps(context, item, capType, capSize, pos, userOffsetVector, mi
     scale = get_scale()
 
     size = capSize * scale / 1574.804
+    if cull_state.too_small(pos, size):
+        cull_state.caps += 1
+        return capCoords, filledCoords
 
     distVector = Vector(pos - Vector(midpoint)).normalized()
     norm = distVector.cross(userOffsetVector).normalized()
@@ -2815,92 +3876,40 @@ def generate_end_caps(context, item, capType, capSize, pos, userOffsetVector, mi
     return capCoords, filledCoords
 
 
-def generate_text_card(
-        context, textobj, textProps, rotation=Vector((0, 0, 0)), basePoint=Vector((0, 0, 0)), xDir=Vector((1, 0, 0)),
-        yDir=Vector((0, 1, 0)), cardIdx=0):
-
+class TextProps(object):
     """
-    Returns a list of 4 Vectors
+    Read only view of an item's (or style's) text properties with some of
+    them replaced, so a text card can be laid out e.g. centered without
+    writing the alignment to the item
     """
 
-    width = textobj.textWidth
-    height = textobj.textHeight
-
-    scale = get_scale()
-
-    # Define annotation Card Geometry
-    resolution = get_resolution()
-
-    # Get font size in pt more stupid fudge factors :(
-    size = (textProps.fontSize / 803) * scale
-
-    sx = (width / resolution) * size
-    sy = (height / resolution) * size
+    def __init__(self, props, **overrides):
+        object.__setattr__(self, '_props', props)
+        object.__setattr__(self, '_overrides', overrides)
 
-    cardX = xDir.normalized() * sx
-    cardY = yDir.normalized() * sy
+    def __getattr__(self, name):
+        overrides = object.__getattribute__(self, '_overrides')
+        if name in overrides:
+            return overrides[name]
+        return getattr(object.__getattribute__(self, '_props'), name)
 
-    square = [
-        basePoint - (cardX / 2),
-        basePoint - (cardX / 2) + cardY,
-        basePoint + (cardX / 2) + cardY,
-        basePoint + (cardX / 2),
-    ]
-
-    # pick approprate card based on alignment
-    if textProps.textAlignment == 'R':
-        aOff = 0.5 * cardX
-    elif textProps.textAlignment == 'L':
-        aOff = -0.5 * cardX
-    else:
-        aOff = Vector((0.0, 0.0, 0.0))
-
-    if textProps.textPosition == 'M':
-        pOff = 0.5 * cardY
-    elif textProps.textPosition == 'B':
-        pOff = 1.0 * cardY
-    else:
-        pOff = Vector((0.0, 0.0, 0.0))
+    def __setattr__(self, name, value):
+        raise AttributeError("TextProps are read only")
 
-    cardOffset = cardIdx * cardY
-
-    # Define transformation matrices
-    rotMat = Matrix.Identity(3)
-    rotEuler = Euler(rotation, 'XYZ')
-    rotMat.rotate(rotEuler)
-    rotMat = rotMat.to_4x4()
-
-    coords = []
-    for coord in square:
-        coord = Vector(coord) - aOff - pOff - cardOffset
-        coord = (rotMat @ (coord - basePoint)) + basePoint
-        coords.append(coord)
-
-    return coords
-
-
-def sortPoints(p1, p2):
-    tempDirVec = Vector(p1) - Vector(p2)
-    domAxis = get_dom_axis(tempDirVec)
-
-    if p2[domAxis] > p1[domAxis]:
-        switchTemp = p1
-        p1 = p2
-        p2 = switchTemp
-
-    return p1, p2
 
+def generate_text_card(
+        context, textobj, textProps, rotation=Vector((0, 0, 0)), basePoint=Vector((0, 0, 0)), xDir=Vector((1, 0, 0)),
+        yDir=Vector((0, 1, 0)), cardIdx=0):
 
-def get_dom_axis(vector):
-    domAxis = 0
-    if abs(vector[0]) > abs(vector[1]) and abs(vector[0]) > abs(vector[2]):
-        domAxis = 0
-    if abs(vector[1]) > abs(vector[0]) and abs(vector[1]) > abs(vector[2]):
-        domAxis = 1
-    if abs(vector[2]) > abs(vector[0]) and abs(vector[2]) > abs(vector[1]):
-        domAxis = 2
+    """
+    Returns a list of 4 Vectors
+    """
 
-    return domAxis
+    coords = text_card_coords(
+        textobj.textWidth, textobj.textHeight, get_resolution(),
+        textProps.fontSize, get_scale(), textProps.textAlignment,
+        textProps.textPosition, rotation, basePoint, xDir, yDir, cardIdx)
+    return [Vector(coord) for coord in coords]
 
 
 def get_point(v1, mat):
@@ -2929,27 +3938,6 @@ def get_location(mainobject):
     return [m4[0][3], m4[1][3], m4[2][3]]
 
 
-def get_arc_data(pointa, pointb, pointc, pointd):
-    v1 = Vector((
-        pointa[0] - pointb[0],
-        pointa[1] - pointb[1],
-        pointa[2] - pointb[2]))
-    v2 = Vector((
-        pointc[0] - pointb[0],
-        pointc[1] - pointb[1],
-        pointc[2] - pointb[2]))
-    v3 = Vector((
-        pointd[0] - pointb[0],
-        pointd[1] - pointb[1],
-        pointd[2] - pointb[2]))
-
-    angle = v1.angle(v2) + v2.angle(v3)
-
-    rclength = pi * 2 * v2.length * (angle / (pi * 2))
-
-    return angle, rclength
-
-
 def get_mesh_vertices(myobj):
     """ Get vertex data """
     sceneProps = bpy.context.scene.MeasureItArchProps
@@ -3091,57 +4079,88 @@ def rgb_gamma_correct(rawRGB):
         rawRGB[3]))
 
 
-def draw_points(lineWeight, rgb, coords, offset=-0.001, depthpass=False):
+def get_batch(shader, primType, coords, batchKey=None):
+    """
+    Batch for dimension and annotation geometry, reused from `batch_cache`
+    while the coordinates for `batchKey` don't change. A `batchKey` of None,
+    or with None as owner, skips the cache. Callers that track their own
+    geometry changes can add a hash as third item, see BatchCache.get.
+    """
+    if batchKey is None or batchKey[0] is None or \
+            bpy.context.scene.MeasureItArchProps.is_render_draw:
+        return batch_for_shader(shader, primType, {"pos": coords})
+    return batch_cache.get(batchKey, shader, primType, coords)
+
+
+def draw_points(lineWeight, rgb, coords, offset=-0.001, depthpass=False,
+                batchKey=None, objectMatrix=None):
+    pointShader = gpuShaders.pointShader
+    if objectMatrix is not None:
+        pointShader = gpuShaders.objectPointShader
     viewport = get_viewport()
 
     pointShader.bind()
+    if objectMatrix is not None:
+        pointShader.uniform_float("objectMatrix", objectMatrix)
     pointShader.uniform_float("thickness", lineWeight)
     pointShader.uniform_float("Viewport", viewport)
     pointShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
     pointShader.uniform_float("offset", offset)
     pointShader.uniform_float("depthPass", False)
-    batch = batch_for_shader(pointShader, 'POINTS', {"pos": coords})
+    batch = get_batch(pointShader, 'POINTS', coords, batchKey)
     batch.program_set(pointShader)
     batch.draw()
     gpu.shader.unbind()
 
 
-def draw_filled_coords(filledCoords, rgb, offset=-0.001, polySmooth=True):
+def draw_filled_coords(filledCoords, rgb, offset=-0.001, polySmooth=True,
+                       batchKey=None, objectMatrix=None):
+    cull_state.extend(filledCoords, objectMatrix)
+    triShader = gpuShaders.triShader
+    if objectMatrix is not None:
+        triShader = gpuShaders.objectTriShader
     context = bpy.context
     scene = context.scene
     sceneProps = scene.MeasureItArchProps
 
-    bgl.glEnable(bgl.GL_POLYGON_SMOOTH)
-    if not polySmooth:
-        bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
+    gl_state.set_cap(bgl.GL_POLYGON_SMOOTH, polySmooth)
 
     if rgb[3] != 1:
-        bgl.glDepthMask(False)
+        gl_state.depth_mask(False)
 
     if sceneProps.is_render_draw:
-        bgl.glBlendEquation(bgl.GL_MAX)
+        gl_state.blend_equation(bgl.GL_MAX)
 
     triShader.bind()
+    if objectMatrix is not None:
+        triShader.uniform_float("objectMatrix", objectMatrix)
     triShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
     triShader.uniform_float("offset", offset)
 
-    batch = batch_for_shader(triShader, 'TRIS', {"pos": filledCoords})
+    batch = get_batch(triShader, 'TRIS', filledCoords, batchKey)
     batch.program_set(triShader)
     batch.draw()
     gpu.shader.unbind()
 
-    bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
-    bgl.glBlendEquation(bgl.GL_FUNC_ADD)
+    gl_state.disable(bgl.GL_POLYGON_SMOOTH)
+    gl_state.blend_equation(bgl.GL_FUNC_ADD)
 
 
 def draw_lines(lineWeight, rgb, coords, offset=-0.001, twoPass=False,
-               pointPass=False, pointCoords=None):
+               pointPass=False, pointCoords=None, batchKey=None,
+               objectMatrix=None):
+    cull_state.extend(coords, objectMatrix)
+    lineShader = gpuShaders.lineShader
+    if objectMatrix is not None:
+        lineShader = gpuShaders.objectLineShader
     context = bpy.context
     scene = context.scene
     sceneProps = scene.MeasureItArchProps
     viewport = get_viewport()
 
     lineShader.bind()
+    if objectMatrix is not None:
+        lineShader.uniform_float("objectMatrix", objectMatrix)
     lineShader.uniform_float("Viewport", viewport)
     lineShader.uniform_float("thickness", lineWeight)
     lineShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
@@ -3149,19 +4168,19 @@ def draw_lines(lineWeight, rgb, coords, offset=-0.001, twoPass=False,
     gpu.shader.unbind()
 
     # batch & Draw Shader
-    batch3d = batch_for_shader(lineShader, 'LINES', {"pos": coords})
+    batch3d = get_batch(lineShader, 'LINES', coords, batchKey)
 
     if rgb[3] == 1 and twoPass:
 
-        bgl.glDepthMask(True)
+        gl_state.depth_mask(True)
         lineShader.uniform_float("depthPass", True)
         batch3d.program_set(lineShader)
         batch3d.draw()
 
     if sceneProps.is_render_draw:
-        bgl.glBlendEquation(bgl.GL_MAX)
+        gl_state.blend_equation(bgl.GL_MAX)
 
-    bgl.glDepthMask(False)
+    gl_state.depth_mask(False)
     lineShader.uniform_float("depthPass", False)
     batch3d.program_set(lineShader)
     batch3d.draw()
@@ -3170,14 +4189,17 @@ def draw_lines(lineWeight, rgb, coords, offset=-0.001, twoPass=False,
     if pointPass:
         if pointCoords is None:
             pointCoords = coords
-        draw_points(lineWeight, rgb, pointCoords, offset)
+        pointKey = None
+        if batchKey is not None:
+            pointKey = (batchKey[0], batchKey[1] + 'Points') + batchKey[2:]
+        draw_points(lineWeight, rgb, pointCoords, offset, batchKey=pointKey,
+                    objectMatrix=objectMatrix)
 
-    bgl.glBlendEquation(bgl.GL_FUNC_ADD)
+    gl_state.blend_equation(bgl.GL_FUNC_ADD)
 
 
 def cap_extension(dirVec, capSize, capAngle):
-    scale = get_scale()
-    return dirVec.normalized() / 1000 * capSize * sin(capAngle) * scale
+    return Vector(cap_offset(dirVec, capSize, capAngle, get_scale()))
 
 def draw_dim_leaders(myobj, dim, dimProps, points, rotationMatrix, normal):
     pass
@@ -3192,25 +4214,27 @@ def dim_text_placement(dim, dimProps, origin, dist, distVec, offsetDistance, cap
     context = bpy.context
     sceneProps = context.scene.MeasureItArchProps
     flipCaps = False
-    dimProps.textPosition = 'T'
+    textPosition = 'T'
     dimLineExtension = 0  # add some extension to the line if the dimension is ext
     normDistVector = distVec.normalized()
-    dim.fontSize = dimProps.fontSize
 
     if dim.textAlignment == 'L':
-        dim.textPosition = 'M'
+        textPosition = 'M'
         flipCaps = True
         dimLineExtension = dim_line_extension(capSize)
         origin += Vector((dist / 2 + dimLineExtension * 1.2) * normDistVector)
 
     elif dim.textAlignment == 'R':
         flipCaps = True
-        dim.textPosition = 'M'
+        textPosition = 'M'
         dimLineExtension = dim_line_extension(capSize)
         origin -= Vector((dist / 2 + dimLineExtension * 1.2) * normDistVector)
 
+    # The item's alignment with the style's font size
+    textProps = TextProps(
+        dim, fontSize=dimProps.fontSize, textPosition=textPosition)
     square = generate_text_card(
-        context, textField, dim, basePoint=origin, xDir=normDistVector, yDir=offsetDistance.normalized() ,cardIdx=cardIdx)
+        context, textField, textProps, basePoint=origin, xDir=normDistVector, yDir=offsetDistance.normalized() ,cardIdx=cardIdx)
 
     cardX = square[3] - square[0]
     cardY = square[1] - square[0]
@@ -3222,8 +4246,8 @@ def dim_text_placement(dim, dimProps, origin, dist, distVec, offsetDistance, cap
             dimLineExtension = dim_line_extension(capSize)
             origin += distVec * -0.5 - (dimLineExtension * normDistVector) - cardX / 2 - cardY / 2
             square = generate_text_card(
-                context, textField, dim, basePoint=origin, xDir=normDistVector, yDir=offsetDistance.normalized())
-    textField['textcard'] = square
+                context, textField, textProps, basePoint=origin, xDir=normDistVector, yDir=offsetDistance.normalized())
+    render_state.get(textField).textcard = square
     return (flipCaps, dimLineExtension, origin)
 
 
@@ -3353,6 +4377,7 @@ def check_obj_vis(myobj,custom_call):
     else:
         return custom_call or not myobj.hide_render
 
+@profiler.timed('draw3d_loop')
 def draw3d_loop(context, objlist, svg=None, extMat=None, multMat=False,custom_call=False):
     """
     Generate all OpenGL calls
@@ -3362,6 +4387,20 @@ def draw3d_loop(context, objlist, svg=None, extMat=None, multMat=False,custom_ca
 
     totalobjs = len(objlist)
 
+    # Pick up unit setting changes once per redraw
+    if not custom_call:
+        refresh_unit_formatter(scene)
+        rebuiltLineGroups.clear()
+        symbol_cache.depth = 0
+        perspMatrix = gpu.matrix.get_projection_matrix() @ \
+            gpu.matrix.get_model_view_matrix()
+        if sceneProps.use_label_solver and not sceneProps.is_vector_draw:
+            label_solver.begin_frame(perspMatrix, get_viewport())
+        if sceneProps.use_culling and not (sceneProps.is_vector_draw or
+                                           sceneProps.is_render_draw):
+            cull_state.begin_frame(
+                perspMatrix, get_viewport(), sceneProps.cull_min_pixels)
+
     if sceneProps.is_vector_draw:
         objlist = z_order_objs(objlist, extMat, multMat)
         print(objlist)
@@ -3394,38 +4433,44 @@ def draw3d_loop(context, objlist, svg=None, extMat=None, multMat=False,custom_ca
             if 'LineGenerator' in myobj:
                 lineGen = myobj.LineGenerator
                 if not sceneProps.hide_linework or sceneProps.is_render_draw:
-                    draw_line_group(context, myobj, lineGen, mat, svg=svg)
+                    # Line groups are on the object's geometry
+                    lineBounds = None
+                    if cull_state.active and len(lineGen.line_groups) > 0:
+                        lineBounds = bounds_cache.object_bounds(myobj)
+                    if cull_state.visible(None, lineBounds):
+                        draw_line_group(context, myobj, lineGen, mat, svg=svg)
 
             if 'AnnotationGenerator' in myobj:
                 annotationGen = myobj.AnnotationGenerator
-                draw_annotation(context, myobj, annotationGen, mat, svg=svg, )
+                draw_culled(annotationGen.as_pointer(), draw_annotation,
+                            context, myobj, annotationGen, mat, svg=svg)
 
             if 'DimensionGenerator' in myobj:
                 DimGen = myobj.DimensionGenerator
 
                 for alignedDim in DimGen.alignedDimensions:
-                    draw_alignedDimension(
-                        context, myobj, DimGen, alignedDim, svg=svg, )
+                    draw_culled(alignedDim.as_pointer(), draw_alignedDimension,
+                                context, myobj, DimGen, alignedDim, svg=svg)
 
                 for angleDim in DimGen.angleDimensions:
-                    draw_angleDimension(
-                        context, myobj, DimGen, angleDim, mat, svg=svg, )
+                    draw_culled(angleDim.as_pointer(), draw_angleDimension,
+                                context, myobj, DimGen, angleDim, mat, svg=svg)
 
                 for axisDim in DimGen.axisDimensions:
-                    draw_axisDimension(context, myobj, DimGen,
-                                       axisDim, mat, svg=svg, )
+                    draw_culled(axisDim.as_pointer(), draw_axisDimension,
+                                context, myobj, DimGen, axisDim, mat, svg=svg)
 
                 for boundsDim in DimGen.boundsDimensions:
-                    draw_boundsDimension(
-                        context, myobj, DimGen, boundsDim, mat, svg=svg, )
+                    draw_culled(boundsDim.as_pointer(), draw_boundsDimension,
+                                context, myobj, DimGen, boundsDim, mat, svg=svg)
 
                 for arcDim in DimGen.arcDimensions:
-                    draw_arcDimension(context, myobj, DimGen,
-                                      arcDim, mat, svg=svg, )
+                    draw_culled(arcDim.as_pointer(), draw_arcDimension,
+                                context, myobj, DimGen, arcDim, mat, svg=svg)
 
                 for areaDim in DimGen.areaDimensions:
-                    draw_areaDimension(context, myobj, DimGen,
-                                       areaDim, mat, svg=svg, )
+                    draw_culled(areaDim.as_pointer(), draw_areaDimension,
+                                context, myobj, DimGen, areaDim, mat, svg=svg)
 
 
     # Draw Instanced Objects
@@ -3437,6 +4482,9 @@ def draw3d_loop(context, objlist, svg=None, extMat=None, multMat=False,custom_ca
         if sceneProps.is_vector_draw:
             objlist = z_order_objs(objlist, extMat, multMat)
 
+        # Line groups of instances are drawn together, see draw_line_group
+        lineInstances = {}
+
         for idx,obj_int in enumerate(objlist, start=1):
             if obj_int.is_instance:
                 myobj = obj_int.object
@@ -3451,7 +4499,11 @@ def draw3d_loop(context, objlist, svg=None, extMat=None, multMat=False,custom_ca
 
                 if 'LineGenerator' in myobj:
                     lineGen = myobj.LineGenerator
-                    draw_line_group(context, myobj, lineGen, mat, svg=svg)
+                    if sceneProps.is_vector_draw:
+                        draw_line_group(context, myobj, lineGen, mat, svg=svg)
+                    else:
+                        lineInstances.setdefault(
+                            myobj.name, (myobj, []))[1].append(mat.copy())
 
                 if 'AnnotationGenerator' in myobj and myobj.AnnotationGenerator.num_annotations != 0:
                     annotationGen = myobj.AnnotationGenerator
@@ -3471,6 +4523,20 @@ def draw3d_loop(context, objlist, svg=None, extMat=None, multMat=False,custom_ca
                         for axisDim in DimGen.axisDimensions:
                             draw_axisDimension(
                                 context, myobj, DimGen, axisDim, mat, svg=svg)
+
+        for myobj, instanceMats in lineInstances.values():
+            draw_line_group(context, myobj, myobj.LineGenerator,
+                            Matrix.Identity(4), instanceMats=instanceMats)
+
+    # Custom shapes of the annotations drawn above
+    if symbol_cache.depth == 0:
+        draw_symbols(context)
+
+    if not custom_call:
+        draw_labels(context)
+        label_solver.end_frame()
+        cull_state.end_frame()
+
     if sceneProps.is_render_draw:
         endTime = time.time()
         print("Time: " + str(endTime - startTime))
@@ -3478,9 +4544,6 @@ def draw3d_loop(context, objlist, svg=None, extMat=None, multMat=False,custom_ca
 def setup_dim_text(myobj,dim,dimProps,dist,origin,distVector,offsetDistance, is_area=False):
     context =bpy.context
     sceneProps = context.scene.MeasureItArchProps
-    if len(dim.textFields) == 0:
-        dim.textFields.add()
-
     dimText = dim.textFields[0]
 
     # format text and update if necessary
@@ -3492,6 +4555,7 @@ def setup_dim_text(myobj,dim,dimProps,dist,origin,distVector,offsetDistance, is_
         if dimText.text != distanceText:
             dimText.text = distanceText
             dimText.text_updated = True
+            text_update_queue.push(dimText)
 
     idx = 0
     flipCaps = None
@@ -3505,7 +4569,497 @@ def setup_dim_text(myobj,dim,dimProps,dist,origin,distVector,offsetDistance, is_
             dimLineExtension = placementResults[1]
             origin = placementResults[2]
         if sceneProps.show_dim_text:
-            draw_text_3D(context, textField, dimProps, myobj, textField['textcard'])
+            draw_text_3D(context, textField, dimProps, myobj, render_state.get(textField).textcard)
         idx += 1
 
     return (flipCaps,dimLineExtension,origin)
+
+
+# Run by ImportTimeTests in a new Blender, which imports the drawing modules
+# as a package without running the add-on's __init__
+IMPORT_TIME_SCRIPT = """
+import importlib, importlib.util, json, sys, time
+addonDir, package = sys.argv[sys.argv.index('--') + 1:]
+spec = importlib.util.spec_from_loader(package, loader=None, is_package=True)
+sys.modules[package] = importlib.util.module_from_spec(spec)
+sys.modules[package].__path__ = [addonDir]
+startTime = time.perf_counter()
+geometry = importlib.import_module(package + '.measureit_arch_geometry')
+importTime = time.perf_counter() - startTime
+svgShaders = sys.modules[package + '.svg_shaders']
+print('IMPORT_TIME ' + json.dumps({
+    'time': importTime,
+    'compiled': geometry.gpuShaders.compiled(),
+    'lazy': [name for name in ('svgwrite', 'ttLib')
+             if getattr(svgShaders, name).__dict__['_module'] is not None],
+}))
+"""
+
+
+class ImportTimeTests(unittest.TestCase):
+    """ Importing the drawing modules must stay cheap """
+
+    # Seconds, for a fresh import of the geometry module and its imports
+    IMPORT_TIME_LIMIT = 0.5
+
+    def test_import_time(self):
+        import json
+        import os
+        import subprocess
+
+        addonDir = os.path.dirname(os.path.abspath(__file__))
+        output = subprocess.run(
+            [bpy.app.binary_path, '-b', '--factory-startup',
+             '--python-expr', IMPORT_TIME_SCRIPT, '--', addonDir, __package__],
+            stdout=subprocess.PIPE, universal_newlines=True, timeout=120).stdout
+        lines = [line for line in output.splitlines()
+                 if line.startswith('IMPORT_TIME ')]
+        self.assertEqual(len(lines), 1, output)
+        result = json.loads(lines[0][len('IMPORT_TIME '):])
+
+        self.assertLess(result['time'], self.IMPORT_TIME_LIMIT)
+        # No shaders are compiled and no vector export dependencies loaded
+        self.assertEqual(result['compiled'], [])
+        self.assertEqual(result['lazy'], [])
+
+
+class BoundsTreeTests(unittest.TestCase):
+
+    def test_update(self):
+        import random
+        random.seed(2)
+        count = 10000
+        leaves = []
+        for idx in range(count):
+            x, y, z = (random.uniform(-100, 100) for axis in range(3))
+            leaves.append((x + 1, x, y + 1, y, z + 1, z))
+        tree = BoundsTree(range(count), [str(idx) for idx in range(count)], leaves)
+
+        expected = EMPTY_BOUNDS
+        for leaf in leaves:
+            expected = merge_bounds(expected, leaf)
+        self.assertEqual(tree.root, expected)
+
+        # Moving one object only touches its path to the root
+        tree.update(7, (500.0, 499.0, 0.0, 0.0, 0.0, 0.0))
+        self.assertEqual(tree.root[0], 500.0)
+        tree.update(7, leaves[7])
+        self.assertEqual(tree.root, expected)
+
+    def test_empty(self):
+        tree = BoundsTree([], [], [])
+        self.assertEqual(tree.root, EMPTY_BOUNDS)
+
+
+class BoundsCacheTests(unittest.TestCase):
+
+    class Object(object):
+        def __init__(self, pointer, matrix):
+            self.pointer = pointer
+            self.matrix_world = matrix
+            self.data = None
+            self.animation_data = None
+
+        def as_pointer(self):
+            return self.pointer
+
+    def test_frame_change(self):
+        from types import SimpleNamespace
+
+        still = self.Object(1, Matrix.Identity(4))
+        moving = self.Object(2, Matrix.Identity(4))
+        cache = BoundsCache()
+        for myobj in (still, moving):
+            cache.objects[myobj.pointer] = (1, 0, 1, 0, 1, 0)
+            cache.matrices[myobj.pointer] = myobj.matrix_world.copy()
+
+        moving.matrix_world = Matrix.Translation((0, 0, 1))
+        cache.tag_frame_change(SimpleNamespace(objects=[still, moving]))
+        self.assertIn(still.pointer, cache.objects)
+        self.assertNotIn(moving.pointer, cache.objects)
+
+
+class WorldBoundsTests(unittest.TestCase):
+
+    def test_world_bounds(self):
+        coords = np.random.RandomState(3).uniform(-1, 1, (2000, 3))
+        angle = radians(30)
+        mat = [[math.cos(angle), -math.sin(angle), 0, 2],
+               [math.sin(angle), math.cos(angle), 0, -1],
+               [0, 0, 3, 0.5],
+               [0, 0, 0, 1]]
+
+        world = []
+        for x, y, z in coords:
+            world.append([sum(row[col] * val for col, val in enumerate((x, y, z, 1)))
+                          for row in mat[:3]])
+
+        expected = []
+        for axis in range(3):
+            values = [coord[axis] for coord in world]
+            expected += [max(values), min(values)]
+
+        for result, value in zip(get_world_bounds(coords, mat), expected):
+            self.assertAlmostEqual(result, value)
+
+        self.assertEqual(get_world_bounds(np.empty((0, 3)), mat), EMPTY_BOUNDS)
+
+
+class DrawWriteTests(unittest.TestCase):
+    """ Drawing keeps the state it derives out of the items it draws """
+
+    class Item(object):
+        def __init__(self, **props):
+            self.__dict__.update(props)
+
+        def __setattr__(self, name, value):
+            raise AssertionError("Drawing wrote '{}'".format(name))
+
+        def __setitem__(self, key, value):
+            raise AssertionError("Drawing wrote '{}'".format(key))
+
+        def as_pointer(self):
+            return id(self)
+
+    class TextField(Item):
+        # The only writes drawing makes: a field's text, when what it shows
+        # changed, and the flag that queues its texture for an update
+        WRITABLE = ('text', 'text_updated')
+
+        def __setattr__(self, name, value):
+            if name not in self.WRITABLE:
+                raise AssertionError("Drawing wrote '{}'".format(name))
+            self.__dict__[name] = value
+
+    def test_text_placement(self):
+        dim = self.Item(textAlignment='L', textPosition='T', fontSize=12)
+        style = self.Item(fontSize=24, textPosition='B')
+        textField = self.Item(textWidth=100, textHeight=20)
+        try:
+            flipCaps, dimLineExtension, origin = dim_text_placement(
+                dim, style, Vector((0, 0, 0)), 1.0, Vector((1, 0, 0)),
+                Vector((0, 0.1, 0)), textField=textField)
+            self.assertTrue(flipCaps)
+            self.assertEqual(len(render_state.get(textField).textcard), 4)
+        finally:
+            render_state.clear()
+
+    def test_text_props(self):
+        dim = self.Item(textAlignment='L', fontSize=12)
+        textProps = TextProps(dim, textAlignment='C')
+        self.assertEqual(textProps.textAlignment, 'C')
+        self.assertEqual(textProps.fontSize, 12)
+        with self.assertRaises(AttributeError):
+            textProps.fontSize = 8
+
+    def test_setup_dim_text(self):
+        from unittest import mock
+
+        textField = self.Item(autoFillText=False, text=format_distance(1.0),
+                              textWidth=100, textHeight=20)
+        dim = self.Item(textFields=[textField], use_custom_text=False,
+                        textAlignment='C', fontSize=12)
+        dimProps = self.Item(fontSize=24, endcapSize=4)
+        with mock.patch.object(sys.modules[__name__], 'draw_text_3D'):
+            try:
+                setup_dim_text(
+                    self.Item(name='Cube'), dim, dimProps, 1.0,
+                    Vector((0, 0, 0)), Vector((1, 0, 0)), Vector((0, 0.1, 0)))
+                self.assertEqual(len(render_state.get(textField).textcard), 4)
+            finally:
+                render_state.clear()
+
+    def test_setup_dim_text_changed(self):
+        from unittest import mock
+
+        # The distance changed since the text was last drawn
+        textField = self.TextField(autoFillText=False, text=format_distance(1.0),
+                                   text_updated=False, textWidth=100, textHeight=20)
+        dim = self.Item(textFields=[textField], use_custom_text=False,
+                        textAlignment='C', fontSize=12)
+        dimProps = self.Item(fontSize=24, endcapSize=4)
+        with mock.patch.multiple(
+                sys.modules[__name__], draw_text_3D=mock.DEFAULT,
+                text_update_queue=mock.DEFAULT) as mocks:
+            try:
+                setup_dim_text(
+                    self.Item(name='Cube'), dim, dimProps, 2.0,
+                    Vector((0, 0, 0)), Vector((1, 0, 0)), Vector((0, 0.1, 0)))
+            finally:
+                render_state.clear()
+
+        # Only the text and its update flag are written, and no fields added
+        self.assertEqual(textField.text, format_distance(2.0))
+        self.assertTrue(textField.text_updated)
+        mocks['text_update_queue'].push.assert_called_once_with(textField)
+        self.assertEqual(dim.textFields, [textField])
+
+    def test_draw_annotation(self):
+        from unittest import mock
+
+        textFields = [
+            self.Item(autoFillText=False, text='NOTE',
+                      textWidth=100, textHeight=20),
+            self.Item(autoFillText=True, textSource='ELEVATION',
+                      text=format_distance(0.0).upper(),
+                      textWidth=100, textHeight=20)]
+        annotation = self.Item(
+            name='Note', uses_style=False, visible=True, visibleInView='',
+            is_active=True, color=(0, 0, 0, 1), lineWeight=1, endcapA='D',
+            endcapSize=4, evalMods=False, annotationAnchor=0,
+            annotationAnchorSpline=-1, annotationOffset=(1, 1, 0),
+            annotationRotation=(0, 0, 0), custom_scale=1.0,
+            custom_shape_location='A', customShape=None, leader_length=1.0,
+            align_to_camera=False, draw_leader=True, all_caps=True,
+            inFront=False, fontSize=12, textAlignment='L', textPosition='T',
+            textFields=textFields)
+        myobj = self.Item(name='Empty', type='EMPTY', data=None)
+        annotationGen = self.Item(annotations=[annotation])
+
+        with mock.patch.multiple(
+                sys.modules[__name__], draw_lines=mock.DEFAULT,
+                draw_points=mock.DEFAULT, draw_text_3D=mock.DEFAULT,
+                OpenGL_Settings=mock.MagicMock()):
+            try:
+                draw_annotation(bpy.context, myobj, annotationGen,
+                                Matrix.Identity(4))
+                self.assertEqual(render_state.get(annotation).gizLoc,
+                                 Vector((1, 1, 0)))
+            finally:
+                render_state.clear()
+
+
+class ItemIndexTests(unittest.TestCase):
+
+    class Item(object):
+        def __init__(self, pointer):
+            self.pointer = pointer
+
+        def as_pointer(self):
+            return self.pointer
+
+    def test_same_length(self):
+        from .measureit_arch_utils import ItemIndex
+
+        generator = self.Item(1)
+        generator.dims = [self.Item(10), self.Item(11), self.Item(12)]
+        index = ItemIndex()
+        self.assertEqual(index.locate(generator, generator.dims[2], ('dims',)), ('dims', 2))
+
+        # Remove one item and add another, the items move but the length stays
+        generator.dims = [self.Item(11), self.Item(12), self.Item(13)]
+        self.assertEqual(index.locate(generator, generator.dims[1], ('dims',)), ('dims', 1))
+        self.assertEqual(index.locate(generator, generator.dims[2], ('dims',)), ('dims', 2))
+        self.assertIsNone(index.locate(generator, self.Item(10), ('dims',)))
+
+
+class SymbolCacheTests(unittest.TestCase):
+
+    def test_queue(self):
+        from types import SimpleNamespace
+
+        cache = SymbolCache()
+        symbol = SimpleNamespace(key=1, objects=())
+        for idx in range(3):
+            cache.queue(symbol, Matrix.Translation((idx, 0, 0)), True)
+        cache.queue(symbol, Matrix.Identity(4), False)
+
+        # One draw of the shape for each way it's transformed
+        self.assertEqual(len(cache.queued), 2)
+        extMats = cache.queued[1, True, 1][3]
+        self.assertEqual([extMat.translation[0] for extMat in extMats], [0, 1, 2])
+
+
+class LabelSolverTests(unittest.TestCase):
+
+    @staticmethod
+    def card(rect):
+        # A flat card whose screen rect is `rect`, in a (2, 2) viewport
+        # through the identity matrix
+        minX, minY, maxX, maxY = (value - 1 for value in rect)
+        return [(minX, minY, 0), (minX, maxY, 0), (maxX, maxY, 0), (maxX, minY, 0)]
+
+    def test_overlap(self):
+        solver = LabelSolver()
+        solver.begin_frame(Matrix.Identity(4), (2, 2))
+        card = self.card((10.0, 10.0, 30.0, 15.0))
+        chosen = solver.solve(['a', 'b', 'c'], [card] * 3)
+        self.assertEqual([LABEL_CANDIDATES[idx] for idx in chosen],
+                         [(0, 0, False), (0, 1, False), (0, -1, False)])
+
+    def test_dense(self):
+        import random
+        random.seed(4)
+        keys = list(range(10000))
+        cards = []
+        for key in keys:
+            x, y = random.uniform(0, 4000), random.uniform(0, 4000)
+            cards.append(self.card((x, y, x + 40, y + 10)))
+
+        def draw_frame(solver, keys, cards):
+            solver.begin_frame(Matrix.Identity(4), (2, 2))
+            placed = solver.solve(keys, cards).tolist()
+            solver.end_frame()
+            return placed
+
+        solver = LabelSolver()
+        placed = draw_frame(solver, keys, cards)
+        self.assertEqual(solver.solved, len(keys))
+        self.assertEqual(placed[0], 0)
+        self.assertGreater(sum(idx > 0 for idx in placed), 0)
+
+        # An unchanged frame reuses every placement
+        self.assertEqual(draw_frame(solver, keys, cards), placed)
+        self.assertEqual((solver.solved, solver.reused), (0, len(keys)))
+
+        # Moving one label only solves that label
+        cards[0] = self.card((-100.0, -100.0, -60.0, -90.0))
+        reused = draw_frame(solver, keys, cards)
+        self.assertEqual((solver.solved, solver.reused), (1, len(keys) - 1))
+        self.assertEqual(reused[1:], placed[1:])
+
+        # Labels no longer drawn stop taking space
+        draw_frame(solver, keys[:1], cards[1:2])
+        self.assertEqual((solver.solved, solver.reused), (1, 0))
+        self.assertEqual(solver.chosen.tolist(), [0])
+
+        # Labels behind the view stay in place
+        cards[1] = [(x, y, -2.0) for x, y, z in cards[1]]
+        solver.begin_frame(Matrix([(1, 0, 0, 0), (0, 1, 0, 0), (0, 0, 1, 0),
+                                   (0, 0, 1, 1)]), (2, 2))
+        self.assertEqual(solver.solve(keys[:2], cards[:2]).tolist(), [0, -1])
+
+
+class CullStateTests(unittest.TestCase):
+
+    def test_frustum(self):
+        # Orthographic view of x and y in [-10, 10]
+        cull = CullState()
+        cull.begin_frame(Matrix.Scale(0.1, 4), (200, 200), 3)
+
+        key = 'item'
+        self.assertTrue(cull.visible(key))
+        record = cull.begin_item(key)
+        cull.extend([Vector((20, 20, 0)), Vector((30, 25, 0))])
+        cull.end_item(key, record)
+        self.assertEqual(cull.bounds[key], (30, 20, 25, 20, 0, 0))
+
+        self.assertFalse(cull.visible(key))
+        self.assertTrue(cull.visible(None, (5, -5, 5, -5, 0, 0)))
+        self.assertEqual((cull.items, cull.culled), (3, 1))
+
+        # One world unit is 10 pixels
+        self.assertTrue(cull.too_small(Vector((0, 0, 0)), 0.2))
+        self.assertFalse(cull.too_small(Vector((0, 0, 0)), 0.5))
+
+
+class LineLODTests(unittest.TestCase):
+
+    def test_simplify(self):
+        # A polyline circle of 100k segments
+        angles = np.linspace(0, 2 * pi, 100001)
+        points = np.stack(
+            (np.cos(angles) * 10, np.sin(angles) * 10, np.zeros_like(angles)), axis=1)
+        coords = np.repeat(points, 2, axis=0)[1:-1]
+        lod = LineLOD(coords, np.ones(len(coords)))
+
+        self.assertEqual(lod.level_for(0), 0)
+        lastCount = len(coords)
+        for level in range(1, len(LINE_LOD_TOLERANCES)):
+            # Levels are built inside the draw callback
+            startTime = time.perf_counter()
+            lodCoords, lodWeights = simplify_line_segments(
+                lod.coords, lod.weights, LINE_LOD_TOLERANCES[level] * lod.size)
+            self.assertLess(time.perf_counter() - startTime, 0.5)
+            self.assertEqual(len(lodCoords), len(lodWeights))
+            self.assertLess(len(lodCoords), lastCount)
+            lastCount = len(lodCoords)
+
+            # Every vertex kept is on the circle, within the tolerance
+            radii = np.linalg.norm(lodCoords[:, :2], axis=1)
+            tolerance = LINE_LOD_TOLERANCES[level] * lod.size
+            self.assertLess(np.abs(radii - 10).max(), tolerance + 1e-4)
+
+    def test_collinear(self):
+        coords = [(0, 0, 0), (1, 0, 0), (1, 0, 0), (2, 0, 0),
+                  (2, 0, 0), (2, 1, 0), (3, 0, 0), (3, 0, 0.001)]
+        lodCoords, lodWeights = simplify_line_segments(coords, [1] * 8, 0.01)
+        segments = sorted(tuple(map(tuple, lodCoords[idx:idx + 2].tolist()))
+                          for idx in range(0, len(lodCoords), 2))
+        self.assertEqual(segments, [((0, 0, 0), (2, 0, 0)), ((2, 0, 0), (2, 1, 0))])
+
+
+class SidecarCacheTests(unittest.TestCase):
+
+    def test_round_trip(self):
+        import tempfile
+        from .measureit_arch_utils import SidecarCache
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SidecarCache()
+            cache.directory = lambda: tmpdir
+            coords = np.arange(12, dtype=np.float32).reshape(-1, 3)
+            key = cache.digest(coords, 'hull')
+            self.assertNotEqual(key, cache.digest(coords + 1, 'hull'))
+
+            self.assertIsNone(cache.load('hull', key, ('hull',)))
+            cache.save('hull', key, {'hull': coords})
+            arrays = cache.load('hull', key, ('hull',))
+            self.assertTrue(np.array_equal(arrays['hull'], coords))
+            self.assertEqual((cache.hits, cache.misses, cache.writes), (1, 1, 1))
+            del arrays
+
+            # Entries that don't match their checksum are misses
+            sumPath, arrayPath = cache.paths(tmpdir, 'hull', key)
+            np.save(arrayPath.format('hull'), coords * 2)
+            self.assertIsNone(cache.load('hull', key, ('hull',)))
+
+    def test_prune(self):
+        import os
+        import tempfile
+        from .measureit_arch_utils import SidecarCache
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SidecarCache()
+            cache.directory = lambda: tmpdir
+            coords = np.zeros((1000, 3), dtype=np.float32)
+            keys = [cache.digest(coords + i, 'hull') for i in range(3)]
+            cache.MAX_BYTES = 2.5 * coords.nbytes
+            for i, key in enumerate(keys):
+                sumPath, arrayPath = cache.paths(tmpdir, 'hull', key)
+                cache.save('hull', key, {'hull': coords + i})
+                os.utime(sumPath, (i, i))
+                if i == 1:
+                    # Using the oldest entry keeps it
+                    self.assertIsNotNone(cache.load('hull', keys[0], ('hull',)))
+
+            self.assertIsNotNone(cache.load('hull', keys[0], ('hull',)))
+            self.assertIsNone(cache.load('hull', keys[1], ('hull',)))
+            self.assertIsNotNone(cache.load('hull', keys[2], ('hull',)))
+
+
+class ProfilerTests(unittest.TestCase):
+
+    def test_self_time(self):
+        from types import SimpleNamespace
+        from .measureit_arch_utils import Profiler
+
+        prof = Profiler()
+
+        @prof.timed('inner', ownerArg=0)
+        def inner(obj):
+            time.sleep(0.002)
+
+        @prof.timed('outer')
+        def outer():
+            inner(SimpleNamespace(name='Cube'))
+
+        outer()
+        self.assertEqual(prof.stats, {})
+
+        prof.enabled = True
+        outer()
+        calls, total, selfTime = prof.stats[('outer', None)]
+        self.assertLess(selfTime, total - 0.002)
+        self.assertEqual([row[0] for row in prof.summary(byOwner=True)], ['Cube'])
+        self.assertEqual(len(prof.to_chrome_trace()['traceEvents']), 2)
@@ -27,11 +27,27 @@
 import bpy
 
 from bpy.types import GizmoGroup
+from bpy_extras.view3d_utils import location_3d_to_region_2d
 from mathutils import Vector, Matrix, Quaternion
 from math import radians
 
+from .measureit_arch_utils import render_state
+
+# Items past this many get no gizmos, so refreshing stays fast when heavily
+# dimensioned objects are selected
+MAX_GIZMO_ITEMS = 200
+
+# Axis colors of the annotation gizmos
+AXIS_COLORS = ((0.96, 0.2, 0.31), (0.54, 0.86, 0), (0.15, 0.56, 1))
+
 
 class mArchGizmoGroup(GizmoGroup):
+    """
+    Gizmos are pooled per item and only their matrices and colors are
+    updated on refresh. They're created and removed when items are added,
+    removed or (de)selected, and hidden while their item is off screen.
+    """
+
     bl_idname = "OBJECT_GG_mArch"
     bl_label = "MeasureIt_ARCH Gizmo Group"
     bl_space_type = 'VIEW_3D'
@@ -51,74 +67,89 @@ class mArchGizmoGroup(GizmoGroup):
                     return (obj)
 
     def createGiz(self, obj):
-        objIndex = 0
-        for obj in bpy.context.selected_objects:
+        context = bpy.context
+        styles = context.scene.StyleGenerator.alignedDimensions
+        pool = self.pool
+        used = set()
+
+        def sync(key, create, update, *args):
+            if len(used) >= MAX_GIZMO_ITEMS:
+                return
+            if key not in pool:
+                pool[key] = create(self, *args)
+            update(pool[key], *args)
+            used.add(key)
+
+        for objIndex, obj in enumerate(context.selected_objects):
             if 'DimensionGenerator' in obj:
                 dimGen = obj.DimensionGenerator
-                idx = 0
-                for dim in dimGen.alignedDimensions:
-                    createDimOffsetGiz(
-                        self, dim, objIndex, idx, "DimensionGenerator.alignedDimensions[self.idx]")
-                    idx += 1
-                idx = 0
-                for dim in dimGen.axisDimensions:
-                    createDimOffsetGiz(
-                        self, dim, objIndex, idx, "DimensionGenerator.axisDimensions[self.idx]")
-                    idx += 1
+                for dimType in ('alignedDimensions', 'axisDimensions'):
+                    for idx, dim in enumerate(getattr(dimGen, dimType)):
+                        dimProps = dim
+                        if dim.uses_style:
+                            dimProps = styles.get(dim.style, dim)
+                        key = ('offset', objIndex, dimType, idx, dim.as_pointer())
+                        sync(key, createDimOffsetGiz, updateDimOffsetGiz,
+                             dim, dimProps, objIndex, idx, dimType)
+
             if 'AnnotationGenerator' in obj:
                 annotationGen = obj.AnnotationGenerator
-                createAnnotationTranslateGiz(self, annotationGen, objIndex)
-                createAnnotationRotateGiz(self, annotationGen, objIndex)
-            objIndex += 1
+                for idx, anno in enumerate(annotationGen.annotations):
+                    key = ('translate', objIndex, idx, anno.as_pointer())
+                    sync(key, createAnnotationTranslateGiz,
+                         updateAnnotationTranslateGiz, anno, obj, objIndex, idx)
+                    key = ('rotate', objIndex, idx, anno.as_pointer())
+                    sync(key, createAnnotationRotateGiz,
+                         updateAnnotationRotateGiz, anno, obj, objIndex, idx)
+
+        for key in [key for key in pool if key not in used]:
+            for gizmo in pool.pop(key):
+                self.gizmos.remove(gizmo)
 
     def setup(self, context):
         obj = context.object
+        self.pool = {}
         self.createGiz(obj)
 
     def refresh(self, context):
         obj = context.object
-        self.gizmos.clear()
         self.createGiz(obj)
 
+    def draw_prepare(self, context):
+        # Hide the gizmos of off screen items
+        region = context.region
+        rv3d = context.region_data
+        if region is None or rv3d is None:
+            return
+        for gizmos in self.pool.values():
+            loc = location_3d_to_region_2d(
+                region, rv3d, gizmos[0].matrix_basis.translation)
+            hide = loc is None or not (0 <= loc.x <= region.width and
+                                       0 <= loc.y <= region.height)
+            for gizmo in gizmos:
+                gizmo.hide = hide
 
-def createDimOffsetGiz(group, dim, objIndex, idx, dimStr):
-    context = bpy.context
-    dimProps = dim
-    if dim.uses_style:
-        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-            if alignedDimStyle.name == dim.style:
-                dimProps = alignedDimStyle
 
-    # Set Matrix
-    k = Vector((0, 0, -1))
-    basisMatrix = Matrix.Translation(Vector((0, 0, 0)))
-    rot = k.rotation_difference(dim.gizRotDir)
-    rotMatrix = rot.to_matrix()
-    rotMatrix.resize_4x4()
+def gamma_correct(color):
+    return (pow(color[0], (1 / 2.2)), pow(color[1], (1 / 2.2)),
+            pow(color[2], (1 / 2.2)))
 
-    basisMatrix.translation = Vector(dim.gizLoc) + (Vector(dim.gizRotDir) * -0.1)
-    basisMatrix = basisMatrix @ rotMatrix
 
+def createDimOffsetGiz(group, dim, dimProps, objIndex, idx, dimType):
     # Offset Gizmo
     dimOffsetGiz = group.gizmos.new("GIZMO_GT_arrow_3d")
     op = dimOffsetGiz.target_set_operator("measureit_arch.dimension_offset")
     op.objIndex = objIndex
     op.idx = idx
-    op.dimType = dimStr
+    op.dimType = dimType
     dimOffsetGiz.draw_style = "NORMAL"
     dimOffsetGiz.use_draw_modal = False
 
     dimOffsetGiz.length = 0
-    dimOffsetGiz.matrix_basis = basisMatrix
     dimOffsetGiz.use_draw_value = False
 
     dimOffsetGiz.scale_basis = 1
-    dimOffsetGiz.color = (pow(dimProps.color[0], (1 / 2.2)), pow(
-        dimProps.color[1], (1 / 2.2)), pow(dimProps.color[2], (1 / 2.2)))
     dimOffsetGiz.alpha = 0.7
-
-    dimOffsetGiz.color_highlight = (pow(dimProps.color[0], (1 / 2.2)), pow(
-        dimProps.color[1], (1 / 2.2)), pow(dimProps.color[2], (1 / 2.2)))
     dimOffsetGiz.alpha_highlight = 1
 
     # Button Gizmo
@@ -127,231 +158,147 @@ def createDimOffsetGiz(group, dim, objIndex, idx, dimStr):
     # dimButton.scale_basis = 0.2
     # dimButton.matrix_basis = basisMatrix
 
-    # Add Gizmos to group
-    group.offset_widget = dimOffsetGiz
-    # group.settings_widget = dimButton
-    # self.rotate_widget = rotateGiz
+    return (dimOffsetGiz,)
 
 
-def createAnnotationTranslateGiz(group, annotationGen, objIndex):
-    # Set Basis Matrix
-    idx = 0
-    for anno in annotationGen.annotations:
-        basisMatrix = Matrix.Translation(Vector((0, 0, 0)))
-        obj = bpy.context.selected_objects[objIndex]
-        mat = obj.matrix_world
-        objrot = mat.to_quaternion()
-        basisMatrix.translation = Vector(
-            anno.gizLoc) - Vector(anno.annotationOffset)
-        scale = 1
-        lineweight = 2
-        length = 0.6
-        offset = 0.05
-        baseAlpha = 0.15
-
-        # Basic Move Gizmo
-        annotationMove = group.gizmos.new("GIZMO_GT_move_3d")
-        annotationMove.target_set_prop("offset", anno, "annotationOffset")
-
-        annotationMove.matrix_basis = basisMatrix
-        annotationMove.scale_basis = 0.15
-        annotationMove.draw_style = 'RING_2D'
-        annotationMove.draw_options = {'ALIGN_VIEW'}
-        annotationMove.line_width = lineweight
-        annotationMove.color = 0.8, 0.8, 0.8
-        annotationMove.alpha = 0.5
-        annotationMove.use_draw_modal = True
-
-        annotationMove.color_highlight = 1.0, 1.0, 1.0
-        annotationMove.alpha_highlight = 1
-
-        # Translate Op Gizmos
-        # X
-        annotationOffsetX = group.gizmos.new("GIZMO_GT_arrow_3d")
-        opX = annotationOffsetX.target_set_operator(
-            "measureit_arch.translate_annotation")
-        opX.constrainAxis = (True, False, False)
-        opX.objIndex = objIndex
-        opX.idx = idx
-
-        XbasisMatrix = basisMatrix.to_3x3()
-        rot = Quaternion(Vector((0, 1, 0)), radians(90))
-        XbasisMatrix.rotate(rot)
-        XbasisMatrix.rotate(objrot)
-        XbasisMatrix.resize_4x4()
-        offsetVec = Vector((offset, 0, 0))
-        offsetVec.rotate(objrot)
-        XbasisMatrix.translation = Vector(anno.gizLoc) + offsetVec
-
-        annotationOffsetX.matrix_basis = XbasisMatrix
-        annotationOffsetX.use_draw_modal = False
-        annotationOffsetX.scale_basis = scale
-        annotationOffsetX.length = length
-        annotationOffsetX.line_width = lineweight
+def updateDimOffsetGiz(gizmos, dim, dimProps, objIndex, idx, dimType):
+    dimOffsetGiz, = gizmos
 
-        annotationOffsetX.color = 0.96, 0.2, 0.31
-        annotationOffsetX.alpha = baseAlpha
+    # Set Matrix
+    k = Vector((0, 0, -1))
+    basisMatrix = Matrix.Translation(Vector((0, 0, 0)))
+    gizLoc = Vector(render_state.read(dim, 'gizLoc'))
+    gizRotDir = Vector(render_state.read(dim, 'gizRotDir'))
+    rot = k.rotation_difference(gizRotDir)
+    rotMatrix = rot.to_matrix()
+    rotMatrix.resize_4x4()
 
-        annotationOffsetX.color_highlight = 0.96, 0.2, 0.31
-        annotationOffsetX.alpha_highlight = 1
+    basisMatrix.translation = gizLoc + (gizRotDir * -0.1)
+    basisMatrix = basisMatrix @ rotMatrix
 
-        # Y
-        annotationOffsetY = group.gizmos.new("GIZMO_GT_arrow_3d")
-        opY = annotationOffsetY.target_set_operator(
+    dimOffsetGiz.matrix_basis = basisMatrix
+    dimOffsetGiz.color = gamma_correct(dimProps.color)
+    dimOffsetGiz.color_highlight = gamma_correct(dimProps.color)
+
+
+def createAnnotationTranslateGiz(group, anno, obj, objIndex, idx):
+    lineweight = 2
+    baseAlpha = 0.15
+
+    # Basic Move Gizmo
+    annotationMove = group.gizmos.new("GIZMO_GT_move_3d")
+    annotationMove.target_set_prop("offset", anno, "annotationOffset")
+
+    annotationMove.scale_basis = 0.15
+    annotationMove.draw_style = 'RING_2D'
+    annotationMove.draw_options = {'ALIGN_VIEW'}
+    annotationMove.line_width = lineweight
+    annotationMove.color = 0.8, 0.8, 0.8
+    annotationMove.alpha = 0.5
+    annotationMove.use_draw_modal = True
+
+    annotationMove.color_highlight = 1.0, 1.0, 1.0
+    annotationMove.alpha_highlight = 1
+
+    # Translate Op Gizmos
+    gizmos = [annotationMove]
+    for axis, color in enumerate(AXIS_COLORS):
+        annotationOffset = group.gizmos.new("GIZMO_GT_arrow_3d")
+        op = annotationOffset.target_set_operator(
             "measureit_arch.translate_annotation")
-        opY.constrainAxis = (False, True, False)
-        opY.objIndex = objIndex
-        opY.idx = idx
-
-        YbasisMatrix = basisMatrix.to_3x3()
-        rot = Quaternion(Vector((1, 0, 0)), radians(-90))
-        YbasisMatrix.rotate(rot)
-        YbasisMatrix.rotate(objrot)
-        YbasisMatrix.resize_4x4()
-        offsetVec = Vector((0, offset, 0))
-        offsetVec.rotate(objrot)
-        YbasisMatrix.translation = Vector(anno.gizLoc) + offsetVec
+        op.constrainAxis = [axis == 0, axis == 1, axis == 2]
+        op.objIndex = objIndex
+        op.idx = idx
 
-        annotationOffsetY.matrix_basis = YbasisMatrix
-        annotationOffsetY.use_draw_modal = False
-        annotationOffsetY.scale_basis = scale
-        annotationOffsetY.length = length
-        annotationOffsetY.line_width = lineweight
+        annotationOffset.use_draw_modal = False
+        annotationOffset.scale_basis = 1
+        annotationOffset.length = 0.6
+        annotationOffset.line_width = lineweight
 
-        annotationOffsetY.color = 0.54, 0.86, 0
-        annotationOffsetY.alpha = baseAlpha
+        annotationOffset.color = color
+        annotationOffset.alpha = baseAlpha
 
-        annotationOffsetY.color_highlight = 0.54, 0.86, 0
-        annotationOffsetY.alpha_highlight = 1
+        annotationOffset.color_highlight = color
+        annotationOffset.alpha_highlight = 1
+        gizmos.append(annotationOffset)
 
-        # Z
-        annotationOffsetZ = group.gizmos.new("GIZMO_GT_arrow_3d")
-        opZ = annotationOffsetZ.target_set_operator(
-            "measureit_arch.translate_annotation")
-        opZ.constrainAxis = (False, False, True)
-        opZ.objIndex = objIndex
-        opZ.idx = idx
-
-        ZbasisMatrix = basisMatrix.to_3x3()
-        ZbasisMatrix.rotate(objrot)
-        ZbasisMatrix.resize_4x4()
-        offsetVec = Vector((0, 0, offset))
-        offsetVec.rotate(objrot)
-        ZbasisMatrix.translation = Vector(anno.gizLoc) + offsetVec
-
-        annotationOffsetZ.matrix_basis = ZbasisMatrix
-        annotationOffsetZ.use_draw_modal = False
-        annotationOffsetZ.scale_basis = scale
-        annotationOffsetZ.length = length
-        annotationOffsetZ.line_width = lineweight
+    return gizmos
 
-        annotationOffsetZ.color = 0.15, 0.56, 1
-        annotationOffsetZ.alpha = baseAlpha
 
-        annotationOffsetZ.color_highlight = 0.15, 0.56, 1
-        annotationOffsetZ.alpha_highlight = 1
+def axis_matrices(basisMatrix, objrot):
+    """ Rotation of the X, Y and Z gizmos around `basisMatrix` """
+    matrices = []
+    for rot in (Quaternion(Vector((0, 1, 0)), radians(90)),
+                Quaternion(Vector((1, 0, 0)), radians(-90)),
+                None):
+        axisMatrix = basisMatrix.to_3x3()
+        if rot is not None:
+            axisMatrix.rotate(rot)
+        axisMatrix.rotate(objrot)
+        axisMatrix.resize_4x4()
+        matrices.append(axisMatrix)
+    return matrices
 
-        # add to group
-        group.move_widget = annotationMove
-        group.X_widget = annotationOffsetX
-        group.Y_widget = annotationOffsetY
-        group.Z_widget = annotationOffsetZ
-        idx += 1
 
+def updateAnnotationTranslateGiz(gizmos, anno, obj, objIndex, idx):
+    offset = 0.05
+    gizLoc = Vector(render_state.read(anno, 'gizLoc'))
 
-def createAnnotationRotateGiz(group, annotationGen, objIndex):
     # Set Basis Matrix
-    idx = 0
+    basisMatrix = Matrix.Translation(Vector((0, 0, 0)))
+    objrot = obj.matrix_world.to_quaternion()
+    basisMatrix.translation = gizLoc - Vector(anno.annotationOffset)
+
+    annotationMove = gizmos[0]
+    annotationMove.matrix_basis = basisMatrix
+
+    axisMatrices = axis_matrices(basisMatrix, objrot)
+    for axis, annotationOffset in enumerate(gizmos[1:]):
+        offsetVec = Vector((0, 0, 0))
+        offsetVec[axis] = offset
+        offsetVec.rotate(objrot)
+        axisMatrices[axis].translation = gizLoc + offsetVec
+        annotationOffset.matrix_basis = axisMatrices[axis]
+
+
+def createAnnotationRotateGiz(group, anno, obj, objIndex, idx):
     rotateGizScale = 0.5
-    for anno in annotationGen.annotations:
-        basisMatrix = Matrix.Translation(Vector((0, 0, 0)))
-        basisMatrix.translation = Vector(anno.gizLoc)
-        obj = bpy.context.selected_objects[objIndex]
-        mat = obj.matrix_world
-        objrot = mat.to_quaternion()
-        lineweight = 2
-        baseAlpha = 0.15
-
-        # Translate Op Gizmos
-        # X
-        annotationRotateX = group.gizmos.new("GIZMO_GT_move_3d")
-        annotationRotateX.use_draw_modal = True
-        opX = annotationRotateX.target_set_operator(
-            "measureit_arch.rotate_annotation")
-        opX.constrainAxis = (True, False, False)
-        opX.objIndex = objIndex
-        opX.idx = idx
-
-        XbasisMatrix = basisMatrix.to_3x3()
-        rot = Quaternion(Vector((0, 1, 0)), radians(90))
-        XbasisMatrix.rotate(rot)
-        XbasisMatrix.rotate(objrot)
-        XbasisMatrix.resize_4x4()
-        XbasisMatrix.translation = Vector(anno.gizLoc)
-
-        annotationRotateX.matrix_basis = XbasisMatrix
-        annotationRotateX.scale_basis = rotateGizScale
-        annotationRotateX.line_width = lineweight
-
-        annotationRotateX.color = 0.96, 0.2, 0.31
-        annotationRotateX.alpha = baseAlpha
-
-        annotationRotateX.color_highlight = 0.96, 0.2, 0.31
-        annotationRotateX.alpha_highlight = 1
-
-        # Y
-        annotationRotateY = group.gizmos.new("GIZMO_GT_move_3d")
-        annotationRotateY.use_draw_modal = True
-        opY = annotationRotateY.target_set_operator(
+    lineweight = 2
+    baseAlpha = 0.15
+
+    # Rotate Op Gizmos
+    gizmos = []
+    for axis, color in enumerate(AXIS_COLORS):
+        annotationRotate = group.gizmos.new("GIZMO_GT_move_3d")
+        annotationRotate.use_draw_modal = True
+        op = annotationRotate.target_set_operator(
             "measureit_arch.rotate_annotation")
-        opY.constrainAxis = (False, True, False)
-        opY.objIndex = objIndex
-        opY.idx = idx
-
-        YbasisMatrix = basisMatrix.to_3x3()
-        rot = Quaternion(Vector((1, 0, 0)), radians(-90))
-        YbasisMatrix.rotate(rot)
-        YbasisMatrix.rotate(objrot)
-        YbasisMatrix.resize_4x4()
-        YbasisMatrix.translation = Vector(anno.gizLoc)
-
-        annotationRotateY.matrix_basis = YbasisMatrix
-        annotationRotateY.scale_basis = rotateGizScale
-        annotationRotateY.line_width = lineweight
-
-        annotationRotateY.color = 0.54, 0.86, 0
-        annotationRotateY.alpha = baseAlpha
-
-        annotationRotateY.color_highlight = 0.54, 0.86, 0
-        annotationRotateY.alpha_highlight = 1
-
-        # Z
-        annotationRotateZ = group.gizmos.new("GIZMO_GT_move_3d")
-        annotationRotateZ.use_draw_modal = True
-        opZ = annotationRotateZ.target_set_operator(
-            "measureit_arch.rotate_annotation")
-        opZ.constrainAxis = (False, False, True)
-        opZ.objIndex = objIndex
-        opZ.idx = idx
+        op.constrainAxis = [axis == 0, axis == 1, axis == 2]
+        op.objIndex = objIndex
+        op.idx = idx
+
+        annotationRotate.scale_basis = rotateGizScale
+        annotationRotate.line_width = lineweight
+
+        annotationRotate.color = color
+        annotationRotate.alpha = baseAlpha
 
-        ZbasisMatrix = basisMatrix.to_3x3()
-        ZbasisMatrix.rotate(objrot)
-        ZbasisMatrix.resize_4x4()
-        ZbasisMatrix.translation = Vector(anno.gizLoc)
+        annotationRotate.color_highlight = color
+        annotationRotate.alpha_highlight = 1
+        gizmos.append(annotationRotate)
 
-        annotationRotateZ.matrix_basis = ZbasisMatrix
-        annotationRotateZ.scale_basis = rotateGizScale
-        annotationRotateZ.line_width = lineweight
+    return gizmos
 
-        annotationRotateZ.color = 0.15, 0.56, 1
-        annotationRotateZ.alpha = baseAlpha
 
-        annotationRotateZ.color_highlight = 0.15, 0.56, 1
-        annotationRotateZ.alpha_highlight = 1
+def updateAnnotationRotateGiz(gizmos, anno, obj, objIndex, idx):
+    gizLoc = Vector(render_state.read(anno, 'gizLoc'))
 
-        # add to group
+    # Set Basis Matrix
+    basisMatrix = Matrix.Translation(Vector((0, 0, 0)))
+    basisMatrix.translation = gizLoc
+    objrot = obj.matrix_world.to_quaternion()
 
-        group.X_widget = annotationRotateX
-        group.Y_widget = annotationRotateY
-        group.Z_widget = annotationRotateZ
-        idx += 1
+    axisMatrices = axis_matrices(basisMatrix, objrot)
+    for axisMatrix, annotationRotate in zip(axisMatrices, gizmos):
+        axisMatrix.translation = gizLoc
+        annotationRotate.matrix_basis = axisMatrix
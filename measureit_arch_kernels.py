@@ -0,0 +1,1247 @@
+# coding=utf-8
+
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# ----------------------------------------------------------
+# File: measureit_arch_kernels.py
+# Geometry and unit kernels that don't depend on Blender
+# ----------------------------------------------------------
+
+"""
+Math of dimensions, text cards, depth testing and unit formatting, with
+everything it needs passed in explicitly. Nothing here imports `bpy`,
+`mathutils` or the GPU modules: points are any sequences of floats and
+results are tuples, so the kernels run (and are tested and benchmarked)
+in plain Python. NumPy is only needed for the bulk functions.
+
+The add-on calls these through thin adapters that read the scene and wrap
+results in `mathutils` types, e.g. `generate_text_card` in
+measureit_arch_geometry. Run the tests with:
+
+    python measureit_arch_kernels.py
+"""
+
+import math
+import random
+import unittest
+
+from collections import OrderedDict
+from typing import Tuple
+
+__all__ = (
+    'BU_TO_INCHES',
+    'BU_TO_FEET',
+    'UnitFormatter',
+    'DepthTester',
+    'camera_depth',
+    'cap_offset',
+    'euler_matrix',
+    'get_arc_data',
+    'get_axis_aligned_bounds',
+    'get_dom_axis',
+    'interpolate_point',
+    'place_labels',
+    'sortPoints',
+    'text_card_coords',
+)
+
+
+# ----------------------------------------------------------
+# Geometry
+# ----------------------------------------------------------
+
+def _sub(a, b):
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+
+def _add(a, b):
+    return (a[0] + b[0], a[1] + b[1], a[2] + b[2])
+
+
+def _scale(a, factor):
+    return (a[0] * factor, a[1] * factor, a[2] * factor)
+
+
+def _dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def _length(a):
+    return math.sqrt(_dot(a, a))
+
+
+def _normalized(a):
+    """ `a` scaled to unit length, zero vectors stay zero like mathutils """
+    length = _length(a)
+    if length == 0:
+        return (0.0, 0.0, 0.0)
+    return _scale(a, 1 / length)
+
+
+def _angle(a, b):
+    """ Angle between two vectors, ValueError for zero length vectors """
+    lengths = _length(a) * _length(b)
+    if lengths == 0:
+        raise ValueError("Zero length vector has no angle")
+    return math.acos(max(-1.0, min(1.0, _dot(a, b) / lengths)))
+
+
+def get_dom_axis(vector):
+    """ Index of the largest axis of `vector`, 0 when there is no single one """
+    domAxis = 0
+    if abs(vector[0]) > abs(vector[1]) and abs(vector[0]) > abs(vector[2]):
+        domAxis = 0
+    if abs(vector[1]) > abs(vector[0]) and abs(vector[1]) > abs(vector[2]):
+        domAxis = 1
+    if abs(vector[2]) > abs(vector[0]) and abs(vector[2]) > abs(vector[1]):
+        domAxis = 2
+
+    return domAxis
+
+
+def sortPoints(p1, p2):
+    """ `p1` and `p2` ordered by decreasing value along their dominant axis """
+    domAxis = get_dom_axis(_sub(p1, p2))
+
+    if p2[domAxis] > p1[domAxis]:
+        p1, p2 = p2, p1
+
+    return p1, p2
+
+
+def interpolate_point(v1, v2, d1):
+    """
+    Point at distance `d1` from `v1` towards `v2`, beyond `v2` if `d1` is
+    longer than the segment
+    """
+    v = _sub(v2, v1)
+    d0 = _length(v)
+
+    # Interpolation factor (distance from origin / distance total)
+    if d0 > 0:
+        x = d1 / d0
+    else:
+        x = d1
+
+    return _add(v1, _scale(v, x))
+
+
+def get_arc_data(pointa, pointb, pointc, pointd):
+    """
+    Angle and length of the arc around `pointb` from `pointa` through
+    `pointc` to `pointd`
+    """
+    v1 = _sub(pointa, pointb)
+    v2 = _sub(pointc, pointb)
+    v3 = _sub(pointd, pointb)
+
+    angle = _angle(v1, v2) + _angle(v2, v3)
+
+    rclength = math.pi * 2 * _length(v2) * (angle / (math.pi * 2))
+
+    return angle, rclength
+
+
+def get_axis_aligned_bounds(coords):
+    """
+    Takes a set of co-ordinates returns the min and max value for each axis
+    """
+    import numpy as np
+
+    coords = np.asarray(coords, dtype=np.float64)
+    if len(coords) == 0:
+        return [None] * 6
+
+    maxs = coords.max(axis=0)
+    mins = coords.min(axis=0)
+    return [float(maxs[0]), float(mins[0]),
+            float(maxs[1]), float(mins[1]),
+            float(maxs[2]), float(mins[2])]
+
+
+def euler_matrix(rotation):
+    """ 3x3 rotation matrix (rows) of XYZ euler angles """
+    cx, cy, cz = (math.cos(angle) for angle in rotation)
+    sx, sy, sz = (math.sin(angle) for angle in rotation)
+    return (
+        (cy * cz, sx * sy * cz - cx * sz, cx * sy * cz + sx * sz),
+        (cy * sz, sx * sy * sz + cx * cz, cx * sy * sz - sx * cz),
+        (-sy, sx * cy, cx * cy))
+
+
+def text_card_coords(
+        width, height, resolution, fontSize, scale, textAlignment='C',
+        textPosition='T', rotation=(0, 0, 0), basePoint=(0, 0, 0),
+        xDir=(1, 0, 0), yDir=(0, 1, 0), cardIdx=0):
+    """
+    Corners of the card of a `width` x `height` pixel text texture rendered
+    at `resolution`, as 4 points around `basePoint`
+
+    :param textAlignment: 'L', 'C' or 'R'
+    :param textPosition: 'T', 'M' or 'B'
+    :param rotation: XYZ euler rotation of the card around `basePoint`
+    :param cardIdx: index of the text field, cards of later fields are
+        stacked below the first
+    """
+    # Get font size in pt more stupid fudge factors :(
+    size = (fontSize / 803) * scale
+
+    sx = (width / resolution) * size
+    sy = (height / resolution) * size
+
+    cardX = _scale(_normalized(xDir), sx)
+    cardY = _scale(_normalized(yDir), sy)
+    halfX = _scale(cardX, 0.5)
+
+    square = (
+        _scale(halfX, -1),
+        _sub(cardY, halfX),
+        _add(cardY, halfX),
+        halfX,
+    )
+
+    # Pick the appropriate card based on alignment
+    if textAlignment == 'R':
+        aOff = halfX
+    elif textAlignment == 'L':
+        aOff = _scale(halfX, -1)
+    else:
+        aOff = (0.0, 0.0, 0.0)
+
+    if textPosition == 'M':
+        pOff = _scale(cardY, 0.5)
+    elif textPosition == 'B':
+        pOff = cardY
+    else:
+        pOff = (0.0, 0.0, 0.0)
+
+    offset = _add(_add(aOff, pOff), _scale(cardY, cardIdx))
+    rotMat = euler_matrix(rotation)
+
+    coords = []
+    for corner in square:
+        corner = _sub(corner, offset)
+        coords.append(_add(tuple(_dot(row, corner) for row in rotMat), basePoint))
+    return coords
+
+
+def cap_offset(dirVec, capSize, capAngle, scale):
+    """ Offset of an end cap's side along `dirVec` """
+    return _scale(_normalized(dirVec), capSize * math.sin(capAngle) * scale / 1000)
+
+
+# ----------------------------------------------------------
+# Depth testing
+# ----------------------------------------------------------
+
+def camera_depth(zValue, cameraType, nearClip, farClip):
+    """ Distance from the camera of a depth buffer value """
+    if cameraType == 'ORTHO':
+        return zValue * (farClip - nearClip) + nearClip - 0.09
+
+    elif cameraType == 'PERSP':
+        z_ndc = 2.0 * zValue - 1.0
+        return 2.0 * nearClip * farClip / \
+            (farClip + nearClip - z_ndc * (farClip - nearClip))
+
+    return zValue
+
+
+class DepthTester(object):
+    """
+    Splits lines into visible and hidden parts against the depth buffer of a
+    camera render, for vector output.
+
+    `project(point)` maps a world space point to its normalized (0-1)
+    position in the camera frame and its distance along the view axis, as
+    `bpy_extras.object_utils.world_to_camera_view` does.
+    """
+
+    def __init__(self, project, width, height, cameraType, clipStart, clipEnd,
+                 depthbuffer=None):
+        self.project = project
+        self.width = width
+        self.height = height
+        self.cameraType = cameraType
+        self.clipStart = clipStart
+        self.clipEnd = clipEnd
+        self.depthbuffer = depthbuffer if depthbuffer is not None else ()
+
+    def clipped(self, dist):
+        return dist < self.clipStart or dist > self.clipEnd
+
+    def culled(self, points):
+        """ True if all world space `points` are outside the clip range """
+        return all(self.clipped(self.project(point)[2]) for point in points)
+
+    def screen_point(self, co):
+        """
+        Pixel position of a projected point, from the bottom left like the
+        rows of the depth buffer
+        """
+        return (co[0] * self.width, co[1] * self.height)
+
+    def buffer_depth(self, x, y):
+        """ Camera distance stored in the depth buffer at pixel (x, y) """
+        idx = int(self.width * math.floor(y) + math.floor(x))
+        try:
+            zValue = self.depthbuffer[idx]
+        except IndexError:
+            zValue = 0
+        return camera_depth(zValue, self.cameraType, self.clipStart, self.clipEnd)
+
+    def visible(self, point, zOffset=0.1):
+        """
+        Whether the world space `point` is in front of the depth buffer, -1
+        when it's outside the clip range
+        """
+        co = self.project(point)
+        dist = co[2]
+        if dist < 0 or self.clipped(dist):
+            return -1
+        depth = self.buffer_depth(*self.screen_point(co))
+        return depth > dist - zOffset
+
+    def split(self, p1, p2, transform, zOffset=0.1):
+        """
+        Split the line from `p1` to `p2` where its visibility changes.
+        Returns a list of [visibility, start, end] runs in the line's own
+        space, `transform` maps its points to world space.
+
+        It's sampled about every 2 pixels.
+        """
+        p1World = transform(p1)
+        ssStart = self.screen_point(self.project(p1World))
+        ssEnd = self.screen_point(self.project(transform(p2)))
+        ssLength = math.hypot(ssStart[0] - ssEnd[0], ssStart[1] - ssEnd[1])
+        samples = max(1, math.ceil(ssLength / 2))
+
+        lastVisible = self.visible(p1World, zOffset)
+        runs = []
+        runStart = p1
+        stepDist = abs(_length(_sub(p1, p2)) / samples)
+
+        for idx in range(1, samples):
+            point = interpolate_point(p1, p2, stepDist * idx)
+            pointVisible = self.visible(transform(point), zOffset)
+            if pointVisible != lastVisible:
+                runs.append([lastVisible, runStart, point])
+                runStart = point
+                lastVisible = pointVisible
+
+        runs.append([lastVisible, runStart, p2])
+        return runs
+
+
+# ----------------------------------------------------------
+# Labels
+# ----------------------------------------------------------
+
+def _expand_ranges(starts, counts):
+    """ Indices of the ranges [start, start + count), one after another """
+    import numpy as np
+
+    ends = np.cumsum(counts)
+    total = int(ends[-1]) if len(ends) else 0
+    return np.repeat(starts - ends + counts, counts) + np.arange(total)
+
+
+def _overlaps_earlier(minX, minY, maxX, maxY, first=0):
+    """
+    For each box from `first` on, whether it overlaps a box before it. The
+    boxes are put in a uniform grid of cells the size of the largest box,
+    so each box is only tested against the boxes in the 9 cells around it.
+    """
+    import numpy as np
+
+    count = len(minX)
+    if count - first <= 0 or count < 2:
+        return np.zeros(max(count - first, 0), dtype=bool)
+
+    sizeX = max(float((maxX - minX).max()), 1e-6)
+    sizeY = max(float((maxY - minY).max()), 1e-6)
+    originX = minX.min()
+    originY = minY.min()
+    # Spread out boxes would need a lot of mostly empty cells
+    cells = ((minX.max() - originX) / sizeX + 1) * \
+        ((minY.max() - originY) / sizeY + 1)
+    if cells > 4 * count:
+        sizeX *= math.sqrt(cells / (4 * count))
+        sizeY *= math.sqrt(cells / (4 * count))
+
+    # Cells are offset by one so the cells around every box exist
+    cellX = ((minX - originX) // sizeX).astype(np.int64) + 1
+    cellY = ((minY - originY) // sizeY).astype(np.int64) + 1
+    span = int(cellY.max()) + 2
+    ids = cellX * span + cellY
+    order = np.argsort(ids)
+    starts = np.zeros((int(cellX.max()) + 2) * span + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ids, minlength=len(starts) - 1), out=starts[1:])
+
+    overlapped = np.zeros(count, dtype=bool)
+    queries = np.arange(first, count)
+    queryIds = ids[first:]
+    for dx in (-1, 0, 1):
+        # The 3 cells of a column are one range of the sorted boxes
+        lo = starts[queryIds + (dx * span - 1)]
+        counts = starts[queryIds + (dx * span + 2)] - lo
+        rows = np.repeat(queries, counts)
+        cols = order[_expand_ranges(lo, counts)]
+        hit = ((cols < rows) &
+               (minX[rows] < maxX[cols]) & (minX[cols] < maxX[rows]) &
+               (minY[rows] < maxY[cols]) & (minY[cols] < maxY[rows]))
+        overlapped[rows[hit]] = True
+    return overlapped[first:]
+
+
+def place_labels(rects, xDirs, yDirs, offsets, placed=None):
+    """
+    Place screen space labels so they don't overlap. `rects` are (N, 4)
+    boxes (minX, minY, maxX, maxY), `xDirs` and `yDirs` the (N, 2) screen
+    spans of each card's axes, and `offsets` the (K, 2) candidate positions
+    in card widths and heights, in order of preference. `placed` are boxes
+    of labels placed before, which the new labels avoid too.
+
+    Labels are placed in one round per candidate. Each round places the
+    remaining labels whose candidate overlaps neither the labels placed so
+    far nor the same candidate of remaining labels before them. Returns the
+    candidate index of each label, -1 where no candidate was free.
+    """
+    import numpy as np
+
+    rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+    xDirs = np.asarray(xDirs, dtype=np.float64).reshape(-1, 2)
+    yDirs = np.asarray(yDirs, dtype=np.float64).reshape(-1, 2)
+    bounds = [np.ascontiguousarray(rects[:, axis]) for axis in range(4)]
+
+    chosen = np.full(len(rects), -1, dtype=np.int64)
+    if placed is None:
+        placed = [np.empty(0)] * 4
+    else:
+        placed = list(np.asarray(placed, dtype=np.float64).reshape(-1, 4).T)
+    remaining = np.arange(len(rects))
+    for idx, (cardsX, cardsY) in enumerate(offsets):
+        if not remaining.size:
+            break
+        offsetX = cardsX * xDirs[remaining, 0] + cardsY * yDirs[remaining, 0]
+        offsetY = cardsX * xDirs[remaining, 1] + cardsY * yDirs[remaining, 1]
+        candidates = (bounds[0][remaining] + offsetX,
+                      bounds[1][remaining] + offsetY,
+                      bounds[2][remaining] + offsetX,
+                      bounds[3][remaining] + offsetY)
+
+        blocked = _overlaps_earlier(
+            *(np.concatenate(pair) for pair in zip(placed, candidates)),
+            first=len(placed[0]))
+        free = ~blocked
+        chosen[remaining[free]] = idx
+        placed = [np.concatenate((bound, candidate[free]))
+                  for bound, candidate in zip(placed, candidates)]
+        remaining = remaining[blocked]
+
+    return chosen
+
+
+# ----------------------------------------------------------
+# Units
+# ----------------------------------------------------------
+
+# Note: one Blender Unit (BU) is 1m
+INCH_TO_CM = 2.54
+INCHES_PER_FEET = 12
+INCHES_PER_MILE = 5280 * INCHES_PER_FEET
+THOU_PER_INCH = 1000
+
+# Conversion factor from Blender Units to Inches / Feet
+BU_TO_INCHES = 100.0 / INCH_TO_CM
+BU_TO_FEET = 100.0 / (INCH_TO_CM * INCHES_PER_FEET)
+
+
+class UnitFormatter:
+    """
+    Formats lengths, areas and angles from a snapshot of the scene unit
+    settings. Results are memoized on the value rounded to display
+    precision, so unchanged dimensions don't format their text every frame.
+    """
+
+    CACHE_SIZE = 4096
+
+    def __init__(
+            self, system: str = 'METRIC', length_unit: str = 'METERS',
+            separate_units: bool = False, scale_length: float = 1.0,
+            system_rotation: str = 'DEGREES', hide_units: bool = False,
+            use_unit_scale: bool = False, metric_precision: int = 2,
+            imperial_precision: int = 64, angle_precision: int = 0):
+        self.system = system
+        self.length_unit = length_unit
+        self.separate_units = separate_units
+        self.scale_length = scale_length
+        self.system_rotation = system_rotation
+        self.hide_units = hide_units
+        self.use_unit_scale = use_unit_scale
+        self.metric_precision = metric_precision
+        self.imperial_precision = imperial_precision
+        self.angle_precision = angle_precision
+
+        self.settings = (
+            system, length_unit, separate_units, scale_length,
+            system_rotation, hide_units, use_unit_scale, metric_precision,
+            imperial_precision, angle_precision)
+
+        # Lengths and areas formatted by our own code (rather than
+        # `bpy.utils.units.to_string`) can be keyed on their rounded value
+        self._own_metric = (
+            system == 'METRIC' and not separate_units and
+            length_unit != 'ADAPTIVE')
+        self._own_imperial = (
+            system == 'IMPERIAL' and length_unit in ('INCHES', 'FEET'))
+
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def to_string(*args, **kwargs) -> str:
+        """
+        Format with Blender's unit system (`bpy.utils.units.to_string`),
+        for the units the formatter doesn't handle itself
+        """
+        return _builtin_unit_string(*args, **kwargs)
+
+    def format(self, value: float, kind: str = 'LENGTH') -> str:
+        """
+        Format value for display
+
+        :param value: length in BU, area in square BU or angle in radians
+        :param type: float
+        :param kind: one of 'LENGTH', 'AREA' or 'ANGLE'
+        :param type: str
+        :returns: formatted string
+        :return type: string
+        """
+        key = (kind, math.copysign(1.0, value), self._display_value(value, kind))
+        cache = self._cache
+        text = cache.get(key)
+        if text is not None:
+            cache.move_to_end(key)
+            self.hits += 1
+            return text
+
+        self.misses += 1
+        if kind == 'LENGTH':
+            text = self.format_length(value)
+        elif kind == 'AREA':
+            text = self.format_area(value)
+        else:
+            text = self.format_angle(value)
+
+        cache[key] = text
+        if len(cache) > self.CACHE_SIZE:
+            cache.popitem(last=False)
+        return text
+
+    def format_array(self, values, kind: str = 'LENGTH') -> list:
+        """
+        Format a sequence of values in one pass, see `format_distances`
+        """
+        import numpy as np
+
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values) == 0:
+            return []
+
+        if kind == 'LENGTH' and self._own_imperial:
+            if self.use_unit_scale:
+                values = values * self.scale_length
+            # Round to 1/n'th inch in bulk, only distinct results are formatted
+            keys = np.rint(values * BU_TO_INCHES * self.imperial_precision)
+            unique, inverse = np.unique(
+                keys.astype(np.int64), return_inverse=True)
+            texts = _format_fractions(
+                unique, self.imperial_precision, self.length_unit == 'FEET')
+        elif kind in ('LENGTH', 'AREA') and self._own_metric:
+            return self._format_metric_array(values, kind)
+        else:
+            # Unique on the bit pattern keeps -0.0 apart from 0.0
+            unique, inverse = np.unique(
+                values.view(np.int64), return_inverse=True)
+            texts = [self.format(value, kind)
+                     for value in unique.view(np.float64).tolist()]
+
+        return [texts[i] for i in inverse.tolist()]
+
+    def _format_metric_array(self, values, kind: str) -> list:
+        """
+        (Internal) Format metric lengths or areas, scaled and rounded to
+        display precision in bulk
+        """
+        import numpy as np
+
+        power = 1 if kind == 'LENGTH' else 2
+        scaled = values
+        if kind == 'LENGTH' and self.use_unit_scale:
+            scaled = values * self.scale_length
+        precision = self.metric_precision
+        shifted = _metric_scale(scaled, self.length_unit, power) * 10.0 ** precision
+        rounded = np.rint(shifted)
+        # Near a tie the product may round the other way than the string
+        # formatting of the value, so those are formatted one by one
+        ties = np.abs(np.abs(shifted - rounded) - 0.5) < 1e-6
+        rounded /= 10.0 ** precision
+
+        # Unique on the bit pattern keeps -0.0 apart from 0.0
+        unique, inverse = np.unique(
+            rounded.view(np.int64), return_inverse=True)
+        unit = '' if self.hide_units else ' {}{}'.format(
+            METRIC_UNIT_NAMES.get(self.length_unit, 'm'), '²' if power == 2 else '')
+        texts = ['{:.{}f}{}'.format(value, precision, unit)
+                 for value in unique.view(np.float64).tolist()]
+
+        result = [texts[i] for i in inverse.tolist()]
+        for idx in np.flatnonzero(ties).tolist():
+            result[idx] = self.format(float(values[idx]), kind)
+        return result
+
+    def _display_value(self, value: float, kind: str):
+        """
+        (Internal) The value as it will be displayed, rounded to display
+        precision. Values with the same display value format the same.
+        """
+        if kind == 'LENGTH':
+            if self.use_unit_scale:
+                value *= self.scale_length
+            if self._own_metric:
+                return round(_metric_scale(value, self.length_unit, 1),
+                             self.metric_precision)
+            if self._own_imperial:
+                return round(value * BU_TO_INCHES * self.imperial_precision)
+        elif kind == 'AREA':
+            if self._own_metric:
+                return round(_metric_scale(value, self.length_unit, 2),
+                             self.metric_precision)
+            if self.system == 'IMPERIAL':
+                return round(value * 1550 / 143.999, self.metric_precision)
+        elif kind == 'ANGLE':
+            if self.system_rotation == 'DEGREES':
+                return round(math.degrees(value), self.angle_precision)
+            return round(value, self.angle_precision)
+        return value
+
+    def format_length(self, distance: float) -> str:
+        """ Format a distance (length) in BU / meters, without caching """
+        separate_units = self.separate_units
+        if self.use_unit_scale:
+            distance *= self.scale_length
+        if self.system == 'METRIC':
+            precision = self.metric_precision
+            if self._own_metric:
+                return _format_metric_length(
+                    distance, precision, self.length_unit, self.hide_units)
+            # If unit_length is 'Adaptive' or `separate_units` is True, use
+            # Blender built-in which means units are always shown (regardless
+            # of `hide_units`)
+            return self.to_string(
+                'METRIC', 'LENGTH', distance, precision=precision,
+                split_unit=separate_units, compatible_unit=False)
+
+        elif self.system == 'IMPERIAL':
+            if not self.length_unit == 'ADAPTIVE':
+                return _format_imperial_length(
+                    distance, self.imperial_precision, self.length_unit,
+                    self.to_string)
+            return self.to_string(
+                'IMPERIAL', 'LENGTH', distance, split_unit=separate_units,
+                compatible_unit=False)
+
+        return self.to_string(
+            'NONE', 'LENGTH', distance, split_unit=separate_units,
+            compatible_unit=False)
+
+    def format_area(self, area: float) -> str:
+        """ Format an area in square BU / meters, without caching """
+        separate_units = self.separate_units
+        if self.system == 'METRIC':
+            precision = self.metric_precision
+            if self._own_metric:
+                return _format_metric_area(
+                    area, precision, self.length_unit, self.hide_units)
+            # If unit_length is 'Adaptive' or `separate_units` is True, use
+            # Blender built-in which means units are always shown (regardless
+            # of `hide_units`)
+            return self.to_string(
+                'METRIC', 'AREA', area, precision=precision,
+                split_unit=separate_units, compatible_unit=False)
+        elif self.system == 'IMPERIAL':
+            return _format_imperial_area(area, self.metric_precision)
+
+        return self.to_string(
+            'NONE', 'LENGTH', area, split_unit=separate_units,
+            compatible_unit=False)
+
+    def format_angle(self, angle: float) -> str:
+        """ Format an angle in radians, without caching """
+        precision = self.angle_precision
+        if self.system_rotation == 'DEGREES':
+            return "{:.{}f}{}".format(
+                math.degrees(angle), precision, '' if self.hide_units else '°')
+        elif self.system_rotation == 'RADIANS':
+            return "{:.{}f}{}".format(
+                angle, precision, '' if self.hide_units else ' rad')
+
+
+def _builtin_unit_string(*args, **kwargs) -> str:
+    """ (Internal) Stand-in for `bpy.utils.units.to_string` outside Blender """
+    raise NotImplementedError(
+        "Adaptive and separate units are formatted by Blender")
+
+
+# Symbols of the metric units, meters otherwise
+METRIC_UNIT_NAMES = {
+    'CENTIMETERS': 'cm',
+    'MILLIMETERS': 'mm',
+    'MICROMETERS': 'µm',
+    'KILOMETERS': 'km',
+}
+
+
+def _metric_scale(value: float, unit_length: str, power: int) -> float:
+    """
+    (Internal) Convert a value in BU/meters (power 1) or square BU/meters
+    (power 2) to unit_length, the same way the metric formatters do
+    """
+    if unit_length == 'CENTIMETERS':
+        value = value * 100 ** power
+    elif unit_length == 'MILLIMETERS':
+        value = value * 1000 ** power
+    elif unit_length == 'MICROMETERS':
+        value = value * 1000000 ** power
+    elif unit_length == 'KILOMETERS':
+        value = value / float(1000 ** power)
+    return value
+
+
+def _format_metric_length(
+        value: float, precision: int, unit_length: str = 'METERS',
+        hide_units: bool = False) -> str:
+    """
+    (Internal) Format a value in BU/meters as a string
+    """
+    if unit_length == 'CENTIMETERS':
+        value *= 100
+        unit = " cm"
+    elif unit_length == 'MILLIMETERS':
+        value *= 1000
+        unit = " mm"
+    elif unit_length == 'MICROMETERS':
+        value *= 1000000
+        unit = " µm"
+    elif unit_length == 'KILOMETERS':
+        value = value / float(1000)
+        unit = " km"
+    else:
+        unit = " m"
+    return "{:.{}f}{}".format(value, precision, "" if hide_units else unit)
+
+
+def _format_metric_area(
+        value: float, precision: int, unit_length: str = 'METERS',
+        hide_units: bool = False) -> str:
+    """
+    (Internal) Format a value in square BU/meters as a string
+    """
+    if unit_length == 'CENTIMETERS':
+        value *= 100 ** 2
+        unit = " cm²"
+    elif unit_length == 'MILLIMETERS':
+        value *= 1000 ** 2
+        unit = " mm²"
+    elif unit_length == 'MICROMETERS':
+        value *= 1000000 ** 2
+        unit = " µm²"
+    elif unit_length == 'KILOMETERS':
+        value = value / float(1000 ** 2)
+        unit = " km²"
+    else:
+        unit = " m²"
+    return "{:.{}f}{}".format(value, precision, "" if hide_units else unit)
+
+
+def _format_imperial_length(
+        value, precision, unit_length='INCH', to_string=None) -> str:
+    """
+    (Internal) Format a length as a string using imperial units
+
+    :param value: length in BU/meters
+    :param type: float
+    :param value: precision expressed as 1/n'th inch
+    :param type: int
+    :param unit_length: one of 'INCHES', 'FEET', 'MILES' or 'THOU'
+    :param type: str
+    :param to_string: Blender's unit formatter, for other units
+    """
+
+    if unit_length in ('INCHES', 'FEET'):
+        value *= BU_TO_INCHES
+        (inches, num, denom) = _inches_to_fraction(value, precision)
+        if unit_length == 'FEET':
+            (feet, inches) = divmod(inches, INCHES_PER_FEET)
+        else:
+            feet = 0
+        if feet > 0 and num > 0:
+            return "{}′ {}-{}⁄{}″".format(feet, inches, num, denom)
+        elif feet > 0:
+            return "{}′ {}″".format(feet, inches)
+        elif num > 0:
+            return "{}-{}⁄{}″".format(inches, num, denom)
+        else:
+            return "{}″".format(inches)
+    elif unit_length == 'MILES':
+        pass
+    elif unit_length == 'THOU':
+        pass
+    # Adaptive
+    return (to_string or _builtin_unit_string)(
+        'IMPERIAL', 'LENGTH', value, precision=precision,
+        split_unit=False, compatible_unit=False)
+
+
+def _format_imperial_area(value, precision, unit_length='INCH', hide_units=False) -> str:
+    """
+    (Internal) Format an area as a string using imperial units
+
+    :param value: area in BU/meters
+    :param type: float
+    :param value: precision expressed as 1/n'th inch
+    :param type: int
+    :param unit_length: one of 'INCHES', 'FEET', 'MILES' or 'THOU'
+    :param type: str
+    """
+
+    areaToInches = 1550
+    inPerFoot = 143.999
+    unit = " ft²"
+    value *= areaToInches
+    value /= inPerFoot
+
+    return "{:.{}f}{}".format(value, precision, "" if hide_units else unit)
+
+def _inches_to_fraction(inches: float, precision: int) -> Tuple[int, int, int]:
+    """
+    (Internal) Returns the integer and fractional part as a tuple of integer
+    part, numerator and denominator (all integers), rounded to precision
+    (expressed as 1/n'th of an inch).
+    """
+    inches_ = round(inches * precision) / float(precision)
+    frac, int_ = math.modf(inches_)
+    num, denom = frac.as_integer_ratio()
+    return (int(int_), num, denom)
+
+
+def _format_fractions(keys, precision: int, use_feet: bool) -> list:
+    """
+    (Internal) Bulk version of `_format_imperial_length` for lengths already
+    rounded to integer multiples of 1/precision inch
+    """
+    import numpy as np
+
+    # Same split as `_inches_to_fraction`: truncate towards zero and reduce
+    # the remaining fraction
+    whole = np.sign(keys) * (np.abs(keys) // precision)
+    rem = keys - whole * precision
+    divisor = np.gcd(rem, precision)
+    nums = rem // divisor
+    denoms = precision // divisor
+    if use_feet:
+        feet, inches = np.divmod(whole, INCHES_PER_FEET)
+    else:
+        feet, inches = np.zeros_like(whole), whole
+
+    texts = []
+    for feet, inches, num, denom in zip(
+            feet.tolist(), inches.tolist(), nums.tolist(), denoms.tolist()):
+        if feet > 0 and num > 0:
+            texts.append("{}′ {}-{}⁄{}″".format(feet, inches, num, denom))
+        elif feet > 0:
+            texts.append("{}′ {}″".format(feet, inches))
+        elif num > 0:
+            texts.append("{}-{}⁄{}″".format(inches, num, denom))
+        else:
+            texts.append("{}″".format(inches))
+    return texts
+
+
+# ----------------------------------------------------------
+# Tests
+# ----------------------------------------------------------
+
+class ImperialConversionTests(unittest.TestCase):
+    """ Test conversion from BU to imperial units """
+
+    PRECISION = 5
+
+    def test_inches(self):
+        self.assertAlmostEqual(2.3 * BU_TO_INCHES, 90.55118, self.PRECISION)
+
+    def test_array_parity(self):
+        rnd = random.Random(2)
+        values = [rnd.uniform(-20, 20) for i in range(2000)]
+        values.extend((2.3, -2.3, 0.0, -0.0, 1e-3, 0.5 / BU_TO_INCHES / 64))
+        for unit in ('INCHES', 'FEET'):
+            formatter = UnitFormatter('IMPERIAL', unit, imperial_precision=64)
+            self.assertEqual(formatter.format_array(values),
+                             [formatter.format(value) for value in values])
+
+    def test_fraction_bulk(self):
+        import numpy as np
+
+        keys = np.arange(-200, 200, dtype=np.int64)
+        for precision in (1, 2, 16, 64):
+            for key, text in zip(keys, _format_fractions(keys, precision, False)):
+                (inches, num, denom) = _inches_to_fraction(
+                    key / float(precision), precision)
+                if num > 0:
+                    expected = "{}-{}⁄{}″".format(inches, num, denom)
+                else:
+                    expected = "{}″".format(inches)
+                self.assertEqual(text, expected)
+
+
+class FormatImperialTests(unittest.TestCase):
+    """ Test formatting of imperial units """
+
+    def test_imperial_length_inch(self):
+        str = _format_imperial_length(2.3 / BU_TO_INCHES, 64, 'INCHES')
+        self.assertEqual(str, "2-19⁄64″")
+
+        str = _format_imperial_length(2.3 / BU_TO_INCHES, 32, 'INCHES')
+        self.assertEqual(str, "2-5⁄16″")
+
+        str = _format_imperial_length(2.3 / BU_TO_INCHES, 8, 'INCHES')
+        self.assertEqual(str, "2-1⁄4″")
+
+        str = _format_imperial_length(2.3 / BU_TO_INCHES, 2, 'INCHES')
+        self.assertEqual(str, "2-1⁄2″")
+
+        str = _format_imperial_length(2.3 / BU_TO_INCHES, 1, 'INCHES')
+        self.assertEqual(str, "2″")
+
+    def test_imperial_length_bulk(self):
+        rnd = random.Random(1)
+        values = [rnd.uniform(-50, 50) for i in range(2000)]
+        values.extend((0.0, -0.0, 1 / BU_TO_INCHES, 12 / BU_TO_INCHES))
+        for unit in ('INCHES', 'FEET'):
+            for precision in (1, 8, 64):
+                formatter = UnitFormatter(
+                    'IMPERIAL', unit, imperial_precision=precision)
+                self.assertEqual(
+                    formatter.format_array(values),
+                    [_format_imperial_length(v, precision, unit)
+                     for v in values])
+
+
+class UnitFormatterTests(unittest.TestCase):
+    """ Test the memoized formatter against the uncached formatting """
+
+    SAMPLES = 2000
+
+    def sample_values(self, precision):
+        rnd = random.Random(precision)
+        values = [rnd.uniform(-1000, 1000) for i in range(self.SAMPLES)]
+        # Values close to rounding boundaries, and signed zeros
+        step = 10 ** -precision
+        for value in values[:self.SAMPLES // 4]:
+            edge = (round(value / step) + 0.5) * step
+            values.extend((edge, edge - 1e-12, edge + 1e-12))
+        values.extend((0.0, -0.0, step / 4, -step / 4))
+        return values
+
+    def assert_parity(self, formatter, kind, reference, values):
+        # Twice, the second pass is served from the cache
+        for i in range(2):
+            for value in values:
+                self.assertEqual(
+                    formatter.format(value, kind), reference(value),
+                    msg="{} {!r}".format(kind, value))
+
+    def test_metric_length(self):
+        for unit in ('METERS', 'CENTIMETERS', 'MILLIMETERS', 'KILOMETERS'):
+            for precision in (0, 2, 5):
+                formatter = UnitFormatter(
+                    'METRIC', unit, metric_precision=precision,
+                    use_unit_scale=True, scale_length=0.3)
+                self.assert_parity(
+                    formatter, 'LENGTH',
+                    lambda v: _format_metric_length(
+                        v * 0.3, precision, unit),
+                    self.sample_values(precision))
+
+    def test_metric_area(self):
+        for unit in ('METERS', 'CENTIMETERS', 'KILOMETERS'):
+            formatter = UnitFormatter(
+                'METRIC', unit, metric_precision=3, hide_units=True)
+            self.assert_parity(
+                formatter, 'AREA',
+                lambda v: _format_metric_area(v, 3, unit, True),
+                self.sample_values(3))
+
+    def test_imperial(self):
+        for unit in ('INCHES', 'FEET'):
+            for precision in (1, 16, 64):
+                formatter = UnitFormatter(
+                    'IMPERIAL', unit, imperial_precision=precision)
+                self.assert_parity(
+                    formatter, 'LENGTH',
+                    lambda v: _format_imperial_length(v, precision, unit),
+                    self.sample_values(2))
+        formatter = UnitFormatter('IMPERIAL', 'FEET', metric_precision=1)
+        self.assert_parity(
+            formatter, 'AREA', lambda v: _format_imperial_area(v, 1),
+            self.sample_values(1))
+
+    def test_angle(self):
+        for rotation in ('DEGREES', 'RADIANS'):
+            formatter = UnitFormatter(
+                system_rotation=rotation, angle_precision=1)
+            self.assert_parity(
+                formatter, 'ANGLE', formatter.format_angle,
+                self.sample_values(1))
+
+    def test_metric_bulk(self):
+        import numpy as np
+
+        for precision in (0, 2, 5):
+            values = self.sample_values(precision)
+            for unit in ('METERS', 'CENTIMETERS', 'MILLIMETERS', 'KILOMETERS'):
+                formatter = UnitFormatter('METRIC', unit, metric_precision=precision)
+                self.assertEqual(
+                    formatter.format_array(np.array(values)),
+                    [_format_metric_length(v, precision, unit) for v in values])
+                self.assertEqual(
+                    formatter.format_array(values, 'AREA'),
+                    [_format_metric_area(v, precision, unit) for v in values])
+
+        formatter = UnitFormatter(
+            'METRIC', 'METERS', scale_length=2.5, use_unit_scale=True,
+            hide_units=True)
+        self.assertEqual(formatter.format_array(values),
+                         [formatter.format(value) for value in values])
+
+    def test_cache_size(self):
+        formatter = UnitFormatter('IMPERIAL', 'INCHES')
+        for value in range(formatter.CACHE_SIZE * 2):
+            formatter.format(float(value))
+        self.assertEqual(len(formatter._cache), formatter.CACHE_SIZE)
+
+
+class UnitFormatterCacheTests(unittest.TestCase):
+    """ Static dimensions only format their text on the first frame """
+
+    DIMENSIONS = 1000
+    FRAMES = 5
+
+    def test_misses(self):
+        rnd = random.Random(0)
+        values = [rnd.uniform(0, 50) for i in range(self.DIMENSIONS)]
+        for unit in ('FEET', 'INCHES'):
+            formatter = UnitFormatter('IMPERIAL', unit, imperial_precision=16)
+            texts = [formatter.format(value) for value in values]
+            misses = formatter.misses
+            self.assertLessEqual(misses, self.DIMENSIONS)
+
+            for frame in range(1, self.FRAMES):
+                self.assertEqual([formatter.format(value) for value in values], texts)
+            self.assertEqual(formatter.misses, misses)
+            self.assertEqual(formatter.hits + formatter.misses,
+                             self.DIMENSIONS * self.FRAMES)
+
+
+class GeometryKernelTests(unittest.TestCase):
+    """ Test the geometry kernels with plain tuples """
+
+    def assertPointAlmostEqual(self, point, expected):
+        self.assertEqual(len(point), len(expected))
+        for value, expectedValue in zip(point, expected):
+            self.assertAlmostEqual(value, expectedValue)
+
+    def test_dom_axis(self):
+        self.assertEqual(get_dom_axis((3, -1, 2)), 0)
+        self.assertEqual(get_dom_axis((0, -4, 2)), 1)
+        self.assertEqual(get_dom_axis((0, 1, -2)), 2)
+        # No single largest axis
+        self.assertEqual(get_dom_axis((1, 1, 0)), 0)
+
+    def test_sort_points(self):
+        self.assertEqual(sortPoints((0, 0, 0), (0, 2, 1)), ((0, 2, 1), (0, 0, 0)))
+        self.assertEqual(sortPoints((5, 0, 0), (1, 1, 1)), ((5, 0, 0), (1, 1, 1)))
+
+    def test_interpolate_point(self):
+        self.assertPointAlmostEqual(
+            interpolate_point((0, 0, 0), (2, 0, 0), 0.5), (0.5, 0, 0))
+        # Past the end of the segment
+        self.assertPointAlmostEqual(
+            interpolate_point((1, 1, 1), (1, 3, 1), 4.0), (1, 5, 1))
+        self.assertPointAlmostEqual(
+            interpolate_point((1, 1, 1), (1, 1, 1), 4.0), (1, 1, 1))
+
+    def test_arc_data(self):
+        angle, length = get_arc_data((1, 0, 0), (0, 0, 0), (0, 2, 0), (-1, 0, 0))
+        self.assertAlmostEqual(angle, math.pi)
+        self.assertAlmostEqual(length, 2 * math.pi)
+        with self.assertRaises(ValueError):
+            get_arc_data((0, 0, 0), (0, 0, 0), (0, 1, 0), (1, 0, 0))
+
+    def test_axis_aligned_bounds(self):
+        self.assertEqual(
+            get_axis_aligned_bounds([(0, 1, 2), (-1, 4, 0.5)]),
+            [0.0, -1.0, 4.0, 1.0, 2.0, 0.5])
+        self.assertEqual(get_axis_aligned_bounds([]), [None] * 6)
+
+    def test_text_card(self):
+        # 803 pixels at 803 dpi and font size 803 give a 1 unit card
+        card = text_card_coords(803, 803, 803, 803, 1.0)
+        expected = [(-0.5, 0, 0), (-0.5, 1, 0), (0.5, 1, 0), (0.5, 0, 0)]
+        for corner, expectedCorner in zip(card, expected):
+            self.assertPointAlmostEqual(corner, expectedCorner)
+
+        card = text_card_coords(
+            803, 803, 803, 803, 1.0, textAlignment='L', textPosition='B',
+            basePoint=(1, 1, 1), cardIdx=1)
+        self.assertPointAlmostEqual(card[0], (1, -1, 1))
+        self.assertPointAlmostEqual(card[2], (2, 0, 1))
+
+        # A quarter turn around Z
+        card = text_card_coords(
+            803, 803, 803, 803, 1.0, rotation=(0, 0, math.pi / 2),
+            basePoint=(1, 0, 0))
+        self.assertPointAlmostEqual(card[0], (1, -0.5, 0))
+        self.assertPointAlmostEqual(card[1], (0, -0.5, 0))
+
+    def test_cap_offset(self):
+        self.assertPointAlmostEqual(
+            cap_offset((0, 3, 0), 1000, math.pi / 2, 2.0), (0, 2, 0))
+        self.assertPointAlmostEqual(
+            cap_offset((0, 0, 0), 1000, math.pi / 2, 2.0), (0, 0, 0))
+
+
+class PlaceLabelsTests(unittest.TestCase):
+
+    OFFSETS = ((0, 0), (0, 1), (0, -1), (-1, 0), (1, 0))
+
+    def test_stack(self):
+        rects = [(10, 10, 30, 15)] * 4
+        chosen = place_labels(rects, [(20, 0)] * 4, [(0, 5)] * 4, self.OFFSETS)
+        self.assertEqual(chosen.tolist(), [0, 1, 2, 3])
+
+        # Labels apart stay in place
+        rects = [(0, 0, 20, 5), (100, 0, 120, 5), (20, 0, 40, 5)]
+        chosen = place_labels(rects, [(20, 0)] * 3, [(0, 5)] * 3, self.OFFSETS)
+        self.assertEqual(chosen.tolist(), [0, 0, 0])
+
+        # Boxes placed before take space too
+        chosen = place_labels([(0, 0, 20, 5)], [(20, 0)], [(0, 5)],
+                              self.OFFSETS, placed=[(0, 0, 20, 5)])
+        self.assertEqual(chosen.tolist(), [1])
+
+    def test_dense(self):
+        import numpy as np
+
+        rnd = np.random.default_rng(4)
+        count = 2000
+        corners = rnd.uniform(0, 500, (count, 2))
+        sizes = rnd.uniform(5, 40, (count, 2))
+        rects = np.concatenate((corners, corners + sizes), axis=1)
+        xDirs = np.stack((sizes[:, 0], np.zeros(count)), axis=1)
+        yDirs = np.stack((np.zeros(count), sizes[:, 1]), axis=1)
+        chosen = place_labels(rects, xDirs, yDirs, self.OFFSETS)
+
+        # Placed labels don't overlap each other
+        offsets = np.array(self.OFFSETS)[chosen[chosen >= 0]]
+        placed = rects[chosen >= 0] + np.tile(
+            offsets[:, :1] * xDirs[chosen >= 0] +
+            offsets[:, 1:] * yDirs[chosen >= 0], 2)
+        overlaps = ((placed[:, None, 0] < placed[None, :, 2]) &
+                    (placed[None, :, 0] < placed[:, None, 2]) &
+                    (placed[:, None, 1] < placed[None, :, 3]) &
+                    (placed[None, :, 1] < placed[:, None, 3]))
+        np.fill_diagonal(overlaps, False)
+        self.assertEqual(int(overlaps.sum()), 0)
+        self.assertEqual(chosen[0], 0)
+        self.assertGreater((chosen > 0).sum(), 0)
+        self.assertGreater((chosen < 0).sum(), 0)
+
+
+class DepthTesterTests(unittest.TestCase):
+    """ Depth test against a 10 x 10 pixel floor, seen from above """
+
+    SIZE = 10
+
+    def project(self, point):
+        # Orthographic camera at z = 10 looking down, covering (0, 0)-(1, 1)
+        return (point[0], point[1], 10 - point[2])
+
+    def depth_tester(self):
+        # 0.099 maps to a distance of 10 between the clip planes
+        return DepthTester(
+            self.project, self.SIZE, self.SIZE, 'ORTHO', 0.1, 100.0,
+            [0.099] * (self.SIZE * self.SIZE))
+
+    def test_camera_depth(self):
+        self.assertAlmostEqual(camera_depth(0.099, 'ORTHO', 0.1, 100), 9.9001)
+        self.assertAlmostEqual(camera_depth(0.0, 'PERSP', 0.1, 100), 0.1)
+        self.assertAlmostEqual(camera_depth(1.0, 'PERSP', 0.1, 100), 100)
+        self.assertEqual(camera_depth(0.5, 'PANO', 0.1, 100), 0.5)
+
+    def test_visible(self):
+        tester = self.depth_tester()
+        self.assertTrue(tester.visible((0.5, 0.5, 1)))
+        self.assertFalse(tester.visible((0.5, 0.5, -1)))
+        # Behind the camera and past the far clip
+        self.assertEqual(tester.visible((0.5, 0.5, 11)), -1)
+        self.assertEqual(tester.visible((0.5, 0.5, -100)), -1)
+        # Outside the buffer reads as the near clip
+        self.assertFalse(tester.visible((0.5, 20, 1)))
+
+    def test_culled(self):
+        tester = self.depth_tester()
+        self.assertTrue(tester.culled([(0, 0, 11), (0, 0, -100)]))
+        self.assertFalse(tester.culled([(0, 0, 11), (0, 0, 0)]))
+
+    def test_split(self):
+        tester = self.depth_tester()
+        runs = tester.split((0.2, 0.5, 1), (0.8, 0.5, -1), lambda point: point)
+        self.assertEqual([run[0] for run in runs], [True, False])
+        self.assertEqual(runs[0][1], (0.2, 0.5, 1))
+        self.assertEqual(runs[-1][2], (0.8, 0.5, -1))
+        for run, nextRun in zip(runs, runs[1:]):
+            self.assertEqual(run[2], nextRun[1])
+
+        # Lines in a transformed space are split at the same points
+        offset = tester.split(
+            (0.2, 0.5, 2), (0.8, 0.5, 0),
+            lambda point: (point[0], point[1], point[2] - 1))
+        self.assertEqual([run[0] for run in offset], [True, False])
+        self.assertEqual(offset[0][2][0], runs[0][2][0])
+
+    def test_split_short(self):
+        runs = self.depth_tester().split((0.5, 0.5, 1), (0.5, 0.5, 1), lambda point: point)
+        self.assertEqual(runs, [[True, (0.5, 0.5, 1), (0.5, 0.5, 1)]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -27,6 +27,7 @@
 import bpy
 import bmesh
 import math
+import unittest
 
 from bpy.types import PropertyGroup, Panel, Operator, UIList
 from bpy.props import IntProperty, CollectionProperty, FloatVectorProperty, \
@@ -34,7 +35,10 @@ from bpy.props import IntProperty, CollectionProperty, FloatVectorProperty, \
 from mathutils import Vector
 
 from .measureit_arch_baseclass import BaseProp
-from .measureit_arch_utils import get_smart_selected, get_selected_vertex, get_selected_vertex_history
+from .measureit_arch_utils import get_smart_selected, get_selected_vertex, get_selected_vertex_history, \
+    lazy_module
+
+np = lazy_module('numpy')
 
 
 class LineProperties(BaseProp, PropertyGroup):
@@ -221,6 +225,68 @@ class LineContainer(PropertyGroup):
     line_groups: CollectionProperty(type=LineProperties)
 
 
+class EdgeSet(object):
+    """
+    The edges of a line group's 'lineBuffer', a flat list of vertex index
+    pairs, as an (N, 2) array.
+
+    Edges are compared by their (min, max) index pair, so (a, b) and (b, a)
+    are the same edge, and adding or removing many edges is a single set
+    operation rather than a scan of the buffer per edge. The stored pairs
+    keep their order and direction, which chain lines draw in.
+    """
+
+    def __init__(self, pairs=()):
+        self.pairs = np.empty((0, 2), dtype=np.int64)
+        self.add(pairs)
+
+    @classmethod
+    def from_group(cls, lGroup):
+        edgeSet = cls()
+        if 'lineBuffer' in lGroup:
+            edgeSet.pairs = cls.to_pairs(lGroup['lineBuffer'].to_list())
+        return edgeSet
+
+    def store(self, lGroup):
+        """ Write the edges back to `lGroup` as one flat buffer """
+        lGroup['lineBuffer'] = self.pairs.ravel().tolist()
+
+    @staticmethod
+    def to_pairs(indices):
+        """ (N, 2) array of a flat index list, dropping an unpaired index """
+        indices = np.asarray(indices, dtype=np.int64).ravel()
+        return indices[:len(indices) - len(indices) % 2].reshape(-1, 2)
+
+    @staticmethod
+    def keys(pairs):
+        """ One int per edge, equal for both directions of the edge """
+        return (pairs.min(axis=1) << 32) | pairs.max(axis=1)
+
+    def add(self, pairs):
+        """ Add the edges of `pairs` (flat or (N, 2)) that aren't in the set """
+        pairs = self.to_pairs(pairs)
+        keys = self.keys(pairs)
+        keys, first = np.unique(keys, return_index=True)
+        isNew = ~np.isin(keys, self.keys(self.pairs))
+        newPairs = pairs[np.sort(first[isNew])]
+        self.pairs = np.concatenate((self.pairs, newPairs))
+        return len(newPairs)
+
+    def remove(self, pairs):
+        """ Remove the edges of `pairs` (flat or (N, 2)) from the set """
+        keep = ~np.isin(self.keys(self.pairs), self.keys(self.to_pairs(pairs)))
+        removed = len(self.pairs) - np.count_nonzero(keep)
+        self.pairs = self.pairs[keep]
+        return removed
+
+    def __contains__(self, pair):
+        key = self.keys(self.to_pairs(pair))
+        return bool(np.isin(key, self.keys(self.pairs)).any())
+
+    def __len__(self):
+        return len(self.pairs)
+
+
 class AddLineButton(Operator):
     bl_idname = "measureit_arch.addlinebutton"
     bl_label = "Add"
@@ -263,10 +329,7 @@ class AddLineButton(Operator):
                 lGroup.lineColor = sceneProps.default_color
                 lGroup.name = 'Line ' + str(len(lineGen.line_groups))
 
-                mylist = []
-                for item in selectionDict:
-                    mylist.append(item['vert'])
-                lGroup['lineBuffer'] = mylist
+                EdgeSet([item['vert'] for item in selectionDict]).store(lGroup)
                 lineGen.line_num += 1
 
                 # redraw
@@ -596,13 +659,11 @@ class AddToLineGroup(Operator):
                         lineGen = mainobject.LineGenerator
                         lGroup = lineGen.line_groups[self.tag]
 
-                        bufferList = lGroup['lineBuffer'].to_list()
-                        for x in range(0, len(mylist) - 1, 2):
-                            bufferList.append(mylist[x])
-                            bufferList.append(mylist[x + 1])
+                        edgeSet = EdgeSet.from_group(lGroup)
+                        if edgeSet.add(mylist):
+                            edgeSet.store(lGroup)
 
                         # redraw
-                        lGroup['lineBuffer'] = bufferList
                         context.area.tag_redraw()
                     return {'FINISHED'}
 
@@ -738,7 +799,9 @@ class RemoveFromLineGroup(Operator):
                     # get selected
 
                     mainobject = context.object
-                    mylist = get_smart_selected(mainobject)
+                    selectionDict, warningStr = get_smart_selected(
+                        filterObj=mainobject, forceEdges=True)
+                    mylist = [item['vert'] for item in selectionDict]
 
                     if len(mylist) < 2:  # if not selected linked vertex
                         mylist = get_selected_vertex(mainobject)
@@ -747,19 +810,12 @@ class RemoveFromLineGroup(Operator):
 
                         lineGen = mainobject.LineGenerator
                         lGroup = lineGen.line_groups[self.tag]
-                        bufferList = lGroup['lineBuffer'].to_list()
-                        for x in range(0, len(lGroup['lineBuffer']), 2):
-                            pointA = lGroup['lineBuffer'][x]
-                            pointB = lGroup['lineBuffer'][x + 1]
-                            for y in range(0, len(mylist), 2):
-                                if sLineExists(pointA, pointB, mylist[y], mylist[y + 1]):
-                                    # print("checked Pair: (" + str(mylist[y]) +   "," + str(mylist[y+1]) + ")" )
-                                    # print("A:" + str(pointA) + "B:" + str(pointB) )
-                                    del bufferList[x]
-                                    del bufferList[x]
+
+                        edgeSet = EdgeSet.from_group(lGroup)
+                        if edgeSet.remove(mylist):
+                            edgeSet.store(lGroup)
 
                         # redraw
-                        lGroup['lineBuffer'] = bufferList
                         context.area.tag_redraw()
                         return {'FINISHED'}
 
@@ -794,21 +850,25 @@ class RemoveFromLineGroup(Operator):
 #         return {'FINISHED'}
 
 
-def sLineExists(pointA, pointB, a, b):
-    if (pointA == a and pointB == b):
-        return True
-    elif (pointA == b and pointB == a):
-        return True
-    else:
-        return False
-
-
-def lineExists(lGroup, a, b):
-    for x in range(0, len(lGroup['lineBuffer']), 2):
-        pointA = lGroup['lineBuffer'][x]
-        pointB = lGroup['lineBuffer'][x + 1]
-        if (pointA == a and pointB == b):
-            return True
-        elif (pointA == b and pointB == a):
-            return True
-    return False
+class EdgeSetTests(unittest.TestCase):
+
+    def test_add_remove(self):
+        edgeSet = EdgeSet([0, 1, 1, 2, 2, 1, 5, 4])
+        self.assertEqual(edgeSet.pairs.tolist(), [[0, 1], [1, 2], [5, 4]])
+
+        # Both directions of an edge are the same edge
+        self.assertIn((4, 5), edgeSet)
+        self.assertEqual(edgeSet.add([[2, 1], [3, 2], [2, 3]]), 1)
+        self.assertEqual(len(edgeSet), 4)
+
+        # Removing keeps the remaining pairs aligned
+        self.assertEqual(edgeSet.remove([1, 0, 4, 5, 9, 8]), 2)
+        self.assertEqual(edgeSet.pairs.ravel().tolist(), [1, 2, 3, 2])
+
+    def test_bulk(self):
+        count = 100000
+        pairs = np.stack((np.arange(count), np.arange(count) + 1), axis=1)
+        edgeSet = EdgeSet(pairs)
+        self.assertEqual(edgeSet.add(pairs[:, ::-1]), 0)
+        self.assertEqual(edgeSet.remove(pairs[::2]), count // 2)
+        self.assertEqual(edgeSet.pairs[0].tolist(), [1, 2])
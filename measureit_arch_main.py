@@ -25,69 +25,244 @@
 # ----------------------------------------------------------
 import bpy
 import bgl
+import blf
 
 from bpy.types import Panel, Operator, SpaceView3D
+from bpy.props import EnumProperty, StringProperty
+from bpy_extras.io_utils import ExportHelper
 from bpy.app.handlers import persistent
 from mathutils import Vector, Matrix
 
-from .measureit_arch_geometry import clear_batches, update_text, draw3d_loop, preview_dual
-from .measureit_arch_utils import get_view, get_rv3d
+from .measureit_arch_geometry import clear_batches, update_text, draw3d_loop, preview_dual, \
+    bounds_cache, area_cache, symbol_cache, label_solver, cull_state
+from .measureit_arch_utils import get_view, get_rv3d, text_update_queue, gl_state, \
+    render_state, item_index, sidecar_cache, profiler
+
+# Seconds per redraw spent rendering text, the rest waits for the next redraw
+TEXT_UPDATE_BUDGET = 0.008
+
+TEXT_DIM_TYPES = (
+    'alignedDimensions', 'angleDimensions', 'axisDimensions',
+    'boundsDimensions', 'arcDimensions', 'areaDimensions')
 
 
 @persistent
 def load_handler(dummy):
     """ Handler called when a Blender file is loaded """
     ShowHideViewportButton.handle_remove(None, bpy.context)
+    text_update_queue.clear()
+    text_update_queue.request_rescan()
+    label_solver.clear()
+    cull_state.clear()
+    bounds_cache.clear()
+    area_cache.clear()
+    symbol_cache.clear()
+    render_state.clear()
+    item_index.clear()
+    sidecar_cache.clear()
+    convert_legacy_items()
+
+
+def convert_legacy_items():
+    """
+    Update items saved by older versions of MeasureIt_ARCH, and drop custom
+    shapes an annotation is part of. Done on load so drawing doesn't write
+    to the items it draws.
+    """
+    # Text fields each kind of dimension draws, which older versions
+    # added while drawing
+    dimTextFields = (('alignedDimensions', 1), ('axisDimensions', 1),
+                     ('areaDimensions', 1), ('angleDimensions', 1),
+                     ('arcDimensions', 2), ('boundsDimensions', 3))
+
+    for myobj in bpy.data.objects:
+        if myobj.library is not None:
+            continue
+
+        for lineGroup in myobj.LineGenerator.line_groups:
+            if 'singleLine' in lineGroup and 'lineBuffer' not in lineGroup:
+                lineBuffer = []
+                for line in lineGroup['singleLine']:
+                    lineBuffer.append(line['pointA'])
+                    lineBuffer.append(line['pointB'])
+                lineGroup['lineBuffer'] = lineBuffer
+
+        for annotation in myobj.AnnotationGenerator.annotations:
+            if len(annotation.textFields) == 0:
+                annotation.textFields.add()
+
+            textField = annotation.textFields[0]
+            if textField.text == "" and annotation.name == "" and \
+                    annotation.text != "":
+                textField.text = annotation.text
+                annotation.name = annotation.text
+
+            customShape = annotation.customShape
+            if customShape is not None and \
+                    myobj.name in customShape.all_objects:
+                print("Annotations Cannot be a part of its custom shape "
+                      "collection, removed it from {}".format(annotation.name))
+                annotation.customShape = None
+
+        dimGen = myobj.DimensionGenerator
+        for itemType, count in dimTextFields:
+            for dim in getattr(dimGen, itemType):
+                while len(dim.textFields) < count:
+                    dim.textFields.add()
+
+
+@persistent
+def undo_handler(dummy):
+    """ Handler called after undo and redo, which replace the data """
+    bounds_cache.clear()
+    area_cache.clear()
+    symbol_cache.clear()
+    render_state.clear()
+    item_index.clear()
+    cull_state.clear()
+
+
+@persistent
+def frame_change_handler(scene, depsgraph=None):
+    """
+    Handler called after the frame changes, which moves animated objects
+    without a depsgraph update
+    """
+    cull_state.clear()
+    bounds_cache.tag_frame_change(scene)
+
+
+@persistent
+def depsgraph_handler(scene, depsgraph):
+    """ Handler called after the depsgraph is updated """
+    bounds_cache.tag_update(depsgraph)
+    area_cache.tag_update(depsgraph)
+    symbol_cache.tag_update(depsgraph)
+    cull_state.tag_update(depsgraph)
+
+
+# Item collections of each generator, the counter to reset with them and
+# the collections indexing those items, which are cleared but not counted
+GENERATOR_COLLECTIONS = (
+    ('DimensionGenerator', (
+        'alignedDimensions', 'angleDimensions', 'axisDimensions',
+        'boundsDimensions', 'arcDimensions', 'areaDimensions'),
+     'measureit_arch_num', ('wrapper',)),
+    ('AnnotationGenerator', ('annotations',), 'num_annotations', ()),
+    ('LineGenerator', ('line_groups',), 'line_num', ()),
+)
+
+
+def purge_phantom_data():
+    """
+    Clear the MeasureIt_ARCH items of objects that are not in any scene.
+
+    Necessary because the pointer properties on Dimensions and annotations
+    count as an ID user and prevent the object from being removed normally
+
+    :returns: number of items cleared per object name
+    :return type: dict
+    """
+    inScene = set()
+    for scene in bpy.data.scenes:
+        inScene.update(obj.as_pointer() for obj in scene.objects)
+
+    purged = {}
+    for obj in bpy.data.objects:
+        if obj.as_pointer() in inScene or obj.library is not None:
+            continue
+
+        count = 0
+        for genName, collections, counter, indexes in GENERATOR_COLLECTIONS:
+            if genName not in obj:
+                continue
+            generator = getattr(obj, genName)
+            for name in collections:
+                items = getattr(generator, name)
+                count += len(items)
+                items.clear()
+            for name in indexes:
+                getattr(generator, name).clear()
+            setattr(generator, counter, 0)
+
+        if count > 0:
+            purged[obj.name] = count
+    return purged
 
 
 @persistent
 def save_handler(dummy):
     """ Handler called when a Blender file is saved """
+    clear_batches()
+
     # Clear not used measured
-    cleanScene = True
-    if cleanScene:
-        # Check all Scenes for phantom objects
-        # Necessary because the pointer properties on Dimensions and annotations
-        # count as an ID user and prevent the object from being removed normally
-        print("MeasureIt_ARCH: Cleaning Phantom Objects")
-        objlist = []
-        clear_batches()
-        for scene in bpy.data.scenes:
-            for obj in scene.objects:
-                objlist.append(obj.name)
-
-        for obj in bpy.context.blend_data.objects:
-            if obj.name in objlist or obj is None:
-                pass
-            else:
-                print(str(obj.name) + ' Data Removed')
-                if 'DimensionGenerator' in obj:
-                    dimgen = obj.DimensionGenerator
-                    if 'alignedDimensions' in dimgen:
-                        for alignedDim in obj.DimensionGenerator.alignedDimensions:
-                            obj.DimensionGenerator.alignedDimensions.remove(0)
-                            obj.DimensionGenerator.measureit_arch_num = 0
-                    if 'angleDimensions' in dimgen:
-                        for angleDim in obj.DimensionGenerator.angleDimensions:
-                            obj.DimensionGenerator.angleDimensions.remove(0)
-                            obj.DimensionGenerator.measureit_arch_num = 0
-                    if 'axisDimensions' in dimgen:
-                        for axisDim in obj.DimensionGenerator.axisDimensions:
-                            obj.DimensionGenerator.axisDimensions.remove(0)
-                            obj.DimensionGenerator.measureit_arch_num = 0
-                    if 'boundsDimensions' in dimgen:
-                        for boundsDim in obj.DimensionGenerator.boundsDimensions:
-                            obj.DimensionGenerator.boundsDimensions.remove(0)
-                            obj.DimensionGenerator.measureit_arch_num = 0
-                    if 'wrappedDimensions' in dimgen:
-                        for wrapper in obj.DimensionGenerator.wrappedDimensions:
-                            obj.DimensionGenerator.wrappedDimensions.remove(0)
-                if 'AnnotationGenerator' in obj:
-                    for annotation in obj.AnnotationGenerator.annotations:
-                        obj.AnnotationGenerator.annotations.remove(0)
-                        obj.AnnotationGenerator.num_annotations = 0
+    sceneProps = bpy.context.scene.MeasureItArchProps
+    if sceneProps.purge_on_save:
+        purged = purge_phantom_data()
+        for name, count in purged.items():
+            print("MeasureIt_ARCH: {} items of phantom object {} removed".format(count, name))
+
+
+class PurgePhantomDataButton(Operator):
+    """ Clear the MeasureIt_ARCH data of objects that are not in any scene """
+
+    bl_idname = "measureit_arch.purgephantomdata"
+    bl_label = "Purge Phantom Object Data"
+    bl_description = ("Remove the Dimensions, Annotations and Line Groups of objects "
+                      "that are not linked to any scene")
+    bl_category = 'MeasureitArch'
+    bl_options = {'REGISTER', 'UNDO'}
+
+    def execute(self, context):
+        purged = purge_phantom_data()
+        if purged:
+            self.report({'INFO'}, "Removed {} items from {} phantom objects".format(
+                sum(purged.values()), len(purged)))
+        else:
+            self.report({'INFO'}, "No phantom object data found")
+        return {'FINISHED'}
+
+
+class ExportProfileButton(Operator, ExportHelper):
+    """ Save the draw timings as JSON, or as a Chrome trace """
+
+    bl_idname = "measureit_arch.export_profile"
+    bl_label = "Export Profile"
+    bl_description = "Save the timings of the profiled redraws"
+    bl_category = 'MeasureitArch'
+
+    filename_ext = ".json"
+
+    filter_glob: StringProperty(default="*.json", options={'HIDDEN'})
+
+    file_format: EnumProperty(
+        name="Format",
+        items=(('JSON', "Totals", "Calls and time per item type and object"),
+               ('TRACE', "Chrome Trace", "Every call, for chrome://tracing "
+                                         "or Perfetto")),
+        default='JSON')
+
+    def execute(self, context):
+        try:
+            profiler.export(self.filepath, self.file_format == 'TRACE')
+        except OSError as err:
+            self.report({'ERROR'}, "Could not save the profile: {}".format(err))
+            return {'CANCELLED'}
+        return {'FINISHED'}
 
 
+class ResetProfileButton(Operator):
+    """ Forget the draw timings collected so far """
+
+    bl_idname = "measureit_arch.reset_profile"
+    bl_label = "Reset Profile"
+    bl_description = "Forget the timings of the profiled redraws"
+    bl_category = 'MeasureitArch'
+
+    def execute(self, context):
+        profiler.reset()
+        return {'FINISHED'}
+
 
 # Rough Attempts to add a m-ARCH tab to the properties panel navigation bar
 # Not solved yet (not entirely sure its possible), but kept for future reference.
@@ -279,12 +454,30 @@ class SCENE_PT_MARCH_Settings(Panel):
         col.prop(sceneProps, 'hide_linework')
         col.prop(sceneProps, "eval_mods")
         col.prop(sceneProps, "use_text_autoplacement")
+        col.prop(sceneProps, "use_label_solver")
+        col.prop(sceneProps, "use_line_lod")
+        col.prop(sceneProps, "use_disk_cache")
+        col.prop(sceneProps, "use_culling")
+        if sceneProps.use_culling:
+            col.prop(sceneProps, "cull_min_pixels")
         col.prop(sceneProps, 'default_resolution', text="Default Resolution")
         col.prop(sceneProps, 'keep_freestyle_svg', text="Keep Freestyle SVG")
+        col.prop(sceneProps, 'purge_on_save')
+        col.operator("measureit_arch.purgephantomdata", icon='ORPHAN_DATA')
 
         col = layout.column(align=True, heading='Debug')
         col.prop(sceneProps, "measureit_arch_debug_text")
         col.prop(sceneProps, "show_text_cards")
+        col.prop(sceneProps, "show_gl_stats")
+        if sceneProps.show_gl_stats:
+            col.label(text="GL Calls: {} ({} skipped)".format(
+                gl_state.frame_calls, gl_state.frame_skipped))
+        col.prop(sceneProps, "show_cull_stats")
+        col.prop(sceneProps, "use_profiler")
+        if sceneProps.use_profiler:
+            row = col.row(align=True)
+            row.operator("measureit_arch.export_profile", icon='EXPORT')
+            row.operator("measureit_arch.reset_profile", icon='FILE_REFRESH')
 
         col = layout.column(align=True, heading='Experimental')
         col.prop(sceneProps, "enable_experimental")
@@ -317,6 +510,7 @@ class ShowHideViewportButton(Operator):
             ShowHideViewportButton._handle3d = SpaceView3D.draw_handler_add(
                 draw_main_3d, (context,), 'WINDOW', 'POST_VIEW')
             context.window_manager.measureit_arch_run_opengl = True
+            text_update_queue.request_rescan()
 
     # ------------------------------------
     # Disable gl drawing removing handler
@@ -373,24 +567,18 @@ def draw_main(context):
     scene = bpy.context.scene
     sceneProps = scene.MeasureItArchProps
 
-    # Display selected or all
-    if not sceneProps.show_all:
-        objlist = context.selected_objects
-    else:
-        objlist = context.view_layer.objects
+    # Scene wide changes (resolution, colors) redraw every text
+    if sceneProps.text_updated:
+        text_update_queue.request_rescan(force=True)
 
     # Enable GL drawing
     bgl.glEnable(bgl.GL_BLEND)
     # ---------------------------------------
-    # Generate all OpenGL calls for measures
+    # Render queued text to textures
     # ---------------------------------------
-    text_update_loop(context, objlist)
-
-    view = get_view()
-    if view is not None and view.titleBlock != "" and not sceneProps.hide_titleblock:
-        titleblockScene = bpy.data.scenes[view.titleBlock]
-        objlist = context.view_layer.objects
-        text_update_loop(context, objlist)
+    if not text_update_loop(context):
+        # Out of time for this frame, finish on the next redraw
+        context.area.tag_redraw()
 
     # Reset Style & Scene Update Flags
     StyleGen = context.scene.StyleGenerator
@@ -404,176 +592,117 @@ def draw_main(context):
     sceneProps = scene.MeasureItArchProps
     sceneProps.text_updated = False
 
+    if sceneProps.show_cull_stats:
+        draw_cull_stats(context)
+
+    if sceneProps.use_profiler:
+        draw_profile_stats(context)
+
+
+def draw_cull_stats(context):
+    """ Debug overlay of what the last redraw culled """
+    lines = (
+        "Culled {} of {} items".format(cull_state.culled, cull_state.items),
+        "Small text: {}  End caps: {}".format(cull_state.texts, cull_state.caps),
+        "Item bounds: {}".format(len(cull_state.bounds)),
+    )
+    fontId = 0
+    blf.size(fontId, 12, 72)
+    blf.color(fontId, 1.0, 1.0, 1.0, 1.0)
+    for idx, line in enumerate(lines):
+        blf.position(fontId, 20, context.region.height - 60 - idx * 16, 0)
+        blf.draw(fontId, line)
+
+
+def draw_profile_stats(context):
+    """ Overlay of the slowest item types and objects, in ms per redraw """
+    frames = max(profiler.frames, 1)
+    lines = ["Profiled redraws: {}".format(profiler.frames)]
+    for heading, byOwner in (("Item types", False), ("Objects", True)):
+        lines.append(heading)
+        for name, calls, total, selfTime in profiler.summary(byOwner)[:8]:
+            lines.append("  {}: {:.2f} ms ({} calls)".format(
+                name, selfTime * 1000 / frames, calls // frames))
+    fontId = 0
+    blf.size(fontId, 12, 72)
+    blf.color(fontId, 1.0, 1.0, 1.0, 1.0)
+    top = context.region.height - 60
+    if context.scene.MeasureItArchProps.show_cull_stats:
+        top -= 60
+    for idx, line in enumerate(lines):
+        blf.position(fontId, 20, top - idx * 16, 0)
+        blf.draw(fontId, line)
+
+
+@profiler.timed('text_update_loop')
+def text_update_loop(context, budget=TEXT_UPDATE_BUDGET):
+    """
+    Render the text of queued items, returns False if the queue could not
+    be emptied within budget (seconds).
+    """
+    if text_update_queue.rescan:
+        queue_all_text(context, force=text_update_queue.rescan_force)
+
+    def update_item(key, item, force):
+        StyleGen = context.scene.StyleGenerator
+        isAnnotation = key[1].startswith('AnnotationGenerator')
+
+        props = item
+        if item.uses_style:
+            if isAnnotation:
+                props = StyleGen.annotations.get(item.style, item)
+            else:
+                props = StyleGen.alignedDimensions.get(item.style, item)
 
-def text_update_loop(context, objlist):
-    scene = bpy.context.scene
-    sceneProps = scene.MeasureItArchProps
-    for myobj in objlist:
-        if not myobj.hide_get():
-            if 'DimensionGenerator' in myobj:
-                DimGen = myobj.DimensionGenerator
-                for alignedDim in DimGen.alignedDimensions:
-
-                    alignedDimProps = alignedDim
-                    if alignedDim.uses_style:
-                        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if alignedDimStyle.name == alignedDim.style:
-                                alignedDimProps = alignedDimStyle
-
-                    update_text(textobj=alignedDim,
-                                props=alignedDimProps, context=context)
-
-                for angleDim in DimGen.angleDimensions:
-                    dimProps = angleDim
-                    if angleDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == angleDim.style:
-                                dimProps = dimStyle
-                    update_text(textobj=angleDim,
-                                props=dimProps, context=context)
-
-                for axisDim in DimGen.axisDimensions:
-                    dimProps = axisDim
-                    if axisDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == axisDim.style:
-                                dimProps = dimStyle
-                    update_text(textobj=axisDim,
-                                props=dimProps, context=context)
-
-                for boundsDim in DimGen.boundsDimensions:
-                    dimProps = boundsDim
-                    if boundsDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == boundsDim.style:
-                                dimProps = dimStyle
-                    update_text(textobj=boundsDim,
-                                props=dimProps, context=context)
-
-                for arcDim in DimGen.arcDimensions:
-                    dimProps = arcDim
-                    if arcDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == arcDim.style:
-                                dimProps = dimStyle
-                    update_text(textobj=arcDim, props=dimProps, context=context)
-
-                for areaDim in DimGen.areaDimensions:
-                    dimProps = areaDim
-                    if areaDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == areaDim.style:
-                                dimProps = dimStyle
-                    update_text(textobj=areaDim,
-                                props=dimProps, context=context)
-
-            if 'AnnotationGenerator' in myobj:
-                annotationGen = myobj.AnnotationGenerator
-                for annotation in annotationGen.annotations:
-                    annotationProps = annotation
-                    if annotation.uses_style:
-                        for annotationStyle in context.scene.StyleGenerator.annotations:
-                            if annotationStyle.name == annotation.style:
-                                annotationProps = annotationStyle
-
-                    fields = []
-                    notesFlag = False
-                    for textField in annotation.textFields:
-                        fields.append(textField)
-                        if textField.autoFillText and textField.textSource == 'NOTES':
-                            notesFlag = True
-
-                    if notesFlag:
-                        view = get_view()
-                        for textField in view.textFields:
-                            fields.append(textField)
-
-                    update_text(
-                        textobj=annotation, props=annotationProps,
-                        context=context, fields=fields)
-
-                # Draw Instanced Objects
-
-
-    deps = bpy.context.view_layer.depsgraph
+        fields = []
+        if isAnnotation:
+            notesFlag = False
+            for textField in item.textFields:
+                fields.append(textField)
+                if textField.autoFillText and textField.textSource == 'NOTES':
+                    notesFlag = True
+
+            view = get_view()
+            if notesFlag and view is not None:
+                fields.extend(view.textFields)
+
+        update_text(textobj=item, props=props, context=context,
+                    fields=fields, force=force)
+
+    return text_update_queue.drain(update_item, budget)
+
+
+def queue_all_text(context, force=False):
+    """
+    Queue every dimension and annotation of the view layer, its instanced
+    objects and the title block scene
+    """
+    text_update_queue.rescan = False
+    text_update_queue.rescan_force = False
+
+    objs = set(context.view_layer.objects)
+
+    deps = context.view_layer.depsgraph
     for obj_int in deps.object_instances:
         if obj_int.is_instance:
-            myobj = obj_int.object
-
-            annotationGen = myobj.AnnotationGenerator
-            for annotation in annotationGen.annotations:
-                annotationProps = annotation
-                if annotation.uses_style:
-                    for annotationStyle in context.scene.StyleGenerator.annotations:
-                        if annotationStyle.name == annotation.style:
-                            annotationProps = annotationStyle
-
-                fields = []
-                notesFlag = False
-                for textField in annotation.textFields:
-                    fields.append(textField)
-                    if textField.autoFillText and textField.textSource == 'NOTES':
-                        notesFlag = True
-
-                if notesFlag:
-                    view = get_view()
-                    for textField in view.textFields:
-                        fields.append(textField)
-
-                update_text(
-                    textobj=annotation, props=annotationProps,
-                    context=context, fields=fields)
-
-
-            if sceneProps.instance_dims:
-
-                DimGen = myobj.DimensionGenerator
-                for alignedDim in DimGen.alignedDimensions:
-
-                    alignedDimProps = alignedDim
-                    if alignedDim.uses_style:
-                        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if alignedDimStyle.name == alignedDim.style:
-                                alignedDimProps = alignedDimStyle
-
-                    update_text(textobj=alignedDim,
-                                props=alignedDimProps, context=context)
-
-                for angleDim in DimGen.angleDimensions:
-                    dimProps = angleDim
-                    if angleDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == angleDim.style:
-                                dimProps = dimStyle
-                    update_text(textobj=angleDim,
-                                props=dimProps, context=context)
-
-                for axisDim in DimGen.axisDimensions:
-                    dimProps = axisDim
-                    if axisDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == axisDim.style:
-                                dimProps = dimStyle
-                    update_text(textobj=axisDim,
-                                props=dimProps, context=context)
-
-                for boundsDim in DimGen.boundsDimensions:
-                    dimProps = boundsDim
-                    if boundsDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == boundsDim.style:
-                                dimProps = dimStyle
-                    update_text(textobj=boundsDim,
-                                props=dimProps, context=context)
-
-                for arcDim in DimGen.arcDimensions:
-                    dimProps = arcDim
-                    if arcDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == arcDim.style:
-                                dimProps = dimStyle
-                    update_text(textobj=arcDim, props=dimProps,
-                                context=context)
+            objs.add(obj_int.object.original)
+
+    view = get_view()
+    if view is not None and view.titleBlock in bpy.data.scenes:
+        objs.update(bpy.data.scenes[view.titleBlock].objects)
+
+    for myobj in objs:
+        if 'DimensionGenerator' in myobj:
+            DimGen = myobj.DimensionGenerator
+            for dimType in TEXT_DIM_TYPES:
+                for idx in range(len(getattr(DimGen, dimType))):
+                    path = 'DimensionGenerator.{}[{}]'.format(dimType, idx)
+                    text_update_queue.push_key((myobj.name, path), force)
+
+        if 'AnnotationGenerator' in myobj:
+            for idx in range(len(myobj.AnnotationGenerator.annotations)):
+                path = 'AnnotationGenerator.annotations[{}]'.format(idx)
+                text_update_queue.push_key((myobj.name, path), force)
 
 
 def draw_main_3d(context):
@@ -588,13 +717,16 @@ def draw_main_3d(context):
         objlist = context.view_layer.objects
 
     sceneProps.source_scene = scene
-    draw3d_loop(context, objlist)
-    #preview_dual(context)
+    profiler.enabled = sceneProps.use_profiler
+    profiler.tick()
+    with gl_state:
+        draw3d_loop(context, objlist)
+        #preview_dual(context)
 
-    # Draw TitleBlock
+        # Draw TitleBlock
 
-    if not sceneProps.hide_titleblock:
-        draw_titleblock(context)
+        if not sceneProps.hide_titleblock:
+            draw_titleblock(context)
     
     scene.ViewGenerator.view_changed = False
 
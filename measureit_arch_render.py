@@ -27,7 +27,6 @@ import bgl
 import bpy
 import gpu
 import os
-import svgwrite
 import xml.etree.ElementTree as ET
 import time
 
@@ -37,15 +36,14 @@ from sys import exc_info
 from datetime import datetime
 
 from . import svg_shaders
-from .measureit_arch_geometry import draw3d_loop, batch_for_shader
+from .measureit_arch_geometry import draw3d_loop, batch_for_shader, gpuShaders
 from .measureit_arch_main import draw_titleblock
-from .measureit_arch_utils import get_view, local_attrs, get_loaded_addons, OpenGL_Settings, Set_Render
+from .measureit_arch_utils import get_view, local_attrs, get_loaded_addons, OpenGL_Settings, Set_Render, gl_state, \
+    lazy_module
 from .measureit_arch_units import BU_TO_INCHES
-from .shaders import Base_Shader_3D, DepthOnlyFrag
 
-
-depthOnlyshader = gpu.types.GPUShader(
-    Base_Shader_3D.vertex_shader, DepthOnlyFrag.fragment_shader)
+# Only needed for vector export, imported on first use
+svgwrite = lazy_module('svgwrite')
 
 
 class RENDER_PT_MeasureitArch_Panel(Panel):
@@ -230,11 +228,12 @@ def render_main(self, context):
                 # -----------------------------
                 # Loop to draw all objects
                 # -----------------------------
-                draw3d_loop(context, objlist)
-                dt = scene.MeasureItArchProps.vector_depthtest
-                scene.MeasureItArchProps.vector_depthtest = False
-                draw_titleblock(context)
-                scene.MeasureItArchProps.vector_depthtest = dt
+                with gl_state:
+                    draw3d_loop(context, objlist)
+                    dt = scene.MeasureItArchProps.vector_depthtest
+                    scene.MeasureItArchProps.vector_depthtest = False
+                    draw_titleblock(context)
+                    scene.MeasureItArchProps.vector_depthtest = dt
 
                 buffer = bgl.Buffer(bgl.GL_BYTE, width * height * 4)
                 bgl.glReadBuffer(bgl.GL_COLOR_ATTACHMENT0)
@@ -326,9 +325,9 @@ def draw_scene(self, context, projection_matrix):
                 for tri in tris:
                     indices.append(tri.vertices)
 
-                batch = batch_for_shader(depthOnlyshader, 'TRIS', {
+                batch = batch_for_shader(gpuShaders.depthOnlyShader, 'TRIS', {
                                         "pos": vertices}, indices=indices)
-                batch.program_set(depthOnlyshader)
+                batch.program_set(gpuShaders.depthOnlyShader)
                 batch.draw()
                 obj_eval.to_mesh_clear()
                 gpu.shader.unbind()
@@ -1,7 +1,10 @@
 import bpy
 import csv
 import os
-import copy
+import random
+import unittest
+
+from types import SimpleNamespace
 
 from bpy.props import (
     CollectionProperty,
@@ -19,8 +22,100 @@ from bpy.types import (
     Collection
 )
 from datetime import datetime
-
-from .measureit_arch_units import format_distance
+from mathutils import Color, Euler, Quaternion, Vector
+
+from .measureit_arch_units import format_distances, refresh_unit_formatter
+from .measureit_arch_utils import DataPathAccessor
+
+
+def group_rows(rows, skip_name_rows=False):
+    """
+    Merge identical rows, appending the number of occurrences to each row.
+    Rows keep the order in which they were first seen.
+
+    :param rows: list of rows (lists of cell values)
+    :param skip_name_rows: pass collection name rows (rows whose first cell
+      is not empty) through without counting them
+    :returns: grouped rows
+    """
+    groups = {}
+    grouped = []
+    for row in rows:
+        if skip_name_rows and row[0] != '':
+            grouped.append(row)
+            continue
+
+        key = tuple(row)
+        try:
+            group = groups.get(key)
+        except TypeError:
+            # Unhashable cell values (arrays, vectors) group by their text
+            key = tuple(str(value) for value in row)
+            group = groups.get(key)
+
+        if group is None:
+            group = groups[key] = list(row) + [0]
+            grouped.append(group)
+        group[-1] += 1
+    return grouped
+
+
+class ScheduleColumn(object):
+    """
+    A schedule column compiled for one run: its data path is parsed once
+    and cells that can't be read are counted instead of silently ignored
+    """
+
+    def __init__(self, column):
+        self.name = column.name
+        self.is_distance = column.data != '--'
+        self.errors = 0
+        self.error = None
+
+        path = column.data_path if column.data == '--' else column.data
+        try:
+            self.accessor = DataPathAccessor(path)
+        except ValueError as err:
+            self.accessor = None
+            self.error = str(err)
+
+    def values(self, objs):
+        """ Get the cell values of this column for objs """
+        if self.accessor is None:
+            self.errors += len(objs)
+            return ['--'] * len(objs)
+
+        accessor = self.accessor
+        values = []
+        for obj in objs:
+            try:
+                values.append(cell_value(accessor(obj)))
+            except (AttributeError, IndexError, KeyError, TypeError,
+                    ValueError, ReferenceError) as err:
+                if self.error is None:
+                    self.error = str(err)
+                self.errors += 1
+                values.append('--')
+
+        # Format distances
+        if self.is_distance:
+            indices = [idx for idx, value in enumerate(values)
+                       if isinstance(value, float)]
+            texts = format_distances([values[idx] for idx in indices])
+            for idx, text in zip(indices, texts):
+                values[idx] = text
+        return values
+
+
+def cell_value(value):
+    """ Convert a property value to a value for a schedule cell """
+    if isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, bpy.types.ID):
+        return value.name
+    if isinstance(value, (Vector, Color, Euler, Quaternion)):
+        return tuple(value)
+    return str(value)
 
 
 class ColumnProps(PropertyGroup):
@@ -138,8 +233,8 @@ class GenerateSchedule(Operator):
     bl_category = 'MeasureitArch'
     bl_options = {'REGISTER'}
 
-    def check_collections(self, collection, schedule, depth=0):
-        data = []
+    def iter_rows(self, collection, schedule, columns):
+        """ Yield the rows of collection, then those of its children """
         rows = []  # Group of rows to be added to the data
 
         if schedule.sort_subcollections:
@@ -147,83 +242,23 @@ class GenerateSchedule(Operator):
             namerow.append(str(collection.name))
             rows.append(namerow)
 
-        for obj in collection.objects:
+        objs = collection.objects
+        values = [column.values(objs) for column in columns]
+        for idx in range(len(objs)):
             row = []
             if schedule.sort_subcollections:
                 row.append('')
-            for column in schedule.columns:
-                row.append(self.get_column_data(column, obj))
+            for columnValues in values:
+                row.append(columnValues[idx])
             rows.append(row)
 
         if schedule.group_rows:
-            rows = self.group_data(rows)
-
-        data.append(rows)
-
-        if len(collection.children) > 0:
-            for subCol in collection.children:
-                returned_rows = self.check_collections(
-                    subCol, schedule, depth=depth + 1)
-                data.append(returned_rows)
-
-        return data
-
-    def get_column_data(self, column, obj):
-        try:
-            if column.data == '--':
-                # TODO: `eval` considered harmful
-                data = eval(
-                    'bpy.data.objects[\'' + obj.name + '\']' + column.data_path)
-            else:
-                # TODO: here too
-                data = eval(
-                    'bpy.data.objects[\'' + obj.name + '\']' + column.data)
-
-                # Format distances
-                if '.dim' in column.data:
-                    data = format_distance(data)
-            return data
-        except:
-            return '--'
-
-    def group_data(self, data):
-        Generator = bpy.context.scene.ScheduleGenerator
-        schedule = Generator.schedules[Generator.active_index]
-
-        dataCopy = copy.deepcopy(data)
-        # Get Counts
-        print(data)
-        for checkrow in data:
+            rows = group_rows(rows, skip_name_rows=schedule.sort_subcollections)
 
-            if schedule.sort_subcollections and checkrow[0] != '':
-                pass
-            else:
-                rowCount = 0
-                for row in dataCopy:
-                    if checkrow == row:
-                        rowCount += 1
-                checkrow.append(rowCount)
-
-        # Purge Duplicates
-        for i, checkrow in enumerate(data):
-            for j, row in reversed(list(enumerate(data))):
-                if i != j and row == checkrow:
-                    data.remove(row)
-
-        return data
-
-    def unpack_data(self, data, depth=0):
-        row_list = []
-        if type(data[0]) != str:
-            for item in data:
-                return_list = self.unpack_data(item, depth=depth + 1)
-                for row in return_list:
-                    row_list.append(row)
-
-        else:
-            row_list.append(data)
+        yield from rows
 
-        return row_list
+        for subCol in collection.children:
+            yield from self.iter_rows(subCol, schedule, columns)
 
     def execute(self, context):
         # Add properties
@@ -240,8 +275,6 @@ class GenerateSchedule(Operator):
                 os.mkdir(datepath)
             file_path = datepath
 
-        row_list = []
-
         # title each column
         firstRow = []
         if schedule.sort_subcollections:
@@ -250,30 +283,33 @@ class GenerateSchedule(Operator):
         for column in schedule.columns:
             firstRow.append(column.name)
 
+        # Unit settings may have changed without a viewport redraw
+        refresh_unit_formatter(context.scene)
+
         # Add Count Column
         if schedule.group_rows:
             firstRow.append('Count')
 
-        data = self.check_collections(schedule.collection, schedule)
-
-        # Unpack Data
-        data_list = self.unpack_data(data)
-
-        for row in data_list:
-            row_list.append(row)
-
-        row_list.insert(0, firstRow)
+        columns = [ScheduleColumn(column) for column in schedule.columns]
 
         try:
             with open(os.path.join(file_path, file_name), 'w', newline='') as file:
                 writer = csv.writer(file)
-                writer.writerows(row_list)
+                writer.writerow(firstRow)
+                writer.writerows(
+                    self.iter_rows(schedule.collection, schedule, columns))
 
         except PermissionError:
             self.report(
                 {'ERROR'}, "Permission Error: File may be open in an External Application?")
             return {'FINISHED'}
 
+        failed = ["{} ({} cells: {})".format(column.name, column.errors, column.error)
+                  for column in columns if column.errors > 0]
+        if failed:
+            self.report(
+                {'WARNING'}, "Some cells could not be read: " + ", ".join(failed))
+
         return {'FINISHED'}
 
 
@@ -477,3 +513,61 @@ class AddScheduleButton(Operator):
                     context.area.tag_redraw()
                     return {'FINISHED'}
         return {'FINISHED'}
+
+
+class GroupRowsTests(unittest.TestCase):
+    """ Test grouping of schedule rows """
+
+    def test_group_rows(self):
+        rows = [['a', 1], ['b', 2], ['a', 1], ['a', 2], ['b', 2], ['a', 1]]
+        self.assertEqual(
+            group_rows(rows), [['a', 1, 3], ['b', 2, 2], ['a', 2, 1]])
+
+    def test_name_rows(self):
+        rows = [['Walls'], ['', 'a'], ['', 'b'], ['', 'a']]
+        self.assertEqual(
+            group_rows(rows, skip_name_rows=True),
+            [['Walls'], ['', 'a', 2], ['', 'b', 1]])
+
+    def test_unhashable(self):
+        rows = [['a', [1, 2]], ['a', [1, 2]]]
+        self.assertEqual(group_rows(rows), [['a', [1, 2], 2]])
+
+    def test_random(self):
+        rnd = random.Random(0)
+        rows = [['Fixture {}'.format(rnd.randrange(20)),
+                 '{:.2f} m'.format(rnd.randrange(4) / 10),
+                 rnd.choice(('Steel', 'Oak', 'Glass'))]
+                for i in range(1000)]
+
+        # Each distinct row once, in the order first seen, with its count
+        expected = []
+        for row in rows:
+            if row not in expected:
+                expected.append(row)
+        expected = [row + [rows.count(row)] for row in expected]
+        self.assertEqual(group_rows(rows), expected)
+
+
+class ScheduleColumnTests(unittest.TestCase):
+    """ Test compiled schedule columns """
+
+    def column(self, data_path):
+        return ScheduleColumn(SimpleNamespace(
+            name='Column', data='--', data_path=data_path))
+
+    def test_values(self):
+        objs = [SimpleNamespace(props={'width': 2}, tags=['a', 'b']),
+                SimpleNamespace(props={}, tags=['c'])]
+        column = self.column('.props["width"]')
+        self.assertEqual(column.values(objs), [2, '--'])
+        self.assertEqual(column.errors, 1)
+
+        column = self.column('.tags[1]')
+        self.assertEqual(column.values(objs), ['b', '--'])
+        self.assertEqual(column.errors, 1)
+
+    def test_invalid_path(self):
+        column = self.column('.tags[0] + 1')
+        self.assertEqual(column.values([None, None]), ['--', '--'])
+        self.assertEqual(column.errors, 2)
@@ -25,32 +25,27 @@
 # ----------------------------------------------------------
 
 import bpy
-import math
-import unittest
 
-from typing import Tuple
 from bpy.types import Panel
 
+from .measureit_arch_kernels import BU_TO_INCHES, BU_TO_FEET, \
+    UnitFormatter as BaseUnitFormatter
+
 
 __all__ = (
     'BU_TO_INCHES',
+    'BU_TO_FEET',
     'format_distance',
     'format_area',
     'format_angle',
+    'format_distances',
+    'UnitFormatter',
+    'get_unit_formatter',
+    'refresh_unit_formatter',
+    'invalidate_unit_formatter',
 )
 
-# Note: one Blender Unit (BU) is 1m
-INCH_TO_CM = 2.54
-INCHES_PER_FEET = 12
-INCHES_PER_MILE = 5280 * INCHES_PER_FEET
-THOU_PER_INCH = 1000
-
-# Conversion factor from Blender Units to Inches / Feet
-BU_TO_INCHES = 100.0 / INCH_TO_CM
-BU_TO_FEET = 100.0 / (INCH_TO_CM * INCHES_PER_FEET)
 
-
-# MeasureIt_ARCH Unit settings
 class SCENE_PT_MARCH_units(Panel):
     """ MeasureIt_ARCH Unit settings """
 
@@ -89,6 +84,62 @@ class SCENE_PT_MARCH_units(Panel):
         col.prop(sceneProps, 'default_scale', text="Default Scale 1:")
 
 
+class UnitFormatter(BaseUnitFormatter):
+    """
+    `UnitFormatter` of measureit_arch_kernels, formatting adaptive and
+    separate units with Blender and built from the scene unit settings
+    """
+
+    @staticmethod
+    def to_string(*args, **kwargs) -> str:
+        return bpy.utils.units.to_string(*args, **kwargs)
+
+    @staticmethod
+    def scene_settings(scene) -> tuple:
+        """ Read the unit settings of scene in constructor order """
+        unit_settings = scene.unit_settings
+        sceneProps = scene.MeasureItArchProps
+        return (
+            unit_settings.system, unit_settings.length_unit,
+            unit_settings.use_separate, unit_settings.scale_length,
+            unit_settings.system_rotation, sceneProps.hide_units,
+            sceneProps.use_unit_scale, sceneProps.metric_precision,
+            int(sceneProps.imperial_precision), sceneProps.angle_precision)
+
+    @classmethod
+    def from_scene(cls, scene):
+        return cls(*cls.scene_settings(scene))
+
+
+# Formatter for the current scene, see `get_unit_formatter`
+_formatter = None
+
+
+def get_unit_formatter() -> UnitFormatter:
+    """ Get the unit formatter of the current scene """
+    if _formatter is None:
+        refresh_unit_formatter(bpy.context.scene)
+    return _formatter
+
+
+def refresh_unit_formatter(scene) -> UnitFormatter:
+    """
+    Rebuild the unit formatter if the unit settings of scene changed since
+    it was built. Called once per redraw, since Blender has no update
+    callback for the scene unit settings.
+    """
+    global _formatter
+    settings = UnitFormatter.scene_settings(scene)
+    if _formatter is None or _formatter.settings != settings:
+        _formatter = UnitFormatter(*settings)
+    return _formatter
+
+
+def invalidate_unit_formatter(self=None, context=None):
+    """ Drop the unit formatter, usable as a property update callback """
+    global _formatter
+    _formatter = None
+
 
 def format_distance(distance: float) -> str:
     """
@@ -99,37 +150,23 @@ def format_distance(distance: float) -> str:
     :returns: formatted string
     :return type: string
     """
-    scene = bpy.context.scene
-    unit_system = bpy.context.scene.unit_settings.system
-    unit_length = scene.unit_settings.length_unit
-    separate_units = scene.unit_settings.use_separate
-    hide_units = scene.MeasureItArchProps.hide_units
-    unit_scale = scene.unit_settings.scale_length
-    if scene.MeasureItArchProps.use_unit_scale:
-        distance *= unit_scale
-    if unit_system == 'METRIC':
-        precision = scene.MeasureItArchProps.metric_precision
-        if not separate_units and not unit_length == 'ADAPTIVE':
-            return _format_metric_length(
-                distance, precision, unit_length, hide_units)
-        # If unit_length is 'Adaptive' or `separate_units` is True, use Blender
-        # built-in which means units are always shown (regardless of
-        # `hide_units`)
-        return bpy.utils.units.to_string(
-            'METRIC', 'LENGTH', distance, precision=precision,
-            split_unit=separate_units, compatible_unit=False)
-
-    elif unit_system == 'IMPERIAL':
-        if not unit_length == 'ADAPTIVE':
-            precision = int(scene.MeasureItArchProps.imperial_precision)
-            return _format_imperial_length(distance, precision, unit_length)
-        return bpy.utils.units.to_string(
-            'IMPERIAL', 'LENGTH', distance, split_unit=separate_units,
-            compatible_unit=False)
-
-    return bpy.utils.units.to_string(
-        'NONE', 'LENGTH', distance, split_unit=separate_units,
-        compatible_unit=False)
+    return get_unit_formatter().format(distance, 'LENGTH')
+
+
+def format_distances(values, kind: str = 'LENGTH') -> list:
+    """
+    Format many lengths (or areas) for display at once. Unit conversion and
+    rounding are done on the whole array, and each distinct display value
+    is formatted only once.
+
+    :param values: lengths in BU / meters or areas in square BU / meters
+    :param type: sequence of float or numpy array
+    :param kind: 'LENGTH' or 'AREA'
+    :param type: str
+    :returns: formatted strings, in the order of values
+    :return type: list of string
+    """
+    return get_unit_formatter().format_array(values, kind)
 
 
 def format_area(area: float) -> str:
@@ -141,30 +178,7 @@ def format_area(area: float) -> str:
     :returns: formatted string
     :return type: string
     """
-    scene = bpy.context.scene
-    unit_system = scene.unit_settings.system
-    unit_length = scene.unit_settings.length_unit
-    separate_units = scene.unit_settings.use_separate
-    hide_units = scene.MeasureItArchProps.hide_units
-
-    if unit_system == 'METRIC':
-        precision = scene.MeasureItArchProps.metric_precision
-        if not separate_units and not unit_length == 'ADAPTIVE':
-            return _format_metric_area(
-                area, precision, unit_length, hide_units)
-        # If unit_length is 'Adaptive' or `separate_units` is True, use Blender
-        # built-in which means units are always shown (regardless of
-        # `hide_units`)
-        return bpy.utils.units.to_string(
-            'METRIC', 'AREA', area, precision=precision,
-            split_unit=separate_units, compatible_unit=False)
-    elif unit_system == 'IMPERIAL':
-        precision = scene.MeasureItArchProps.metric_precision
-        return _format_imperial_area(area, precision)
-
-    return bpy.utils.units.to_string(
-        'NONE', 'LENGTH', area, split_unit=separate_units,
-        compatible_unit=False)
+    return get_unit_formatter().format(area, 'AREA')
 
 
 def format_angle(angle: float) -> str:
@@ -176,163 +190,4 @@ def format_angle(angle: float) -> str:
     :returns: formatted string
     :return type: string
     """
-    scene = bpy.context.scene
-    hide_units = scene.MeasureItArchProps.hide_units
-    precision = scene.MeasureItArchProps.angle_precision
-    system_rotation = scene.unit_settings.system_rotation
-
-    if system_rotation == 'DEGREES':
-        return "{:.{}f}{}".format(
-            math.degrees(angle), precision, '' if hide_units else '°')
-    elif system_rotation == 'RADIANS':
-        return "{:.{}f}{}".format(
-            angle, precision, '' if hide_units else ' rad')
-
-
-def _format_metric_length(
-        value: float, precision: int, unit_length: str = 'METERS',
-        hide_units: bool = False) -> str:
-    """
-    (Internal) Format a value in BU/meters as a string
-    """
-    if unit_length == 'CENTIMETERS':
-        value *= 100
-        unit = " cm"
-    elif unit_length == 'MILLIMETERS':
-        value *= 1000
-        unit = " mm"
-    elif unit_length == 'MICROMETERS':
-        value *= 1000000
-        unit = " µm"
-    elif unit_length == 'KILOMETERS':
-        value = value / float(1000)
-        unit = " km"
-    else:
-        unit = " m"
-    return "{:.{}f}{}".format(value, precision, "" if hide_units else unit)
-
-
-def _format_metric_area(
-        value: float, precision: int, unit_length: str = 'METERS',
-        hide_units: bool = False) -> str:
-    """
-    (Internal) Format a value in square BU/meters as a string
-    """
-    if unit_length == 'CENTIMETERS':
-        value *= 100 ** 2
-        unit = " cm²"
-    elif unit_length == 'MILLIMETERS':
-        value *= 1000 ** 2
-        unit = " mm²"
-    elif unit_length == 'MICROMETERS':
-        value *= 1000000 ** 2
-        unit = " µm²"
-    elif unit_length == 'KILOMETERS':
-        value = value / float(1000 ** 2)
-        unit = " km²"
-    else:
-        unit = " m²"
-    return "{:.{}f}{}".format(value, precision, "" if hide_units else unit)
-
-
-def _format_imperial_length(value, precision, unit_length='INCH') -> str:
-    """
-    (Internal) Format a length as a string using imperial units
-
-    :param value: length in BU/meters
-    :param type: float
-    :param value: precision expressed as 1/n'th inch
-    :param type: int
-    :param unit_length: one of 'INCHES', 'FEET', 'MILES' or 'THOU'
-    :param type: str
-    """
-
-    if unit_length in ('INCHES', 'FEET'):
-        value *= BU_TO_INCHES
-        (inches, num, denom) = _inches_to_fraction(value, precision)
-        if unit_length == 'FEET':
-            (feet, inches) = divmod(inches, INCHES_PER_FEET)
-        else:
-            feet = 0
-        if feet > 0 and num > 0:
-            return "{}′ {}-{}⁄{}″".format(feet, inches, num, denom)
-        elif feet > 0:
-            return "{}′ {}″".format(feet, inches)
-        elif num > 0:
-            return "{}-{}⁄{}″".format(inches, num, denom)
-        else:
-            return "{}″".format(inches)
-    elif unit_length == 'MILES':
-        pass
-    elif unit_length == 'THOU':
-        pass
-    # Adaptive
-    return bpy.utils.units.to_string(
-        'IMPERIAL', 'LENGTH', value, precision=precision,
-        split_unit=False, compatible_unit=False)
-
-
-def _format_imperial_area(value, precision, unit_length='INCH', hide_units=False) -> str:
-    """
-    (Internal) Format an area as a string using imperial units
-
-    :param value: area in BU/meters
-    :param type: float
-    :param value: precision expressed as 1/n'th inch
-    :param type: int
-    :param unit_length: one of 'INCHES', 'FEET', 'MILES' or 'THOU'
-    :param type: str
-    """
-
-    areaToInches = 1550
-    inPerFoot = 143.999
-    unit = " ft²"
-    value *= areaToInches
-    value /= inPerFoot
-
-    return "{:.{}f}{}".format(value, precision, "" if hide_units else unit)
-
-def _inches_to_fraction(inches: float, precision: int) -> Tuple[int, int, int]:
-    """
-    (Internal) Returns the integer and fractional part as a tuple of integer
-    part, numerator and denominator (all integers), rounded to precision
-    (expressed as 1/n'th of an inch).
-    """
-    inches_ = round(inches * precision) / float(precision)
-    frac, int_ = math.modf(inches_)
-    num, denom = frac.as_integer_ratio()
-    return (int(int_), num, denom)
-
-
-class ImperialConversionTests(unittest.TestCase):
-    """ Test conversion from BU to imperial units """
-
-    PRECISION = 5
-
-    def test_inches(self):
-        self.assertAlmostEqual(2.3 * BU_TO_INCHES, 90.55118, self.PRECISION)
-
-
-class FormatImperialTests(unittest.TestCase):
-    """ Test formatting of imperial units """
-
-    def test_imperial_length_inch(self):
-        str = _format_imperial_length(2.3, 64, 'INCH')
-        self.assertEqual(str, "2-19⁄64″")
-
-        str = _format_imperial_length(2.3, 32, 'INCH')
-        self.assertEqual(str, "2-5⁄16″")
-
-        str = _format_imperial_length(2.3, 8, 'INCH')
-        self.assertEqual(str, "2-1⁄4″")
-
-        str = _format_imperial_length(2.3, 2, 'INCH')
-        self.assertEqual(str, "2-1⁄2″")
-
-        str = _format_imperial_length(2.3, 1, 'INCH')
-        self.assertEqual(str, "2″")
-
-
-if __name__ == '__main__':
-    # Run with: blender -P measureit_arch_units.py
-    unittest.main(argv=['blender'])
+    return get_unit_formatter().format(angle, 'ANGLE')
@@ -1,10 +1,23 @@
 import bpy
 import bmesh
 import bgl
-
+import hashlib
+import functools
+import importlib
+import json
+import operator
+import os
+import re
+import time
+
+from collections import OrderedDict
+from gpu_extras.batch import batch_for_shader
 from mathutils import Vector
 from addon_utils import check, paths
 from sys import getrecursionlimit, setrecursionlimit
+from types import SimpleNamespace
+
+from .measureit_arch_kernels import interpolate_point
 
 __all__ = (
     'get_view',
@@ -17,6 +30,15 @@ __all__ = (
     'local_attrs',
     'multi_getattr',
     'multi_setattr',
+    'DataPathAccessor',
+    'batch_cache',
+    'gl_state',
+    'item_index',
+    'lazy_module',
+    'profiler',
+    'render_state',
+    'sidecar_cache',
+    'text_update_queue',
 )
 
 
@@ -45,6 +67,99 @@ class Set_Render:
         self.sceneProps.is_render_draw = False
 
 
+class GL_State(object):
+    """
+    Shadow copy of the GL state MeasureIt_ARCH touches while drawing.
+
+    The bgl call is only issued when the requested value differs from the
+    tracked one. Outside of a frame (see `begin_frame` and `end_frame`) the
+    tracked state can't be trusted, since Blender and other add-ons draw in
+    between our handlers, so every call is passed through.
+
+    `with gl_state:` wraps one frame of drawing.
+    """
+
+    # State `end_frame` leaves behind, matches OpenGL_Settings(False)
+    defaults = (
+        ('MULTISAMPLE', False),
+        ('BLEND', False),
+        ('DEPTH_TEST', False),
+        ('POLYGON_SMOOTH', False),
+    )
+
+    def __init__(self):
+        self.state = {}
+        self.in_frame = False
+        self.calls = 0
+        self.skipped = 0
+        self.frame_calls = 0
+        self.frame_skipped = 0
+
+    def _set(self, key, value, func, *args):
+        if self.in_frame and self.state.get(key) == value:
+            self.skipped += 1
+            return
+        func(*args)
+        self.state[key] = value
+        self.calls += 1
+
+    def set_cap(self, cap, enabled):
+        func = bgl.glEnable if enabled else bgl.glDisable
+        self._set(cap, bool(enabled), func, cap)
+
+    def enable(self, cap):
+        self.set_cap(cap, True)
+
+    def disable(self, cap):
+        self.set_cap(cap, False)
+
+    def depth_mask(self, flag):
+        self._set('depth_mask', bool(flag), bgl.glDepthMask, flag)
+
+    def depth_func(self, func):
+        self._set('depth_func', func, bgl.glDepthFunc, func)
+
+    def blend_func(self, sfactor, dfactor):
+        self._set('blend_func', (sfactor, dfactor), bgl.glBlendFunc,
+                  sfactor, dfactor)
+
+    def blend_equation(self, mode):
+        self._set('blend_equation', mode, bgl.glBlendEquation, mode)
+
+    def invalidate(self):
+        """ Forget the tracked state, e.g. after raw bgl calls """
+        self.state.clear()
+
+    def begin_frame(self):
+        self.invalidate()
+        self.in_frame = True
+        self.calls = 0
+        self.skipped = 0
+
+    def __enter__(self):
+        self.begin_frame()
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.end_frame()
+
+    def end_frame(self):
+        """ Restore Blender's expected state and record the frame's stats """
+        for name, enabled in self.defaults:
+            self.set_cap(getattr(bgl, 'GL_' + name), enabled)
+        self.blend_func(bgl.GL_SRC_ALPHA, bgl.GL_ONE_MINUS_SRC_ALPHA)
+        self.blend_equation(bgl.GL_FUNC_ADD)
+        self.depth_func(bgl.GL_LEQUAL)
+        self.depth_mask(False)
+
+        self.in_frame = False
+        self.frame_calls = self.calls
+        self.frame_skipped = self.skipped
+
+
+gl_state = GL_State()
+
+
 class OpenGL_Settings:
     def __init__(self,props):
         self.props = props
@@ -53,35 +168,589 @@ class OpenGL_Settings:
         self.set_OpenGL_Settings(True)
 
     def __exit__(self, type, value, tb):
-        self.set_OpenGL_Settings(False)
+        # Inside a frame the next item sets what it needs, and the
+        # state is restored once in gl_state.end_frame()
+        if not gl_state.in_frame:
+            self.set_OpenGL_Settings(False)
 
     def set_OpenGL_Settings(self, toggleBool, props=None):
 
         if toggleBool:
-            bgl.glEnable(bgl.GL_MULTISAMPLE)
-            bgl.glEnable(bgl.GL_BLEND)
-            bgl.glBlendFunc(bgl.GL_SRC_ALPHA, bgl.GL_ONE_MINUS_SRC_ALPHA)
-            bgl.glBlendEquation(bgl.GL_FUNC_ADD)
+            gl_state.enable(bgl.GL_MULTISAMPLE)
+            gl_state.enable(bgl.GL_BLEND)
+            gl_state.blend_func(bgl.GL_SRC_ALPHA, bgl.GL_ONE_MINUS_SRC_ALPHA)
+            gl_state.blend_equation(bgl.GL_FUNC_ADD)
 
-            bgl.glDepthFunc(bgl.GL_LEQUAL)
-            bgl.glDepthMask(True)
+            gl_state.depth_func(bgl.GL_LEQUAL)
+            gl_state.depth_mask(True)
 
             if self.props and self.props.inFront:
-                bgl.glDisable(bgl.GL_DEPTH_TEST)
+                gl_state.disable(bgl.GL_DEPTH_TEST)
             else:
-                bgl.glEnable(bgl.GL_DEPTH_TEST)
+                gl_state.enable(bgl.GL_DEPTH_TEST)
+
+        else:
+            gl_state.disable(bgl.GL_MULTISAMPLE)
+            gl_state.disable(bgl.GL_BLEND)
+            gl_state.blend_func(bgl.GL_SRC_ALPHA, bgl.GL_ONE_MINUS_SRC_ALPHA)
+            gl_state.blend_equation(bgl.GL_FUNC_ADD)
+
+            gl_state.disable(bgl.GL_DEPTH_TEST)
+            gl_state.depth_func(bgl.GL_LEQUAL)
+            gl_state.depth_mask(False)
+
+            gl_state.disable(bgl.GL_POLYGON_SMOOTH)
+
+
+class lazy_module(object):
+    """
+    Stand-in for a module that is imported on first attribute access. Used
+    for dependencies that only some features need (svgwrite and fontTools
+    for vector export, numpy), so they don't slow down loading the add-on.
+
+    `svgwrite = lazy_module('svgwrite')` replaces `import svgwrite`
+    """
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__['_module']
+        if module is None:
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return getattr(module, attr)
+
+
+np = lazy_module('numpy')
+
+
+class SidecarCache:
+    """
+    On-disk cache of derived geometry (area triangulations, convex hulls,
+    simplified line groups), so it survives closing and reopening a file.
+
+    Entries live in a `.measureit_arch_cache` directory next to the .blend,
+    one `.npy` file per array, and are memory mapped when loaded. Keys are
+    content hashes of everything an entry is derived from (see `digest`), so
+    a changed mesh simply misses. Each entry has a checksum of its arrays,
+    written last, and entries that don't match it are ignored.
+
+    Old keys are never read again, so past `MAX_BYTES` per file the least
+    recently used entries are removed when saving (see `prune`).
+    """
+
+    DIRNAME = '.measureit_arch_cache'
+
+    # Bump when the layout of cached arrays changes
+    VERSION = 1
+
+    # Size of the entries kept for a file
+    MAX_BYTES = 256 * 1024 * 1024
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def directory(self):
+        """ Cache directory of the current file, None when disabled """
+        filepath = bpy.data.filepath
+        if not filepath or not bpy.context.scene.MeasureItArchProps.use_disk_cache:
+            return None
+        head, tail = os.path.split(filepath)
+        return os.path.join(head, self.DIRNAME, os.path.splitext(tail)[0])
+
+    @classmethod
+    def digest(cls, *parts):
+        """ Content hash of arrays and plain values """
+        hasher = hashlib.blake2b(digest_size=20)
+        hasher.update(repr(cls.VERSION).encode())
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                part = np.ascontiguousarray(part)
+                hasher.update(repr((part.dtype.str, part.shape)).encode())
+                hasher.update(part.data)
+            else:
+                hasher.update(repr(part).encode())
+        return hasher.hexdigest()
+
+    @staticmethod
+    def checksum(arrays):
+        return SidecarCache.digest(*[arrays[name] for name in sorted(arrays)])
+
+    def paths(self, directory, kind, key):
+        stem = os.path.join(directory, '{}-{}'.format(kind, key))
+        return stem + '.sum', stem + '.{}.npy'
+
+    def load(self, kind, key, names):
+        """
+        Return the arrays `names` of an entry as a {name: array} dict of
+        read-only memory maps, or None if it isn't cached
+        """
+        directory = self.directory()
+        if directory is None:
+            return None
+        sumPath, arrayPath = self.paths(directory, kind, key)
+        try:
+            with open(sumPath) as sumFile:
+                checksum = sumFile.read().strip()
+            arrays = {name: np.load(arrayPath.format(name), mmap_mode='r')
+                      for name in names}
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if self.checksum(arrays) != checksum:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            # The checksum's time is the entry's last use, see `prune`
+            os.utime(sumPath)
+        except OSError:
+            pass
+        return arrays
+
+    def save(self, kind, key, arrays):
+        """ Store the {name: array} dict `arrays` as an entry """
+        directory = self.directory()
+        if directory is None:
+            return
+        sumPath, arrayPath = self.paths(directory, kind, key)
+        arrays = {name: np.ascontiguousarray(array)
+                  for name, array in arrays.items()}
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for name, array in arrays.items():
+                # Written under another name and moved, so readers never
+                # see a partial file
+                path = arrayPath.format(name)
+                with open(path + '.tmp', 'wb') as arrayFile:
+                    np.save(arrayFile, array)
+                os.replace(path + '.tmp', path)
+            with open(sumPath + '.tmp', 'w') as sumFile:
+                sumFile.write(self.checksum(arrays))
+            os.replace(sumPath + '.tmp', sumPath)
+        except OSError:
+            return
+        self.writes += 1
+        self.prune(directory, keep='{}-{}'.format(kind, key))
+
+    def prune(self, directory, keep=None):
+        """
+        Remove the least recently used entries of `directory` until it's
+        under `MAX_BYTES`, except the entry `keep`. Entries without a
+        checksum (interrupted writes) go first.
+        """
+        entries = {}
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # size, last use, files
+            entry = entries.setdefault(name.split('.', 1)[0], [0, 0.0, []])
+            entry[0] += stat.st_size
+            if name.endswith('.sum'):
+                entry[1] = stat.st_mtime
+            entry[2].append(path)
+
+        total = sum(entry[0] for entry in entries.values())
+        for stem, (size, lastUse, paths) in sorted(
+                entries.items(), key=lambda item: item[1][1]):
+            if total <= self.MAX_BYTES:
+                break
+            if stem == keep:
+                continue
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    # e.g. still memory mapped on Windows
+                    pass
+            total -= size
+
+    def clear(self):
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+
+sidecar_cache = SidecarCache()
+
+
+class TextUpdateQueue:
+    """
+    Queue of items whose text textures need to be redrawn.
+
+    Property update callbacks push the item that owns the changed text, and
+    the POST_PIXEL handler drains the queue within a per-frame time budget.
+    Items are keyed by object name and RNA path so that no python reference
+    to Blender data outlives an undo step. Changes that can't be traced to a
+    single item (styles, scene settings, views) request a rescan instead.
+    """
+
+    generators = ('DimensionGenerator.', 'AnnotationGenerator.')
+    ignored = ('StyleGenerator.line_groups', )
+
+    def __init__(self):
+        self.pending = OrderedDict()
+        self.rescan = False
+        self.rescan_force = False
 
+    def __len__(self):
+        return len(self.pending)
+
+    def clear(self):
+        self.pending.clear()
+        self.rescan = False
+        self.rescan_force = False
+
+    def push(self, item, force=False):
+        """ Queue the dimension or annotation that owns item """
+        try:
+            id_data = item.id_data
+            path = item.path_from_id()
+        except (AttributeError, ValueError, ReferenceError):
+            self.request_rescan(force=True)
+            return
+
+        # Text fields are redrawn through the item that owns them
+        idx = path.rfind('.textFields[')
+        if idx != -1:
+            path = path[:idx]
+
+        if isinstance(id_data, bpy.types.Object):
+            # Line groups and other object data carry no text
+            if path.startswith(self.generators):
+                self.push_key((id_data.name, path), force)
+        elif path.startswith('ViewGenerator.'):
+            # View text fields (Notes) are picked up by their own flag
+            self.request_rescan()
+        elif not path.startswith(self.ignored):
+            self.request_rescan(force=True)
+
+    def push_key(self, key, force=False):
+        self.pending[key] = self.pending.get(key, False) or force
+
+    def request_rescan(self, force=False):
+        self.rescan = True
+        self.rescan_force = self.rescan_force or force
+
+    def pop(self):
+        """ Pop the oldest queued key as a (key, force) tuple """
+        return self.pending.popitem(last=False)
+
+    @staticmethod
+    def resolve(key):
+        """ Get the item for a queued key, or None if it no longer exists """
+        obj = bpy.data.objects.get(key[0])
+        if obj is None:
+            return None
+        try:
+            return obj.path_resolve(key[1])
+        except ValueError:
+            return None
+
+    def drain(self, callback, budget):
+        """
+        Call callback(key, item, force) for queued items until the queue is empty
+        or budget (in seconds) is spent. Returns True if the queue is empty.
+        """
+        startTime = time.perf_counter()
+        while self.pending:
+            key, force = self.pop()
+            item = self.resolve(key)
+            if item is not None:
+                callback(key, item, force)
+            if time.perf_counter() - startTime > budget:
+                break
+        return not self.pending
+
+
+text_update_queue = TextUpdateQueue()
+
+
+class BatchCache:
+    """
+    GPU batches for dimension and annotation geometry, so items that didn't
+    change redraw without uploading a new vertex buffer.
+
+    Batches are stored per owner (an item's `as_pointer()`) and part, e.g.
+    'lines' or 'fill', and are rebuilt when the hash of their coordinates
+    changes. Owners can be dropped explicitly with `invalidate`.
+    """
+
+    def __init__(self):
+        self.batches = {}
+        self.hits = 0
+        self.uploads = 0
+
+    @staticmethod
+    def geometry_hash(coords):
+        return hash(tuple(map(tuple, coords)))
+
+    def get(self, key, shader, primType, coords):
+        """
+        Return a batch of `coords` for `key`, an (owner, part) tuple. A third
+        item is used as the geometry hash instead of hashing `coords`.
+        """
+        owner, part = key[:2]
+        parts = self.batches.setdefault(owner, {})
+        if len(key) > 2:
+            geomHash = key[2]
         else:
-            bgl.glDisable(bgl.GL_MULTISAMPLE)
-            bgl.glDisable(bgl.GL_BLEND)
-            bgl.glBlendFunc(bgl.GL_SRC_ALPHA, bgl.GL_ONE_MINUS_SRC_ALPHA)
-            bgl.glBlendEquation(bgl.GL_FUNC_ADD)
+            geomHash = self.geometry_hash(coords)
+
+        cached = parts.get(part)
+        if cached is not None and cached[0] == geomHash:
+            self.hits += 1
+            return cached[1]
+
+        batch = batch_for_shader(shader, primType, {"pos": coords})
+        parts[part] = (geomHash, batch)
+        self.uploads += 1
+        return batch
+
+    def invalidate(self, owner=None):
+        if owner is None:
+            self.batches.clear()
+        else:
+            self.batches.pop(owner, None)
+
+    def __len__(self):
+        return sum(len(parts) for parts in self.batches.values())
+
+
+batch_cache = BatchCache()
+
+
+class RenderState:
+    """
+    Values derived while drawing an item, e.g. its gizmo location or text
+    card, kept here instead of in the item's properties so the draw callback
+    doesn't write to Blender data (which tags the file as modified and fills
+    the undo stack).
+
+    State is stored per item `as_pointer()` and dropped on file load and undo,
+    when the pointers may no longer be valid.
+    """
+
+    def __init__(self):
+        self.items = {}
+
+    def get(self, item):
+        """ Return the (mutable) state namespace of `item` """
+        key = item.as_pointer()
+        state = self.items.get(key)
+        if state is None:
+            state = self.items[key] = SimpleNamespace()
+        return state
+
+    def read(self, item, name):
+        """
+        Return the drawn value `name` of `item`, falling back to the item's
+        own property for items that haven't been drawn yet
+        """
+        state = self.items.get(item.as_pointer())
+        if state is not None and hasattr(state, name):
+            return getattr(state, name)
+        return getattr(item, name)
+
+    def clear(self):
+        self.items.clear()
 
-            bgl.glDisable(bgl.GL_DEPTH_TEST)
-            bgl.glDepthFunc(bgl.GL_LEQUAL)
-            bgl.glDepthMask(False)
+    def __len__(self):
+        return len(self.items)
+
+
+render_state = RenderState()
+
+
+class ItemIndex:
+    """
+    Map of item pointers to their (collection, index) in a generator, so an
+    item's place can be found without `eval` or comparing it against every
+    item of every collection.
+
+    A collection's map is rebuilt when its length changes, which is when
+    Blender may reallocate its items. Moving an item swaps the data of two
+    items in place, so the pointers of the slots stay valid. Removing one
+    item and adding another between lookups keeps the length but can move
+    the items, so a lookup that misses or finds another item rebuilds the
+    map once before giving up.
+    """
+
+    def __init__(self):
+        self.maps = {}
+
+    def index(self, generator, collectionName, rebuild=False):
+        """ Return the {pointer: index} map of a generator collection """
+        collection = getattr(generator, collectionName)
+        key = (generator.as_pointer(), collectionName)
+        cached = self.maps.get(key)
+        if rebuild or cached is None or cached[0] != len(collection):
+            pointers = {
+                item.as_pointer(): idx for idx, item in enumerate(collection)}
+            cached = self.maps[key] = (len(collection), pointers)
+        return cached[1]
+
+    def find(self, generator, pointer, collectionName, rebuild=False):
+        idx = self.index(generator, collectionName, rebuild).get(pointer)
+        if idx is None:
+            return None
+        collection = getattr(generator, collectionName)
+        if idx >= len(collection) or collection[idx].as_pointer() != pointer:
+            return None
+        return idx
+
+    def locate(self, generator, item, collectionNames):
+        """
+        Return the (collection name, index) of `item` in one of the
+        `collectionNames` of `generator`, or None if it isn't in them
+        """
+        pointer = item.as_pointer()
+        for rebuild in (False, True):
+            for collectionName in collectionNames:
+                idx = self.find(generator, pointer, collectionName, rebuild)
+                if idx is not None:
+                    return collectionName, idx
+        return None
+
+    def clear(self):
+        self.maps.clear()
+
+
+item_index = ItemIndex()
+
+
+class Profiler:
+    """
+    Timings of the draw loop, per category (item type or function) and
+    per object, for finding out which objects cost frames.
+
+    Functions are wrapped with `timed`. While disabled the wrapper only
+    checks `enabled` before calling the function. Each call
+    records its total time and its self time, which excludes the timed calls
+    made from it, so nested categories don't count twice.
+    """
+
+    # Calls kept for the Chrome trace, the totals keep counting past it
+    MAX_EVENTS = 200000
+
+    def __init__(self):
+        self.enabled = False
+        self.stack = []
+        self.reset()
+
+    def reset(self):
+        # (category, owner): [calls, total, self]
+        self.stats = {}
+        # (category, owner, start, duration)
+        self.events = []
+        self.stack.clear()
+        self.frames = 0
+        self.origin = time.perf_counter()
+
+    def timed(self, category, ownerArg=None):
+        """
+        Decorator timing each call as `category`. The object named by the
+        positional argument `ownerArg`, if given, is the call's owner.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                owner = None
+                if ownerArg is not None and len(args) > ownerArg:
+                    owner = getattr(args[ownerArg], 'name', None)
+                self.stack.append(0.0)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(category, owner, start, time.perf_counter())
+            return wrapper
+        return decorator
+
+    def record(self, category, owner, start, end):
+        duration = end - start
+        children = self.stack.pop() if self.stack else 0.0
+        if self.stack:
+            self.stack[-1] += duration
+
+        entry = self.stats.get((category, owner))
+        if entry is None:
+            entry = self.stats[(category, owner)] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += duration
+        entry[2] += duration - children
+
+        if len(self.events) < self.MAX_EVENTS:
+            self.events.append((category, owner, start, duration))
+
+    def tick(self):
+        """ Count a redraw, for the per frame averages """
+        if self.enabled:
+            self.frames += 1
+
+    def summary(self, byOwner=False):
+        """
+        Rows of (name, calls, total, self) per category, or per object with
+        `byOwner`, sorted by self time
+        """
+        rows = {}
+        for (category, owner), (calls, total, selfTime) in self.stats.items():
+            name = owner if byOwner else category
+            if name is None:
+                continue
+            row = rows.setdefault(name, [0, 0.0, 0.0])
+            row[0] += calls
+            row[1] += total
+            row[2] += selfTime
+        return sorted(((name,) + tuple(row) for name, row in rows.items()),
+                      key=lambda row: row[3], reverse=True)
+
+    def to_json(self):
+        return {
+            'frames': self.frames,
+            'calls': [
+                {'category': category, 'object': owner, 'calls': calls,
+                 'total': total, 'self': selfTime}
+                for (category, owner), (calls, total, selfTime)
+                in sorted(self.stats.items(), key=lambda item: -item[1][2])],
+        }
+
+    def to_chrome_trace(self):
+        """ Calls as complete events of the Chrome trace event format """
+        events = []
+        for category, owner, start, duration in self.events:
+            event = {
+                'name': category if owner is None else
+                '{} ({})'.format(category, owner),
+                'cat': category, 'ph': 'X', 'pid': 0, 'tid': 0,
+                'ts': (start - self.origin) * 1e6, 'dur': duration * 1e6}
+            if owner is not None:
+                event['args'] = {'object': owner}
+            events.append(event)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, filepath, traceFormat=False):
+        data = self.to_chrome_trace() if traceFormat else self.to_json()
+        with open(filepath, 'w') as exportFile:
+            json.dump(data, exportFile, indent=1)
+
+
+profiler = Profiler()
 
-            bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
 
 def get_view():
     scene = bpy.context.scene
@@ -156,20 +825,8 @@ def interpolate3d(v1, v2, d1):
     assert isinstance(v2, Vector)
     assert isinstance(d1, float)
 
-    # calculate vector
-    v = v2 - v1
-
-    # calculate distance between points
-    d0 = v.length
-
-    # calculate interpolate factor (distance from origin / distance total)
     # if d1 > d0, the point is projected in 3D space
-    if d0 > 0:
-        x = d1 / d0
-    else:
-        x = d1
-
-    return Vector((v1[0] + (v[0] * x), v1[1] + (v[1] * x), v1[2] + (v[2] * x)))
+    return Vector(interpolate_point(v1, v2, d1))
 
 
 def get_selected_faces(myobject):
@@ -469,3 +1126,52 @@ def multi_setattr(obj, attr, value):
         except AttributeError:
             raise
     setattr(obj, last, value)
+
+
+class DataPathAccessor(object):
+    """
+    Getter for a python style data path relative to an object, such as
+    '.dimensions[0]' or '.data["prop"].name'. The path is parsed once into
+    attribute, index and key steps, in the style of `multi_getattr`, so it
+    can be applied to many objects without `eval`. Calling the accessor
+    raises the AttributeError, IndexError, KeyError or TypeError of the
+    first step that fails.
+    """
+
+    _step = re.compile(
+        r'\.\s*([A-Za-z_]\w*)'            # .attribute
+        r'|\[\s*(-?\d+)\s*\]'              # [index]
+        r'|\[\s*([\'"])(.*?)\3\s*\]')      # ['key'] or ["key"]
+
+    def __init__(self, path):
+        self.path = path
+        self.steps = self.parse(path)
+
+    @classmethod
+    def parse(cls, path):
+        """ Parse path into (getter, argument) steps, ValueError if invalid """
+        path = path.strip()
+        if path and path[0] not in '.[':
+            path = '.' + path
+
+        steps = []
+        pos = 0
+        while pos < len(path):
+            match = cls._step.match(path, pos)
+            if match is None:
+                raise ValueError(
+                    "Invalid data path '{}' at '{}'".format(path, path[pos:]))
+            attr, index, quote, key = match.groups()
+            if attr is not None:
+                steps.append((getattr, attr))
+            elif index is not None:
+                steps.append((operator.getitem, int(index)))
+            else:
+                steps.append((operator.getitem, key))
+            pos = match.end()
+        return tuple(steps)
+
+    def __call__(self, obj):
+        for getter, arg in self.steps:
+            obj = getter(obj, arg)
+        return obj
@@ -18,7 +18,7 @@ from bpy.app.handlers import persistent
 
 from .measureit_arch_render import render_main, render_main_svg
 from .measureit_arch_baseclass import TextField
-from . measureit_arch_utils import get_loaded_addons, get_view
+from . measureit_arch_utils import get_loaded_addons, get_view, text_update_queue
 from .measureit_arch_units import BU_TO_INCHES
 
 
@@ -49,6 +49,7 @@ PAPER_SIZES = (
 def scene_text_update_flag(self, context):
     scene = context.scene
     scene.MeasureItArchProps.text_updated = True
+    text_update_queue.request_rescan(force=True)
     update(self, context)
 
 
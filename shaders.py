@@ -70,6 +70,24 @@ class Base_Shader_3D ():
     '''
 
 
+class Object_Shader_3D ():
+
+    # Base_Shader_3D for coordinates in object space, for geometry that is
+    # cached and only moved with its object
+    vertex_shader = '''
+        uniform mat4 ModelViewProjectionMatrix;
+        uniform mat4 objectMatrix;
+        uniform float offset;
+        in vec3 pos;
+        vec4 project = ModelViewProjectionMatrix * objectMatrix * vec4(pos, 1.0);
+        vec4 vecOffset = vec4(0.0,0.0,offset,0.0);
+
+        void main() {
+           gl_Position = project + vecOffset;
+        }
+    '''
+
+
 class Base_Shader_3D_AA ():
     fragment_shader = '''
         in vec2 mTexCoord;
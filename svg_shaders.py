@@ -29,18 +29,41 @@ import bmesh
 import time
 import bpy_extras.object_utils as object_utils
 import math
-import svgwrite
-from fontTools import ttLib
 
-from math import fabs, sqrt
+from math import sqrt
+from operator import attrgetter
 from mathutils import Vector, Matrix
 from sys import getrecursionlimit, setrecursionlimit
 
-from .measureit_arch_utils import get_view, interpolate3d, get_camera_z_dist, recursionlimit
+from .measureit_arch_kernels import DepthTester, camera_depth
+from .measureit_arch_utils import get_view, get_camera_z_dist, recursionlimit, \
+    lazy_module, profiler
+
+# Only needed for vector export, imported on first use
+svgwrite = lazy_module('svgwrite')
+ttLib = lazy_module('fontTools.ttLib')
 
 depthbuffer = None
 facemap = []
 
+# (dash, gap) getters of the dash segments of line properties
+DASH_GETTERS = tuple(
+    attrgetter('d{}_length'.format(i), 'g{}_length'.format(i))
+    for i in range(1, 5))
+
+
+def get_dash_array(itemProps):
+    """
+    SVG stroke-dasharray of the dash segments of `itemProps`, AttributeError
+    if it has no dashes
+    """
+    numDashes = itemProps.num_dashes
+    if numDashes > len(DASH_GETTERS):
+        raise AttributeError("No dash {} length".format(numDashes))
+    return ",".join("{},{}".format(*getter(itemProps))
+                    for getter in DASH_GETTERS[:numDashes])
+
+@profiler.timed('svg_line')
 def svg_line_shader(item, itemProps, coords, thickness, color, svg, parent=None, mat=Matrix.Identity(4)):
     idName = item.name + "_lines"
     dash_id_name = idName = item.name + "_dashed_lines"
@@ -75,13 +98,7 @@ def svg_line_shader(item, itemProps, coords, thickness, color, svg, parent=None,
         dash_weight = itemProps.lineHiddenWeight
 
     try:
-        dash_val = ""
-        for i in range(itemProps.num_dashes+1):
-            if i == 0: continue
-            if i > 1: dash_val += ","
-            dash_space = eval('itemProps.d{}_length'.format(i))
-            gap_space = eval('itemProps.g{}_length'.format(i))
-            dash_val += "{},{}".format(dash_space , gap_space)
+        dash_val = get_dash_array(itemProps)
     except AttributeError:
         dash_val = "5,5"
 
@@ -119,6 +136,7 @@ def svg_line_shader(item, itemProps, coords, thickness, color, svg, parent=None,
                 elif not vis and draw_hidden:
                     dashed_lines.add(line_draw)
 
+@profiler.timed('svg_fill')
 def svg_fill_shader(item, coords, color, svg, parent=None):
     if camera_cull(coords):
         return
@@ -136,6 +154,7 @@ def svg_fill_shader(item, coords, color, svg, parent=None):
             points=[coords_2d[x], coords_2d[x + 1], coords_2d[x + 2]])
         fills.add(tri)
 
+@profiler.timed('svg_circle')
 def svg_circle_shader(item, point, rad, color, svg, parent=None):
     if camera_cull([point]):
         return
@@ -150,6 +169,7 @@ def svg_circle_shader(item, point, rad, color, svg, parent=None):
     circle = svg.circle(center=point_2d,r=rad)
     fills.add(circle)
 
+@profiler.timed('svg_poly_fill')
 def svg_poly_fill_shader(item, coords, color, svg, parent=None, line_color=(0, 0, 0,0), lineWeight=0, fillURL='', itemProps = None, closed=True, mat = Matrix.Identity(4)):
     if camera_cull(coords):
         return
@@ -170,13 +190,7 @@ def svg_poly_fill_shader(item, coords, color, svg, parent=None, line_color=(0, 0
         dashed = True  
 
         try:
-            dash_val = ""
-            for i in range(itemProps.num_dashes+1):
-                if i == 0: continue
-                if i > 1: dash_val += ","
-                dash_space = eval('itemProps.d{}_length'.format(i))
-                gap_space = eval('itemProps.g{}_length'.format(i))
-                dash_val += "{},{}".format(dash_space , gap_space)
+            dash_val = get_dash_array(itemProps)
         except AttributeError:
             if "dash_size" in itemProps:
                 dash_val = "{},{}".format(itemProps.dash_size, itemProps.gap_size)
@@ -222,6 +236,7 @@ def svg_poly_fill_shader(item, coords, color, svg, parent=None, line_color=(0, 0
         parent.add(patternfill)
         patternfill.add(poly)
 
+@profiler.timed('svg_text')
 def svg_text_shader(item, style, text, mid, textCard, color, svg, parent=None):
 
     # Card Indicies:
@@ -353,6 +368,7 @@ def svg_text_shader(item, style, text, mid, textCard, color, svg, parent=None):
         svg.add(svg.line(start=tuple((0,0)), end=tuple((0,50)), stroke="green", stroke_width=1))
 
 
+@profiler.timed('svg_line_pattern')
 def svg_line_pattern_shader(pattern, svg, objs, weight, color, size):
     svgColor = svgwrite.rgb(color[0] * 100, color[1] * 100, color[2] * 100, '%')
 
@@ -488,158 +504,41 @@ def camera_cull(points):
 
 def true_z_buffer(context, zValue):
     camera = context.scene.camera.data
-    if camera.type == 'ORTHO':
-        nearClip = camera.clip_start
-        farClip = camera.clip_end
-
-        depth = zValue * (farClip - nearClip) + nearClip - 0.09
-        return depth
-
-    elif camera.type == 'PERSP':
-        nearClip = camera.clip_start
-        farClip = camera.clip_end
-
-        z_ndc = 2.0 * zValue - 1.0
-        depth = 2.0 * nearClip * farClip / \
-            (farClip + nearClip - z_ndc * (farClip - nearClip))
-        return depth
-
-    else:
-        return zValue
+    return camera_depth(zValue, camera.type, camera.clip_start, camera.clip_end)
 
+@profiler.timed('depth_test')
 def depth_test(p1, p2, mat, item, depthbuffer):
     scene = bpy.context.scene
+    camera = scene.camera.data
+    render = scene.render
+
+    # Get Render info
+    render_scale = render.resolution_percentage / 100
+    width = int(render.resolution_x * render_scale)
+    height = int(render.resolution_y * render_scale)
+
+    tester = DepthTester(
+        lambda point: object_utils.world_to_camera_view(scene, scene.camera, point),
+        width, height, camera.type, camera.clip_start, camera.clip_end,
+        depthbuffer)
 
     # Don't depth test if out of culling
-    if camera_cull([mat @ Vector(p1), mat @ Vector(p2)]):
+    if tester.culled([mat @ Vector(p1), mat @ Vector(p2)]):
         return [[-1, p1, p2]]
 
     # Don't Depth test if not enabled
     if not scene.MeasureItArchProps.vector_depthtest or item.inFront:
         return [[True, p1, p2]]
 
-    p1Local = mat @ Vector(p1)
-    p2Local = mat @ Vector(p2)
-
-    # Get Screen Space Points
-    p1ss = get_ss_point(p1Local)
-    p2ss = get_ss_point(p2Local)
-
-    # Length in ss is ~number of pixels. use for num of visibility samples
-    ss_length_vec = p1ss-p2ss
-    ss_samples = math.ceil(ss_length_vec.length/2)
-    if ss_samples < 1: ss_samples = 1
-
-    last_vis_state = check_visible(item, p1Local)
-    line_segs = []
-    seg_start = p1
-    distVector = Vector(p1) - Vector(p2)
-    dist = distVector.length
-    iter_dist = fabs((dist / ss_samples))
-
-    for i in range(1,ss_samples):
-        p_check = interpolate3d(Vector(p1), Vector(p2), iter_dist * i)
-        p_check_vis = check_visible(item, mat @ Vector(p_check))
-
-        line = [last_vis_state, seg_start, p_check]
-
-        if last_vis_state is not p_check_vis:
-            line_segs.append(line)
-            seg_start = p_check
-            last_vis_state = p_check_vis
-
-    line_segs.append([last_vis_state, seg_start, p2])
-
-    return line_segs
-
-def clamp(minimum, x, maximum):
-    return max(minimum, min(x, maximum))
-
-# For getting the depthbuffer ss point
-def get_ss_point(point):
-    scene = bpy.context.scene
-    render = scene.render
-
-    #Get Render info
-    render_scale = scene.render.resolution_percentage / 100
-    height = int(render.resolution_y * render_scale)
-
-    # Get Screen Space Points
-    p1ss = get_render_location(point)
-    p1ss = Vector((p1ss[0], height - p1ss[1]))
-
-    return p1ss
-
-def check_visible(item, point):
-    context = bpy.context
-    scene = context.scene
-    camera = scene.camera.data
-    render = scene.render
-    #Set Z-offset
+    # Set Z-offset
     z_offset = 0.1
-
     if 'lineDepthOffset' in item:
         z_offset += item.lineDepthOffset / 10
 
-    dist = get_camera_z_dist(point)
-    if dist < 0:
-        return -1
-
-    if dist < camera.clip_start or dist > camera.clip_end:
-        return -1
-
-    #Get Render info
-    render_scale = scene.render.resolution_percentage / 100
-    width = int(render.resolution_x * render_scale)
-
-    point_ss = get_ss_point(point)
-    point_clip = get_clip_space_coord(point)
-
-    # Get Depth buffer Pixel Index based on SS Point
-    pxIdx1 = int(((width * math.floor(point_ss[1])) + math.floor(point_ss[0])) * 1)
-    pxIdx2 = int(((width * math.ceil(point_ss[1])) + math.ceil(point_ss[0])) * 1)
-
-    #pxIdx3 = int(((width * math.ceil(point_ss[1])) + math.ceil(point_ss[0])) * 1) + width
-    #pxIdx4 = int(((width * math.floor(point_ss[1])) + math.floor(point_ss[0])) * 1) + width
-
-    #pxIdx5 = int(((width * math.ceil(point_ss[1])) + math.ceil(point_ss[0])) * 1) - width
-    #pxIdx6 = int(((width * math.floor(point_ss[1])) + math.floor(point_ss[0])) * 1) - width
-
-    #pxIdx7 = int(((width * math.ceil(point_ss[1])) + math.ceil(point_ss[0])) * 1) + 1
-    #pxIdx8 = int(((width * math.floor(point_ss[1])) + math.floor(point_ss[0])) * 1) + 1
-
-    #pxIdx9 = int(((width * math.ceil(point_ss[1])) + math.ceil(point_ss[0])) * 1) - 1
-    #pxIdx10 = int(((width * math.floor(point_ss[1])) + math.floor(point_ss[0])) * 1) - 1
-
-    #samples = [pxIdx1,pxIdx2,pxIdx3,pxIdx4,pxIdx5,pxIdx6,pxIdx7,pxIdx8,pxIdx9,pxIdx10]
-
-    samples = [pxIdx1,pxIdx2]
-
-    point_depth = 0
-    for sample in samples:
-        val = get_bufffer_at_idx(pxIdx1)
-        val = true_z_buffer(context, val)
-        point_depth += val
-
-    point_depth /= len(samples)
-
-    # Get Depth From Clip Space point
-    point_vecdepth = (point_clip[2]) - z_offset
-
-    # Check Clip space point against depth buffer value
-    pointVisible = point_depth > point_vecdepth
-
-    return pointVisible
-
-def get_bufffer_at_idx(idx):
-    # Get Depth Buffer Value buffer value
-    try:
-        point_depth = depthbuffer[idx]
-    except IndexError:
-        #print('Index not in Depth Buffer:{}'.format(idx))
-        point_depth = 0
-    return point_depth
+    return tester.split(p1, p2, lambda point: mat @ Vector(point), z_offset)
 
+def clamp(minimum, x, maximum):
+    return max(minimum, min(x, maximum))
 
 # From https://gist.github.com/pklaus/dce37521579513c574d0
 FONT_SPECIFIER_NAME_ID = 4